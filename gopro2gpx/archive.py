@@ -0,0 +1,296 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# native track archive (.gparc): the columns of a gpshelper.Track as
+# integers, delta + zigzag varint encoded, in chunks of CHUNK_SIZE points.
+#
+#   magic (5 bytes)
+#   uint32 size + JSON info: name, start_time, chunk_size, extensions
+#   chunks     one block per column: time, lat, lon, ele, speed, source,
+#              extensions. Each block is a mode (uint8), the scale (float64,
+#              only for SCALED), uint32 size and the varints
+#   index      one entry per chunk: offset, count, min/max time and the
+#              bounding box (see INDEX_ENTRY)
+#   trailer    index offset (uint64), number of chunks (uint32), magic
+#
+# The float columns are stored as round(value * scale), with the SCAL of
+# the GPMF stream (Track.scales) or a usual one, when that gives back the
+# same float for every value of the chunk. Else the float64 bits are
+# stored, so the round trip is always exact.
+
+import array
+import json
+import math
+import struct
+from collections import namedtuple
+
+from . import gpshelper
+
+MAGIC = b'GPARC'
+EXTENSION = 'gparc'
+VERSION = 1
+CHUNK_SIZE = 4096
+
+# column modes
+INTEGER = 0
+SCALED = 1
+FLOAT = 2
+
+# scales tried when the SCAL of a column is unknown (or not exact)
+DEFAULT_SCALES = { 'lat': [ 10000000.0 ], 'lon': [ 10000000.0 ],
+                   'ele': [ 1000.0, 100.0 ], 'speed': [ 1000.0, 100.0 ] }
+
+INDEX_ENTRY = struct.Struct('<QIqqdddd')
+TRAILER = struct.Struct('<QI5s')
+
+ChunkInfo = namedtuple('ChunkInfo', 'offset count min_time max_time min_lat min_lon max_lat max_lon')
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def encodeVarints(values):
+    "the deltas of the integers in values, zigzag and varint encoded"
+    out = bytearray()
+    previous = 0
+    for value in values:
+        delta = zigzag(value - previous)
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decodeVarints(data):
+    "inverse of encodeVarints"
+    values = []
+    previous = 0
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += unzigzag(value)
+        values.append(previous)
+        value = shift = 0
+    return values
+
+
+def _float_bits(values):
+    return array.array('q', array.array('d', values).tobytes())
+
+
+def _bits_float(values):
+    return array.array('d', array.array('q', values).tobytes())
+
+
+def _scaled(values, scale):
+    "values as integers, if dividing them by scale gives back the same floats"
+    try:
+        ints = [ round(v * scale) for v in values ]
+    except (OverflowError, ValueError):
+        return None
+    for q, v in zip(ints, values):
+        if q / scale != v or (v == 0 and math.copysign(1, v) < 0):
+            return None
+    return ints
+
+
+def encodeColumn(values, scales=()):
+    "a column block: the first exact scale in scales, or the float bits"
+    for scale in scales:
+        ints = _scaled(values, scale)
+        if ints is not None:
+            data = encodeVarints(ints)
+            return struct.pack('<BdI', SCALED, scale, len(data)) + data
+    data = encodeVarints(_float_bits(values))
+    return struct.pack('<BI', FLOAT, len(data)) + data
+
+
+def decodeColumn(buf, offset):
+    "(values, offset of the next block) of the block at offset"
+    mode, = struct.unpack_from('<B', buf, offset)
+    scale = None
+    if mode == SCALED:
+        scale, size = struct.unpack_from('<dI', buf, offset + 1)
+        offset += 13
+    else:
+        size, = struct.unpack_from('<I', buf, offset + 1)
+        offset += 5
+    values = decodeVarints(buf[offset:offset + size])
+    if mode == SCALED:
+        values = [ q / scale for q in values ]
+    elif mode == FLOAT:
+        values = _bits_float(values)
+    return values, offset + size
+
+
+def _integer_column(values):
+    data = encodeVarints(values)
+    return struct.pack('<BI', INTEGER, len(data)) + data
+
+
+def write(fd, track, start_time=None, name="", chunk_size=CHUNK_SIZE):
+    """
+    writes the Track to fd (a binary file). start_time and name (the
+    device) are saved with it. Returns the number of chunks.
+    """
+    extensions = list(track.extensions)
+    info = { 'version': VERSION, 'name': name, 'chunk_size': chunk_size, 'count': len(track),
+             'extensions': extensions, 'start_time': None, 'start_time_utc': False }
+    if start_time is not None:
+        info['start_time'] = gpshelper.to_us(start_time)
+        info['start_time_utc'] = start_time.tzinfo is not None
+    header = json.dumps(info).encode('utf-8')
+    fd.write(MAGIC + struct.pack('<I', len(header)) + header)
+    offset = len(MAGIC) + 4 + len(header)
+
+    scales = { column: [ track.scales[column] ] if column in track.scales else [] for column in DEFAULT_SCALES }
+    for column, defaults in DEFAULT_SCALES.items():
+        scales[column] += [ s for s in defaults if s not in scales[column] ]
+
+    index = []
+    for start in range(0, len(track), chunk_size):
+        end = min(start + chunk_size, len(track))
+        lat, lon = track.lat[start:end], track.lon[start:end]
+        time = track.time[start:end]
+        blocks = [ _integer_column(time) ]
+        for column in ('lat', 'lon', 'ele', 'speed'):
+            blocks.append(encodeColumn(getattr(track, column)[start:end], scales[column]))
+        blocks.append(_integer_column(track.source[start:end]))
+        for extension in extensions:
+            blocks.append(encodeColumn(track.extensions[extension][start:end]))
+
+        index.append(INDEX_ENTRY.pack(offset, end - start, min(time), max(time), min(lat), min(lon), max(lat), max(lon)))
+        data = b''.join(blocks)
+        fd.write(data)
+        offset += len(data)
+
+    fd.write(b''.join(index))
+    fd.write(TRAILER.pack(offset, len(index), MAGIC))
+    return len(index)
+
+
+def _us(value):
+    return value if value is None or isinstance(value, int) else gpshelper.to_us(value)
+
+
+class ArchiveReader:
+    """
+    reads a .gparc file (fd, a binary seekable file). Only the index is
+    read on open, the chunks are read when needed.
+    """
+    def __init__(self, fd):
+        self.fd = fd
+        magic = fd.read(len(MAGIC))
+        if magic != MAGIC:
+            raise Exception("Not a track archive")
+        size, = struct.unpack('<I', fd.read(4))
+        self.info = json.loads(fd.read(size).decode('utf-8'))
+        if self.info['version'] > VERSION:
+            raise Exception("Unsupported track archive version %s" % self.info['version'])
+
+        fd.seek(-TRAILER.size, 2)
+        index_offset, count, magic = TRAILER.unpack(fd.read(TRAILER.size))
+        if magic != MAGIC:
+            raise Exception("Truncated track archive")
+        fd.seek(index_offset)
+        data = fd.read(count * INDEX_ENTRY.size)
+        self.index = [ ChunkInfo._make(entry) for entry in INDEX_ENTRY.iter_unpack(data) ]
+        self.end = index_offset
+        # the end of each chunk is the offset of the next one, by offset
+        offsets = [ chunk.offset for chunk in self.index ]
+        self.ends = dict(zip(offsets, offsets[1:] + [ index_offset ]))
+
+    @property
+    def name(self):
+        return self.info['name']
+
+    @property
+    def start_time(self):
+        if self.info['start_time'] is None:
+            return None
+        return gpshelper.from_us(self.info['start_time'], self.info['start_time_utc'])
+
+    def __len__(self):
+        return self.info['count']
+
+    def chunks(self, start=None, end=None, bbox=None):
+        """
+        the index entries of the chunks that may have points between the
+        times start and end (datetimes or microseconds) and inside bbox
+        (min_lat, min_lon, max_lat, max_lon)
+        """
+        start, end = _us(start), _us(end)
+        for chunk in self.index:
+            if start is not None and chunk.max_time < start:
+                continue
+            if end is not None and chunk.min_time > end:
+                continue
+            if bbox is not None and (chunk.max_lat < bbox[0] or chunk.max_lon < bbox[1] or
+                                     chunk.min_lat > bbox[2] or chunk.min_lon > bbox[3]):
+                continue
+            yield chunk
+
+    def readChunk(self, chunk):
+        "the points of a chunk, as a Track"
+        self.fd.seek(chunk.offset)
+        buf = self.fd.read(self._size(chunk))
+
+        track = gpshelper.Track()
+        time, offset = decodeColumn(buf, 0)
+        track.time.extend(time)
+        for column in ('lat', 'lon', 'ele', 'speed'):
+            values, offset = decodeColumn(buf, offset)
+            getattr(track, column).extend(values)
+        source, offset = decodeColumn(buf, offset)
+        track.source.extend(source)
+        for extension in self.info['extensions']:
+            values, offset = decodeColumn(buf, offset)
+            track.extensions[extension] = array.array('d', values)
+        return track
+
+    def _size(self, chunk):
+        return self.ends[chunk.offset] - chunk.offset
+
+    def read(self, start=None, end=None, bbox=None):
+        """
+        the points between start and end, and inside bbox (see chunks), as
+        a Track. Only the chunks that may have them are decoded.
+        """
+        track = gpshelper.Track()
+        for extension in self.info['extensions']:
+            track.extensions[extension] = array.array('d')
+        start, end = _us(start), _us(end)
+        for chunk in self.chunks(start, end, bbox):
+            points = self.readChunk(chunk)
+            if start is not None or end is not None or bbox is not None:
+                points = points.select([ i for i in range(len(points)) if
+                                         (start is None or points.time[i] >= start) and
+                                         (end is None or points.time[i] <= end) and
+                                         (bbox is None or (bbox[0] <= points.lat[i] <= bbox[2] and
+                                                           bbox[1] <= points.lon[i] <= bbox[3])) ])
+            for column in ('lat', 'lon', 'ele', 'speed', 'time', 'source'):
+                getattr(track, column).extend(getattr(points, column))
+            for extension, column in points.extensions.items():
+                track.extensions[extension].extend(column)
+        return track
+
+
+def read(fd, start=None, end=None, bbox=None):
+    "(Track, start_time, name) saved in fd with write"
+    reader = ArchiveReader(fd)
+    return reader.read(start, end, bbox), reader.start_time, reader.name
@@ -0,0 +1,207 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# cache of the telemetry between runs, in two levels (in the cache dir by
+# default, see config.cache_dir):
+#
+#   raw/<sha256>.bin      the GPMF data extracted from a video, by content
+#   ids/<key>             the sha256 of the GPMF data of a file, by its
+#                         identity (absolute path, size, mtime, inode)
+#   track/<key>.gparc     a decoded track (archive format), by the sha256
+#                         of its GPMF data and the BuildGPSPoints options
+#
+# The files are written to a temporary name and renamed, so they are
+# complete or missing. The entries used are touched, and the ones used
+# least recently are deleted when the total size goes over max_size. A
+# lock file (shared to use the cache, exclusive to evict) lets several
+# processes share the directory.
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from . import archive
+from .config import cache_dir
+
+CACHE_VERSION = 1
+MAX_SIZE = 1024 * 1024 * 1024
+
+LEVELS = ('raw', 'ids', 'track')
+
+
+def file_identity(filename):
+    "key of the file: absolute path, size, mtime and inode"
+    st = os.stat(filename)
+    identity = "%s\0%d\0%d\0%d" % (os.path.abspath(filename), st.st_size, st.st_mtime_ns, st.st_ino)
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+class RawWriter:
+    """
+    saves GPMF data in the cache as it is written (see gpmf.TeeReader),
+    hashing it. commit stores it, discard drops it.
+    """
+    def __init__(self, cache, filename):
+        self.cache = cache
+        self.filename = filename
+        self.hash = hashlib.sha256()
+        self.fd = tempfile.NamedTemporaryFile(dir=cache.path('raw'), suffix='.tmp', delete=False)
+
+    def write(self, data):
+        self.hash.update(data)
+        self.fd.write(data)
+
+    def commit(self):
+        "the sha256 of the data"
+        self.fd.close()
+        digest = self.hash.hexdigest()
+        with self.cache.lock():
+            os.replace(self.fd.name, self.cache.path('raw', digest + '.bin'))
+            self.cache.writeFile(self.cache.path('ids', file_identity(self.filename)), digest.encode('ascii'))
+        self.cache.evict()
+        return digest
+
+    def discard(self):
+        self.fd.close()
+        if os.path.exists(self.fd.name):
+            os.remove(self.fd.name)
+
+
+class TelemetryCache:
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        self.directory = directory if directory else cache_dir()
+        self.max_size = max_size
+        for level in LEVELS:
+            os.makedirs(self.path(level), exist_ok=True)
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    @contextlib.contextmanager
+    def lock(self, exclusive=False):
+        "shared (or exclusive) lock of the cache directory"
+        with open(self.path('cache.lock'), 'a+b') as fd:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            else:
+                # msvcrt has no shared locks
+                fd.seek(0)
+                msvcrt.locking(fd.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    fd.seek(0)
+                    msvcrt.locking(fd.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def writeFile(self, filename, data):
+        "writes data to filename through a temporary file"
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, filename)
+
+    def readFile(self, filename):
+        "the data of filename, touched as used, or None"
+        try:
+            with open(filename, 'rb') as fd:
+                data = fd.read()
+            os.utime(filename)
+        except OSError:
+            return None
+        return data
+
+    def rawHash(self, filename, raw_data=None):
+        """
+        the sha256 of the GPMF data of filename: saved by identity, or of
+        raw_data (then saved). None if unknown.
+        """
+        with self.lock():
+            digest = self.readFile(self.path('ids', file_identity(filename)))
+            if digest is not None:
+                return digest.decode('ascii')
+            if raw_data is None:
+                return None
+            digest = hashlib.sha256(raw_data).hexdigest()
+            self.writeFile(self.path('ids', file_identity(filename)), digest.encode('ascii'))
+        return digest
+
+    def getRaw(self, filename):
+        "the GPMF data saved for filename, or None"
+        digest = self.rawHash(filename)
+        if digest is None:
+            return None
+        with self.lock():
+            return self.readFile(self.path('raw', digest + '.bin'))
+
+    def putRaw(self, filename, raw_data):
+        "saves the GPMF data of filename. Returns its sha256"
+        digest = hashlib.sha256(raw_data).hexdigest()
+        with self.lock():
+            self.writeFile(self.path('raw', digest + '.bin'), raw_data)
+            self.writeFile(self.path('ids', file_identity(filename)), digest.encode('ascii'))
+        self.evict()
+        return digest
+
+    def rawWriter(self, filename):
+        "a RawWriter, to save the GPMF data of filename while it's read"
+        return RawWriter(self, filename)
+
+    def trackKey(self, raw_hashes, options):
+        key = json.dumps([ CACHE_VERSION, raw_hashes, options ], sort_keys=True)
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def getTrack(self, raw_hashes, options):
+        """
+        (Track, start_time, device name) decoded from the GPMF data with
+        sha256 raw_hashes (one per file) and options, or None
+        """
+        with self.lock():
+            data = self.readFile(self.path('track', self.trackKey(raw_hashes, options) + '.' + archive.EXTENSION))
+        if data is None:
+            return None
+        return archive.read(io.BytesIO(data))
+
+    def putTrack(self, raw_hashes, options, track, start_time, name):
+        fd = io.BytesIO()
+        archive.write(fd, track, start_time=start_time, name=name)
+        with self.lock():
+            self.writeFile(self.path('track', self.trackKey(raw_hashes, options) + '.' + archive.EXTENSION), fd.getvalue())
+        self.evict()
+
+    def evict(self):
+        "deletes the entries used least recently while the cache is bigger than max_size"
+        with self.lock(exclusive=True):
+            entries = []
+            for level in LEVELS:
+                with os.scandir(self.path(level)) as it:
+                    for entry in it:
+                        if entry.is_file() and not entry.name.endswith('.tmp'):
+                            st = entry.stat()
+                            entries.append((st.st_mtime, st.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, filename in sorted(entries):
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(filename)
+                    total -= size
+                except OSError:
+                    pass
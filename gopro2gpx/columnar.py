@@ -0,0 +1,150 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# columnar export of the decoded data, so it can be loaded without parsing
+# text: Parquet or Arrow IPC files when pyarrow is installed, .npz (numpy)
+# otherwise.
+#
+#   track     lat lon ele speed (float64), time (timestamp us, UTC),
+#             source (GPS5, GPS9, ...) and the extensions set in the Track
+#   IMU       time (int64 us since the record start) and one float64
+#             column per axis (see imu.IMUStream.axisNames)
+#
+# The arrow columns of a Track are built over its array.array buffers,
+# without copies (the Track can't grow while the table is alive).
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    # optional, Parquet and Arrow IPC output
+    pyarrow = None
+
+from . import fourCC
+from . import gpshelper
+from . import imu
+
+FORMATS = ('parquet', 'arrow', 'npz')
+
+
+class ColumnarError(Exception):
+    "the format is unknown, or a package it needs is not installed"
+
+
+def default_format():
+    return 'parquet' if pyarrow is not None else 'npz'
+
+
+def _column(column, type_):
+    "an arrow array over the buffer of an array.array"
+    return pyarrow.Array.from_buffers(type_, len(column), [ None, pyarrow.py_buffer(column) ])
+
+
+def track_to_arrow(track):
+    if pyarrow is None:
+        raise ColumnarError("Arrow output needs pyarrow")
+    names = [ 'lat', 'lon', 'ele', 'speed', 'time', 'source' ]
+    arrays = [ _column(track.lat, pyarrow.float64()),
+               _column(track.lon, pyarrow.float64()),
+               _column(track.ele, pyarrow.float64()),
+               _column(track.speed, pyarrow.float64()),
+               _column(track.time, pyarrow.timestamp('us', tz='UTC')),
+               pyarrow.DictionaryArray.from_arrays(_column(track.source, pyarrow.uint8()), pyarrow.array(gpshelper.SOURCE_NAMES)) ]
+    for name, column in track.extensions.items():
+        names.append(name)
+        arrays.append(_column(column, pyarrow.float64()))
+    return pyarrow.Table.from_arrays(arrays, names=names)
+
+
+def stream_to_arrow(stream):
+    "an imu.IMUStream as a table, with its name, units and axes as metadata"
+    if pyarrow is None:
+        raise ColumnarError("Arrow output needs pyarrow")
+    np = fourCC.np
+    names = [ 'time' ] + stream.axisNames()
+    arrays = [ pyarrow.array(stream.time) ] + [ pyarrow.array(np.ascontiguousarray(stream.samples[:, i], dtype=float)) for i in range(3) ]
+    metadata = { 'fourCC': stream.fourCC, 'name': stream.name, 'units': stream.units, 'axes': stream.axes }
+    return pyarrow.Table.from_arrays(arrays, names=names, metadata=metadata)
+
+
+def to_dataframe(track):
+    """
+    the Track as a pandas DataFrame. The float columns are not copied when
+    possible. pandas is imported here, it's slow to load.
+    """
+    import pandas
+    if pyarrow is not None:
+        return track_to_arrow(track).to_pandas(split_blocks=True)
+
+    columns = track.arrays()
+    columns['time'] = columns['time'].view('datetime64[us]')
+    columns['source'] = pandas.Categorical.from_codes(columns['source'], gpshelper.SOURCE_NAMES)
+    df = pandas.DataFrame(columns, copy=False)
+    df['time'] = df['time'].dt.tz_localize('UTC')
+    return df
+
+
+def track_arrays(track):
+    "the columns of a Track saved in the .npz files"
+    np = fourCC.np
+    arrays = dict(track.arrays())
+    arrays['source_names'] = np.array(gpshelper.SOURCE_NAMES)
+    return arrays
+
+
+def _write_arrow(filename, table, fmt):
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(table, filename)
+    else:
+        with pyarrow.ipc.new_file(filename, table.schema) as writer:
+            writer.write_table(table)
+
+
+def check(fmt=None):
+    "raises ColumnarError if fmt can't be written. Returns the format used"
+    fmt = fmt or default_format()
+    if fmt not in FORMATS:
+        raise ColumnarError("Unknown columnar format %s" % fmt)
+    if fmt != 'npz' and pyarrow is None:
+        raise ColumnarError("%s output needs pyarrow" % fmt)
+    # parquet and arrow only need pyarrow (the IMU streams, which need
+    # numpy, aren't extracted without it)
+    if fmt == 'npz' and fourCC.np is None:
+        raise ColumnarError("Columnar output needs numpy")
+    return fmt
+
+
+def write(prefix, track=None, streams=None, fmt=None):
+    """
+    saves the track and/or the IMU streams (see imu.extractIMU). parquet
+    and arrow write a file per table: prefix.parquet for the track and
+    prefix.ACCL.parquet, ... for the streams. npz writes everything in
+    prefix.npz. Returns the names of the files written.
+    """
+    fmt = check(fmt)
+
+    if fmt == 'npz':
+        arrays = {}
+        if track is not None:
+            arrays.update(track_arrays(track))
+        if streams:
+            arrays.update(imu.streamArrays(streams))
+        filename = "%s.npz" % prefix
+        with open(filename, 'wb') as fd:
+            fourCC.np.savez(fd, **arrays)
+        return [ filename ]
+
+    filenames = []
+    if track is not None:
+        filenames.append("%s.%s" % (prefix, fmt))
+        _write_arrow(filenames[-1], track_to_arrow(track), fmt)
+    for label, stream in (streams or {}).items():
+        filenames.append("%s.%s.%s" % (prefix, label, fmt))
+        _write_arrow(filenames[-1], stream_to_arrow(stream), fmt)
+    return filenames
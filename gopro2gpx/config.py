@@ -40,6 +40,18 @@ def main_core(args):
     
     return
 
+def cache_dir():
+    """
+    directory for the files gopro2gpx keeps between runs (not created):
+    %LOCALAPPDATA%/gopro2gpx on Windows, $XDG_CACHE_HOME/gopro2gpx or
+    ~/.cache/gopro2gpx elsewhere
+    """
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser(r"~\AppData\Local")
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser("~/.cache")
+    return os.path.join(base, "gopro2gpx")
+
 class Config:
     def __init__(self, verbose=0, outputfile=None):
         self.ffmpeg_cmd = None
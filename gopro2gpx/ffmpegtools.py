@@ -6,14 +6,23 @@
 # Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
 #
 
+import contextlib
 import subprocess
 import re
 import json
+import os
 import platform
+import shutil
 from collections import namedtuple
 
+from .config import cache_dir
+from .probecache import Probe
+
 Version = namedtuple('Version', ['major', 'medium', 'minor'])
 
+# parsed ffmpeg versions, by executable path (see FFMpegTools.cachedVersion)
+VERSION_CACHE = "ffmpeg_version.json"
+
 def default_fftools():
     if platform.system() == 'Windows':
         ffmpeg, ffprobe = "ffmpeg.exe", "ffprobe.exe"
@@ -26,18 +35,64 @@ def default_fftools():
 class FFMpegTools:
     MAJOR_VERSION = 4
 
-    def __init__(self, ffprobe=None, ffmpeg=None):
+    def __init__(self, ffprobe=None, ffmpeg=None, probe_cache=None, version_cache=True):
         
         default_ffmpeg, default_ffprobe = default_fftools()
 
         self.ffmpeg = ffmpeg if ffmpeg else default_ffmpeg
         self.ffprobe = ffprobe if ffprobe else default_ffprobe
 
-        self.version = self.getVersion()
+        # nothing is run until the tools are used
+        self._version = None
+        # a probecache.ProbeCache, to skip ffprobe on the files already seen
+        self.probe_cache = probe_cache
+        # the file of the parsed versions (see cachedVersion): True for
+        # VERSION_CACHE in the cache dir, None to run ffmpeg every time
+        self.version_cache = os.path.join(cache_dir(), VERSION_CACHE) if version_cache is True else version_cache
+
+    @property
+    def version(self):
+        if self._version is None:
+            self._version = self.cachedVersion()
+        return self._version
+
+    @property
+    def use_json_format(self):
+        return self.version.major >= FFMpegTools.MAJOR_VERSION
+
+    def cachedVersion(self):
+        """
+        getVersion, saved in the cache dir with the path and mtime of the
+        ffmpeg executable, so it only runs again when ffmpeg changes
+        """
+        path = shutil.which(self.ffmpeg)
+        if path is None or self.version_cache is None:
+            return self.getVersion()
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+
+        filename = self.version_cache
+        try:
+            with open(filename, "r") as fd:
+                cache = json.load(fd)
+        except (OSError, ValueError):
+            cache = {}
+        entry = cache.get(path)
+        if isinstance(entry, dict) and entry.get('mtime') == mtime:
+            return Version._make(entry['version'])
 
-        self.use_json_format = False
-        if self.version.major >= FFMpegTools.MAJOR_VERSION:
-            self.use_json_format = True
+        version = self.getVersion()
+        cache[path] = { 'mtime': mtime, 'version': list(version) }
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            temporary = "%s.%d.tmp" % (filename, os.getpid())
+            with open(temporary, "w") as fd:
+                json.dump(cache, fd)
+            os.replace(temporary, filename)
+        except OSError:
+            # the cache is optional
+            pass
+        return version
 
     def to_int(self, v):
         r = v
@@ -102,12 +157,26 @@ class FFMpegTools:
         return output
 
     def getMetadataTrack(self, fname):
+        probe = self.probe(fname)
+        return probe.track, probe.info
+
+    def probe(self, fname):
+        "the gpmd track, duration and streams of fname (a probecache.Probe)"
+        if self.probe_cache is not None:
+            probe = self.probe_cache.get(fname)
+            if probe is not None:
+                return probe
+
         if self.use_json_format:
-            return self._getMetadataTrackFromJSON(fname)
+            probe = self._probeFromJSON(fname)
         else:
-            return self._getMetadataTrackFromText(fname)
+            probe = self._probeFromText(fname)
 
-    def _getMetadataTrackFromJSON(self, fname):
+        if self.probe_cache is not None:
+            self.probe_cache.put(fname, probe)
+        return probe
+
+    def _probeFromJSON(self, fname):
         """
             % ffprobe -print_format json -show_streams video.mp4
             % ffprobe -v quiet -print_format json -show_format -show_streams video.mp4"
@@ -177,15 +246,18 @@ class FFMpegTools:
         args = ['-print_format', 'json', '-show_streams', fname]
 
         md = json.loads(self.runCmdRaw(self.ffprobe, args))
+        streams = [ { key: s.get(key) for key in ('index', 'codec_type', 'codec_name', 'codec_tag_string', 'duration') }
+                    for s in md['streams'] ]
         stream = next((stream for stream in md['streams'] if stream['codec_tag_string'] == 'gpmd'), None)
 
         if not stream:
-            return None, None
+            return Probe(None, None, None, streams)
         
         info_string = 'Stream {}[{}], {} ({})'.format(stream['index'], stream['index'], stream['codec_name'], stream['codec_tag_string'])
-        return int(stream["index"]), info_string
+        duration = float(stream['duration']) if stream.get('duration') else None
+        return Probe(int(stream["index"]), info_string, duration, streams)
 
-    def _getMetadataTrackFromText(self, fname):
+    def _probeFromText(self, fname):
         """
         % ffprobe GH010039.MP4 2>&1
 
@@ -206,13 +278,58 @@ class FFMpegTools:
 
         m = reg.search(output)
 
+        # Duration: 00:00:29.66, start: 0.000000, bitrate: 60261 kb/s
+        duration = None
+        d = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', output)
+        if d:
+            duration = int(d.group(1)) * 3600 + int(d.group(2)) * 60 + float(d.group(3))
+
+        streams = [ { 'index': int(index), 'description': description }
+                    for index, description in re.findall(r'Stream #\d:(\d+)\S*: (.*)', output) ]
         if not m:
-            return None, None
-        return int(m.group(1)), m.group(0)
+            return Probe(None, None, duration, streams)
+        return Probe(int(m.group(1)), m.group(0), duration, streams)
+
+    def metadataArgs(self, track, fname):
+        output_file = "-"
+        return [ '-y', '-i', fname, '-codec', 'copy', '-map', '0:%d' % track, '-f', 'rawvideo', output_file ]
 
     def getMetadata(self, track, fname):
 
-        output_file = "-"
-        args = [ '-y', '-i', fname, '-codec', 'copy', '-map', '0:%d' % track, '-f', 'rawvideo', output_file ]
+        args = self.metadataArgs(track, fname)
         output = self.runCmdRaw(self.ffmpeg, args)
         return(output)
+
+    @contextlib.contextmanager
+    def openMetadata(self, track, fname):
+        """
+        streaming getMetadata: the ffmpeg stdout, to read while it extracts
+        the track. ffmpeg waits when the pipe is full, so nothing is
+        buffered beyond what the reader asks for.
+
+        On exit ffmpeg is stopped if it's still running (the reader failed,
+        or didn't need the rest), or checked if it ended: an Exception is
+        raised if the extraction failed.
+        """
+        proc = subprocess.Popen([ self.ffmpeg ] + self.metadataArgs(track, fname),
+                                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            yield proc.stdout
+            if proc.stdout.read(1):
+                # not read to the end
+                self.stopProcess(proc)
+            elif proc.wait() != 0:
+                raise Exception("ffmpeg failed extracting track %d of %s (exit code %d)" % (track, fname, proc.returncode))
+        finally:
+            if proc.poll() is None:
+                self.stopProcess(proc)
+            proc.stdout.close()
+
+    def stopProcess(self, proc, timeout=5):
+        "terminates proc, or kills it if it doesn't end in timeout seconds"
+        proc.terminate()
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
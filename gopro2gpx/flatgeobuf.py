@@ -0,0 +1,309 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# FlatGeobuf writer, based on the info from:
+#   https://github.com/flatgeobuf/flatgeobuf (header.fbs, feature.fbs)
+#   https://flatbuffers.dev/internals/
+#
+#   magic (8 bytes)
+#   header     uint32 size + Header flatbuffer
+#   index      packed Hilbert R-tree, one 40 bytes NodeItem per node
+#   features   uint32 size + Feature flatbuffer, in Hilbert order
+#
+# The features are the points (Point Z) or the segments between two
+# consecutive points (LineString Z) of a Track, with their time, speed and
+# source as properties. The track is read twice: once for the bounding
+# boxes and sizes of the features (to build the index), once to write them,
+# so only the index is kept in memory.
+
+import struct
+
+from . import gpshelper
+
+MAGIC = b'fgb\x03fgb\x00'
+
+# GeometryType
+POINT = 1
+LINESTRING = 2
+
+# ColumnType
+DOUBLE = 10
+STRING = 11
+DATETIME = 13
+
+INDEX_NODE_SIZE = 16
+HILBERT_MAX = (1 << 16) - 1
+
+node_item = struct.Struct('<ddddQ')
+
+# property columns: (name, type)
+COLUMNS = [ ('time', DATETIME), ('speed', DOUBLE), ('source', STRING) ]
+
+
+class FlatBuffer:
+    """
+    minimal flatbuffer encoder, writing front to back: each table is
+    preceded by its vtable and followed by the objects it references.
+    Fields are (index, kind, value) with kind one of: u8 bool u16 i32 u64
+    str table f64s u32s bytes tables
+    """
+    inline_size = { 'u64': 8, 'i32': 4, 'u16': 2, 'u8': 1, 'bool': 1,
+                    'str': 4, 'table': 4, 'f64s': 4, 'u32s': 4, 'bytes': 4, 'tables': 4 }
+    scalar_format = { 'u64': '<Q', 'i32': '<i', 'u16': '<H', 'u8': '<B', 'bool': '<?' }
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def pad(self, align, extra=0):
+        "pads with zeros until (len + extra) is aligned"
+        self.buf += b'\0' * (-(len(self.buf) + extra) % align)
+
+    def patch(self, position, target=None):
+        "the uoffset at position points to target (the end of the buffer)"
+        if target is None:
+            target = len(self.buf)
+        struct.pack_into('<I', self.buf, position, target - position)
+
+    def finish(self, fields):
+        self.buf += b'\0' * 4
+        self.patch(0, self.table(fields))
+        self.pad(4)
+        return bytes(self.buf)
+
+    def table(self, fields):
+        "writes a table, and what it references. Returns its position"
+        fields = [ f for f in fields if f[2] is not None ]
+        # 8 byte fields first, then 4, 2 and 1 so they are aligned
+        fields.sort(key=lambda f: -self.inline_size[f[1]])
+        num_fields = max([ f[0] for f in fields ] + [ -1 ]) + 1
+        vtable_size = 4 + 2 * num_fields
+
+        offsets = {}
+        position = 4
+        for index, kind, _ in fields:
+            offsets[index] = position
+            position += self.inline_size[kind]
+        table_size = position
+
+        # the table starts at 4 mod 8, so its first field is 8 aligned
+        self.pad(8, vtable_size + 4)
+        self.buf += struct.pack('<HH', vtable_size, table_size)
+        self.buf += b''.join(struct.pack('<H', offsets.get(i, 0)) for i in range(num_fields))
+        table = len(self.buf)
+        self.buf += struct.pack('<i', vtable_size) + b'\0' * (table_size - 4)
+
+        references = []
+        for index, kind, value in fields:
+            position = table + offsets[index]
+            if kind in self.scalar_format:
+                struct.pack_into(self.scalar_format[kind], self.buf, position, value)
+            else:
+                references.append((position, kind, value))
+
+        for position, kind, value in references:
+            if kind == 'table':
+                self.patch(position, self.table(value))
+            elif kind == 'tables':
+                self.pad(4)
+                self.patch(position)
+                start = len(self.buf)
+                self.buf += struct.pack('<I', len(value)) + b'\0' * (4 * len(value))
+                for i, item in enumerate(value):
+                    self.patch(start + 4 + 4 * i, self.table(item))
+            elif kind == 'f64s':
+                self.pad(8, 4)
+                self.patch(position)
+                self.buf += struct.pack('<I%dd' % len(value), len(value), *value)
+            elif kind == 'u32s':
+                self.pad(4)
+                self.patch(position)
+                self.buf += struct.pack('<I%dI' % len(value), len(value), *value)
+            else:
+                data = value.encode('utf-8') if kind == 'str' else value
+                self.pad(4)
+                self.patch(position)
+                self.buf += struct.pack('<I', len(data)) + data
+                if kind == 'str':
+                    self.buf += b'\0'
+        return table
+
+
+def hilbert(x, y):
+    "position of (x, y) in the 16 bits Hilbert curve (from flatbush)"
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return (i1 << 1) | i0
+
+
+def levelBounds(num_items, node_size):
+    "(start, end) of each level of the tree in the node array, leaves first"
+    n = num_items
+    level_nodes = [ n ]
+    while True:
+        n = (n + node_size - 1) // node_size
+        level_nodes.append(n)
+        if n == 1:
+            break
+    bounds = []
+    end = sum(level_nodes)
+    for count in level_nodes:
+        bounds.append((end - count, end))
+        end -= count
+    return bounds
+
+
+def buildIndex(boxes, offsets, node_size=INDEX_NODE_SIZE):
+    """
+    packed Hilbert R-tree of the features (already in Hilbert order), as
+    bytes. boxes are (minx, miny, maxx, maxy), offsets the position of
+    each feature from the start of the features section.
+    """
+    bounds = levelBounds(len(boxes), node_size)
+    nodes = [ None ] * bounds[0][1]
+    leaves = bounds[0][0]
+    for i, (box, offset) in enumerate(zip(boxes, offsets)):
+        nodes[leaves + i] = box + (offset,)
+
+    for (start, end), (parent, _) in zip(bounds[:-1], bounds[1:]):
+        for first in range(start, end, node_size):
+            children = nodes[first:min(first + node_size, end)]
+            nodes[parent] = (min(n[0] for n in children), min(n[1] for n in children),
+                             max(n[2] for n in children), max(n[3] for n in children), first)
+            parent += 1
+    return b''.join(node_item.pack(*node) for node in nodes)
+
+
+class FeatureSource:
+    "the features of a Track: points, or segments between consecutive points"
+    def __init__(self, track, segments=False):
+        self.track = track
+        self.segments = segments
+        self.lon = track.lon.tolist()
+        self.lat = track.lat.tolist()
+        self.ele = track.ele.tolist()
+        self.time = track.time.tolist()
+        self.formatter = gpshelper.TimeFormatter()
+
+    def __len__(self):
+        if self.segments:
+            return max(len(self.track) - 1, 0)
+        return len(self.track)
+
+    def box(self, i):
+        if self.segments:
+            x, y = self.lon[i:i+2], self.lat[i:i+2]
+            return (min(x), min(y), max(x), max(y))
+        return (self.lon[i], self.lat[i], self.lon[i], self.lat[i])
+
+    def encode(self, i):
+        "the Feature flatbuffer of feature i"
+        count = 2 if self.segments else 1
+        xy = []
+        for j in range(i, i + count):
+            xy += [ self.lon[j], self.lat[j] ]
+        geometry = [ (1, 'f64s', xy), (2, 'f64s', self.ele[i:i + count]),
+                     (6, 'u8', LINESTRING if self.segments else POINT) ]
+
+        time = self.formatter(self.time[i]).encode('utf-8')
+        source = gpshelper.SOURCE_NAMES[self.track.source[i]].encode('utf-8')
+        properties = (struct.pack('<HI', 0, len(time)) + time +
+                      struct.pack('<Hd', 1, self.track.speed[i]) +
+                      struct.pack('<HI', 2, len(source)) + source)
+        return FlatBuffer().finish([ (0, 'table', geometry), (1, 'bytes', properties) ])
+
+
+def header(name, count, envelope, geometry_type):
+    columns = [ [ (0, 'str', column), (1, 'u8', column_type) ] for column, column_type in COLUMNS ]
+    crs = [ (0, 'str', 'EPSG'), (1, 'i32', 4326) ]
+    return FlatBuffer().finish([ (0, 'str', name), (1, 'f64s', envelope), (2, 'u8', geometry_type),
+                                 (3, 'bool', True), (7, 'tables', columns), (8, 'u64', count),
+                                 (9, 'u16', INDEX_NODE_SIZE if count else 0), (10, 'table', crs) ])
+
+
+def write(fd, track, name="track", segments=False):
+    """
+    writes the Track to fd (a binary file) as FlatGeobuf with a spatial
+    index. Returns the number of features.
+    """
+    features = FeatureSource(track, segments)
+    count = len(features)
+
+    boxes = [ features.box(i) for i in range(count) ]
+    envelope = None
+    if count:
+        envelope = [ min(b[0] for b in boxes), min(b[1] for b in boxes),
+                     max(b[2] for b in boxes), max(b[3] for b in boxes) ]
+        width, height = envelope[2] - envelope[0], envelope[3] - envelope[1]
+
+        def hilbert_value(i):
+            minx, miny, maxx, maxy = boxes[i]
+            x = int(HILBERT_MAX * ((minx + maxx) / 2 - envelope[0]) / width) if width else 0
+            y = int(HILBERT_MAX * ((miny + maxy) / 2 - envelope[1]) / height) if height else 0
+            return hilbert(x, y)
+        order = sorted(range(count), key=hilbert_value)
+    else:
+        order = []
+
+    # first pass: the offset of each feature, for the index
+    offsets = []
+    offset = 0
+    for i in order:
+        offsets.append(offset)
+        offset += 4 + len(features.encode(i))
+
+    data = header(name, count, envelope, LINESTRING if segments else POINT)
+    fd.write(MAGIC)
+    fd.write(struct.pack('<I', len(data)) + data)
+    if count:
+        fd.write(buildIndex([ boxes[i] for i in order ], offsets))
+
+    # second pass: the features
+    for i in order:
+        data = features.encode(i)
+        fd.write(struct.pack('<I', len(data)) + data)
+    return count
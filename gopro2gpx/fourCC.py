@@ -7,21 +7,42 @@
 #
 
 
+import re
 import struct
 from datetime import datetime
 import collections
 import copy
 
+try:
+	import numpy as np
+except ImportError:
+	# optional, used to decode the GPS payloads in bulk (BuildArray)
+	np = None
+
 maptype = { 'c': 'c',
 			'L': 'L',
 			's': 'h',
 			'S': 'H',
 			'f': 'f',
-			'U': 'c',
+			'U': '16s',
 			'l': 'l',
 			'B': 'B',
 			'f': 'f',
-			'J': 'Q'
+			'J': 'Q',
+			'b': 'b',
+			'd': 'd',
+			'j': 'q',
+			'F': '4s',
+			'G': '16s',
+			'q': 'i',
+			'Q': 'q'
+	}
+
+# NumPy equivalents, for the complex (TYPE) structures
+maptype_numpy = { 'b': 'i1', 'B': 'u1', 'c': 'S1', 'd': '>f8', 'f': '>f4',
+				  'F': 'S4', 'G': 'S16', 'j': '>i8', 'J': '>u8', 'l': '>i4',
+				  'L': '>u4', 'q': '>i4', 'Q': '>i8', 's': '>i2', 'S': '>u2',
+				  'U': 'S16'
 	}
 
   
@@ -31,6 +52,65 @@ def map_type(type):
 		return maptype[ctype]
 	return(ctype)
 
+def parse_type(type_string):
+	"""
+	expands a GPMF TYPE string in one char per field. 'f[3]L' is 'fffL'.
+	"""
+	types = []
+	i = 0
+	while i < len(type_string):
+		c = type_string[i]
+		if c == '\0':
+			break
+		if c == '[':
+			end = type_string.index(']', i)
+			types += types[-1:] * (int(type_string[i+1:end]) - 1)
+			i = end + 1
+			continue
+		types.append(c)
+		i += 1
+	return types
+
+field_counts = {}
+
+def count_fields(type_string):
+	"number of fields of a GPMF type string, cached"
+	count = field_counts.get(type_string)
+	if count is None:
+		count = len(parse_type(type_string))
+		field_counts[type_string] = count
+	return count
+
+structs = {}
+
+def get_struct(type_string, repeat=1):
+	"""
+	the compiled big endian struct for a GPMF type string, repeated repeat
+	times. Compiled once, and cached by type string and repeat.
+	"""
+	key = (type_string, repeat)
+	s = structs.get(key)
+	if s is None:
+		fmt = "".join( [map_type(ord(x)) for x in parse_type(type_string) ])
+		s = struct.Struct('>' + fmt * repeat)
+		structs[key] = s
+	return s
+
+dtypes = {}
+
+def get_dtype(type_string, names=None):
+	"""
+	the NumPy structured dtype for a GPMF type string, cached
+	"""
+	key = (type_string, names)
+	dtype = dtypes.get(key)
+	if dtype is None:
+		types = parse_type(type_string)
+		names = names or [ 'f%d' % i for i in range(len(types)) ]
+		dtype = np.dtype([ (name, maptype_numpy[x]) for name, x in zip(names, types) ])
+		dtypes[key] = dtype
+	return dtype
+
 
 XYZData = collections.namedtuple('XYZData',"y x z")	
 UNITData = collections.namedtuple("UNITData","lat lon alt speed speed3d")
@@ -48,8 +128,7 @@ class LabelBase:
 	def Build(self, klvdata):
 		if not klvdata.rawdata:
 			return None
-		stype = map_type(klvdata.type)
-		s = struct.Struct('>' + stype)
+		s = get_struct(chr(klvdata.type))
 		data, = s.unpack_from(klvdata.rawdata)
 		return(data)
 
@@ -60,7 +139,7 @@ class LabelEmpty(LabelBase):
 	def Build(self, klvdata):
 		if not klvdata.rawdata:
 			return None
-		return klvdata.rawdata[0:10]
+		return bytes(klvdata.rawdata[0:10])
 
 class Label_TypecString(LabelBase):
 	"c 1 X"
@@ -68,18 +147,26 @@ class Label_TypecString(LabelBase):
 		LabelBase.__init__(self)
 
 	def Build(self, klvdata):
-		return(klvdata.rawdata.decode('utf-8', errors='replace').strip('\0'))
+		return(str(klvdata.rawdata, 'utf-8', errors='replace').strip('\0'))
 
 class Label_TypeUTimeStamp(LabelBase):
 	"c 1 X"
 	def __init__(self):
 		LabelBase.__init__(self)
 
+	# 'yymmddhhmmss.ffffff', read without strptime (once per DEVC)
+	pattern = re.compile(r'(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)(\d\d)\.(\d{1,6})$')
+
 	def Build(self, klvdata):
-		s = klvdata.rawdata.decode('utf-8', errors='replace')
-		# 'yymmddhhmmss.ffffff'
-		fmt = '%y%m%d%H%M%S.%f'
-		return datetime.strptime(s, fmt)
+		s = str(klvdata.rawdata, 'utf-8', errors='replace')
+		m = Label_TypeUTimeStamp.pattern.match(s)
+		if m is None:
+			fmt = '%y%m%d%H%M%S.%f'
+			return datetime.strptime(s, fmt)
+		year, month, day, hour, minute, second, fraction = m.groups()
+		# %y: 69-99 are 19xx
+		year = int(year) + (2000 if int(year) < 69 else 1900)
+		return datetime(year, int(month), int(day), int(hour), int(minute), int(second), int(fraction.ljust(6, '0')))
 
 class LabelDVID(LabelBase):
 	def __init__(self):
@@ -114,9 +201,7 @@ class LabelSCAL(LabelBase):
 			return LabelBase.Build(self,klvdata)
 		
 		# if more than 1 item in repeat, return a list (GPS data)
-		stype = map_type(klvdata.type)
-		fmt = '>' + stype * klvdata.repeat
-		s = struct.Struct(fmt)
+		s = get_struct(chr(klvdata.type), klvdata.repeat)
 		data = s.unpack_from(klvdata.rawdata)
 		return(data)
 
@@ -129,11 +214,18 @@ class LabelXYZData(LabelBase):
 			raise Exception("Invalid length for ACCL packet")
 		
 		# we need to process the SCAL value to measure properly the DATA
-		stype = map_type(klvdata.type)
-		s = struct.Struct('>' + stype*3)
+		s = get_struct(chr(klvdata.type), 3)
 		data = XYZData._make(s.unpack_from(klvdata.rawdata))
 		return(data)
 
+	def BuildArray(self, klvdata):
+		"all the samples of the payload as a (repeat, 3) array"
+		if klvdata.size != 6 and klvdata.size != 12:
+			raise Exception("Invalid length for %s packet" % klvdata.fourCC)
+		if not klvdata.rawdata:
+			return np.zeros((0, 3), dtype=maptype_numpy[chr(klvdata.type)])
+		return np.frombuffer(klvdata.rawdata, dtype=maptype_numpy[chr(klvdata.type)], count=klvdata.repeat * 3).reshape(klvdata.repeat, 3)
+
 class LabelACCL(LabelXYZData):
 	"""
 	3-axis accelerometer 200Hz, m/s2
@@ -152,6 +244,22 @@ class LabelGYRO(LabelXYZData):
 	def __init__(self):
 		LabelXYZData.__init__(self)
 
+class LabelGRAV(LabelXYZData):
+	"""
+	gravity vector, unit vector (SCAL 32767)
+	"""
+
+	def __init__(self):
+		LabelXYZData.__init__(self)
+
+class LabelMAGN(LabelXYZData):
+	"""
+	3-axis magnetometer, uT
+	"""
+
+	def __init__(self):
+		LabelXYZData.__init__(self)
+
 class LabelGPSF(LabelBase):
 	"""
 	GPS Fix 1 Hz 
@@ -224,6 +332,8 @@ class LabelUNIT(LabelBase):
 		return(data)
 
 class LabelGPS5(LabelBase):
+	gps5_struct = struct.Struct('>' + map_type(ord('l')) * 5)
+
 	def __init__(self):
 		LabelBase.__init__(self)
 
@@ -236,91 +346,182 @@ class LabelGPS5(LabelBase):
 			# empty point
 			data = [ GPSData(0,0,0,0,0) ]
 		else:
-			data = []
-			for r in range(klvdata.repeat):
-				stype = map_type(klvdata.type)
-				s = struct.Struct('>' + stype * 5 )
-				data_item = GPSData._make( s.unpack_from(klvdata.rawdata[r*4*5:(r+1)*4*5]) )
-				data.append(data_item)
+			s = LabelGPS5.gps5_struct
+			data = [ GPSData._make(item) for item in s.iter_unpack(klvdata.rawdata[0:klvdata.repeat * s.size]) ]
 		return(data)
 
-class LabelGPS9(LabelBase):
+	def BuildArray(self, klvdata):
+		"the whole payload as a (repeat, 5) array"
+		if not klvdata.rawdata:
+			return np.zeros((1, 5), dtype='>i4')
+		return np.frombuffer(klvdata.rawdata, dtype='>i4', count=klvdata.repeat * 5).reshape(klvdata.repeat, 5)
+
+class LabelComplex(LabelBase):
+	"""
+	'?' typed labels. The layout of each sample is the TYPE label of the
+	stream (klvdata.complex_type), compiled once with get_struct.
+	default_type is used when the stream has no TYPE, or when it doesn't
+	match the fields of the namedtuple returned.
+	"""
+	default_type = None
+	fields = None
+
 	def __init__(self):
 		LabelBase.__init__(self)
 
+	def type_string(self, klvdata):
+		type_string = klvdata.complex_type
+		if not type_string:
+			return self.default_type
+		if self.fields and count_fields(type_string) != len(self.fields._fields):
+			return self.default_type
+		return type_string
+
+	def layout(self, klvdata):
+		"""
+		the type string of the samples: type_string, or default_type if it
+		doesn't match the sample size. None if neither does.
+		"""
+		for type_string in (self.type_string(klvdata), self.default_type):
+			if type_string and get_struct(type_string).size == klvdata.size:
+				return type_string
+		return None
+
+	def Build(self, klvdata):
+		"a list with a tuple (or fields) for each sample"
+		type_string = self.layout(klvdata)
+		if not klvdata.rawdata or not type_string:
+			# no layout describes this payload
+			return LabelEmpty.Build(self, klvdata)
+
+		s = get_struct(type_string)
+		items = s.iter_unpack(klvdata.rawdata[0:klvdata.repeat * s.size])
+		if self.fields:
+			return [ self.fields._make(item) for item in items ]
+		return list(items)
+
+class LabelGPS9(LabelComplex):
+	default_type = 'lllllllSS'
+	fields = GPS9Data
+
+	def __init__(self):
+		LabelComplex.__init__(self)
+
 	def Build(self, klvdata):
 		if not klvdata.rawdata:
 			# empty point
-			data = [ GPS9Data(0,0,0,0,0,0,0,0,0) ]
-		else:
-			data = []
-			for r in range(klvdata.repeat):
-				gps9_type = 'lllllllSS'
-				stype = "".join( [map_type(ord(x)) for x in gps9_type ])
-
-				s = struct.Struct('>' + stype )
-				data_item = GPS9Data._make(s.unpack_from(klvdata.rawdata[r * (4 * 7 + 2 * 2):(r + 1) * (4 * 7 + 2 * 2)]))
-				data.append(data_item)
-		return(data)
+			return [ GPS9Data(0,0,0,0,0,0,0,0,0) ]
+		return LabelComplex.Build(self, klvdata)
+
+	def BuildArray(self, klvdata):
+		"the whole payload as a structured array, with the GPS9Data fields"
+		if not klvdata.rawdata:
+			return np.zeros(1, dtype=get_dtype(self.type_string(klvdata), GPS9Data._fields))
+		type_string = self.layout(klvdata)
+		if type_string is None:
+			raise Exception("Invalid length for GPS9 packet")
+		dtype = get_dtype(type_string, GPS9Data._fields)
+		return np.frombuffer(klvdata.rawdata, dtype=dtype, count=klvdata.repeat)
+
+class LabelGPRI(LabelComplex):
+	"""
+	Karma drone passes the raw GPS data in this way, using a complex type:
+	STNM c 1 7 {GPS RAW} |b'GPS RAW\x00'| [47 50 53 20 52 41 57 00]
+	UNIT c 3 10 {None} |b's\x00\x00degdegm'| [73 00 00 64 65 67 64 65 67 6d 00 00 6d 00 00 6d 00 00 6d 2f 73 64 65 67 00 00 00 00 00 00 00 00]
+	TYPE c 1 10 {b'JlllSSSSBB'} |b'JlllSSSSBB'| [4a 6c 6c 6c 53 53 53 53 42 42 00 00]
+	SCAL l 4 10 {(1000000, 10000000, 10000000, 1000, 100, 100, 100, 100, 1, 1)} |b'\x00\x0fB@\x00\x98\x96\x80\x00\x98'| [00 0f 42 40 00 98 96 80 00 98 96 80 00 00 03 e8 00 00 00 64 00 00 00 64 00 00 00 64 00 00 00 64 00 00 00 01 00 00 00 01]
+	GPRI ? 30 4 {b'\x00\x00\x00\x00\tI\xb4\xde\x13\xbe'} |b'\x00\x00\x00\x00\tI\xb4\xde\x13\xbe'| [	
+	"""
+	default_type = 'JlllSSSSBB'
+	fields = KARMAGPSData
 
-class LabelGPRI(LabelBase):
 	def __init__(self):
-		LabelBase.__init__(self)
+		LabelComplex.__init__(self)
 
 	def Build(self, klvdata):
-		"""
-		Karma drone passes the raw GPS data in this way, using a complex type:
-		STNM c 1 7 {GPS RAW} |b'GPS RAW\x00'| [47 50 53 20 52 41 57 00]
-		UNIT c 3 10 {None} |b's\x00\x00degdegm'| [73 00 00 64 65 67 64 65 67 6d 00 00 6d 00 00 6d 00 00 6d 2f 73 64 65 67 00 00 00 00 00 00 00 00]
-		TYPE c 1 10 {b'JlllSSSSBB'} |b'JlllSSSSBB'| [4a 6c 6c 6c 53 53 53 53 42 42 00 00]
-		SCAL l 4 10 {(1000000, 10000000, 10000000, 1000, 100, 100, 100, 100, 1, 1)} |b'\x00\x0fB@\x00\x98\x96\x80\x00\x98'| [00 0f 42 40 00 98 96 80 00 98 96 80 00 00 03 e8 00 00 00 64 00 00 00 64 00 00 00 64 00 00 00 64 00 00 00 01 00 00 00 01]
-		GPRI ? 30 4 {b'\x00\x00\x00\x00\tI\xb4\xde\x13\xbe'} |b'\x00\x00\x00\x00\tI\xb4\xde\x13\xbe'| [	
-		
-		"""
-		karma_type = 'JlllSSSSBB'
-		s_karma_type = "".join( [map_type(ord(x)) for x in karma_type ])
-
 		if not klvdata.rawdata:
 			# empty point
-			data = GPSData(0,0,0,0,0)
-		else:
-			stype = map_type(klvdata.type)
-			s = struct.Struct('>' + s_karma_type )
-			data_tuple = s.unpack_from(klvdata.rawdata)
-			data = KARMAGPSData._make( data_tuple )
-		return(data)
+			return GPSData(0,0,0,0,0)
+		# only the first sample is used
+		return LabelComplex.Build(self, klvdata)[0]
 
-class LabelSYST(LabelBase):
+class LabelSYST(LabelComplex):
 	"""
-	UTC time and data from GPS, 1Hz n/a
+	karma time 
+	UNIT c 1 2 {None} |b'ss\x00\x00'| [73 73 00 00]
+	TYPE c 1 2 {b'JJ\x00\x00'} |b'JJ\x00\x00'| [4a 4a 00 00]
+	SCAL l 4 2 {(1000000, 1000)} |b'\x00\x0fB@\x00\x00\x03\xe8'| [00 0f 42 40 00 00 03 e8]
+	SYST ? 16 1 {b'\x00\x00\x00\x00\tc\xec\x92\x00\x00'} |b'\x00\x00\x00\x00\tc\xec\x92\x00\x00'| [00 00 00 00 09 63 ec 92 00 00 01 5b 7d 62 f5 28]
 	"""
+	default_type = 'JJ'
+	fields = SYSTData
+
 	def __init__(self):
-		Label_TypeUTimeStamp.__init__(self)
+		LabelComplex.__init__(self)
 
 	def Build(self, klvdata):
-		"""
-		karma time 
-		UNIT c 1 2 {None} |b'ss\x00\x00'| [73 73 00 00]
-		TYPE c 1 2 {b'JJ\x00\x00'} |b'JJ\x00\x00'| [4a 4a 00 00]
-		SCAL l 4 2 {(1000000, 1000)} |b'\x00\x0fB@\x00\x00\x03\xe8'| [00 0f 42 40 00 00 03 e8]
-		SYST ? 16 1 {b'\x00\x00\x00\x00\tc\xec\x92\x00\x00'} |b'\x00\x00\x00\x00\tc\xec\x92\x00\x00'| [00 00 00 00 09 63 ec 92 00 00 01 5b 7d 62 f5 28]
-		"""
 		if not klvdata.rawdata:
-			data = SYSTData(0,0)
-		else:
-			karma_type = 'JJ'
-			s_karma_type = "".join( [map_type(ord(x)) for x in karma_type ])
-			stype = map_type(klvdata.type)
+			return SYSTData(0,0)
+		return LabelComplex.Build(self, klvdata)[0]
 
-			s = struct.Struct('>' + s_karma_type )
-			data_tuple = s.unpack_from(klvdata.rawdata)
-			data = SYSTData._make( data_tuple )
-		return(data)
+class LabelTYPE(Label_TypecString):
+	"layout of the '?' samples of the stream, see LabelComplex"
+	def __init__(self):
+		Label_TypecString.__init__(self)
 
 class LabelTMPC(LabelBase):
 	def __init__(self):
 		LabelBase.__init__(self)
 
+def decode_label(label):
+	"fourCC bytes to str. Labels that aren't valid unicode become ERRU"
+	try:
+		return label.decode()
+	except UnicodeDecodeError as e:
+		return "ERRU"
+
+def label_key(label):
+	"the fourCC (str or bytes) as a 32 bit big endian integer, the way it's read from the header"
+	if isinstance(label, int):
+		return label
+	if isinstance(label, str):
+		label = label.encode()
+	return int.from_bytes(label, 'big')
+
+def key_label(key):
+	"the fourCC str of a key, for display"
+	return decode_label(key.to_bytes(4, 'big'))
+
+# keys of the labels compared in the parsers and builders. The str label
+# (KLVData.fourCC) is only made for display
+DEVC = label_key('DEVC')
+STRM = label_key('STRM')
+TYPE = label_key('TYPE')
+DVNM = label_key('DVNM')
+SCAL = label_key('SCAL')
+TSMP = label_key('TSMP')
+STMP = label_key('STMP')
+TICK = label_key('TICK')
+STNM = label_key('STNM')
+SIUN = label_key('SIUN')
+UNIT = label_key('UNIT')
+ORIN = label_key('ORIN')
+GPSU = label_key('GPSU')
+GPSF = label_key('GPSF')
+GPSP = label_key('GPSP')
+GPS5 = label_key('GPS5')
+GPS9 = label_key('GPS9')
+SYST = label_key('SYST')
+GPRI = label_key('GPRI')
+
+# sticky metadata that describes the data of a STRM (GPMF spec). The first
+# label in a stream that is not one of these is the stream data.
+stream_metadata_labels = set(label_key(label) for label in [
+	"STMP", "TSMP", "TICK", "TOCK", "STNM", "RMRK", "SIUN", "UNIT",
+	"SCAL", "TYPE", "TMPC", "ORIN", "ORIO", "MTRX", "EMPT", "TIMO",
+	"QUAN", "GPSF", "GPSU", "GPSP", "GPSA"
+])
+
 skip_labels = [ 
 	#"TIMO", "YAVG", "ISOE", "FACE", "SHUT", "WBAL", "WRGB", "UNIF", "FCNM", 
 	#"FWVS", "KBAT", "ATTD",	"GLPI",	"VFRH",	"BPOS",	"ATTR",	"SIMU",	"ESCS",	"SCPR",	"LNED",	"CYTS",	"CSEN" 
@@ -345,18 +546,18 @@ labels = {
 		"TMPC" : LabelTMPC,
 		"TSMP" : LabelTSMP,
 		"UNIT" : LabelUNIT,
-		"TICK" : LabelEmpty,
+		"TICK" : LabelBase, ## milliseconds
 		"STNM" : LabelSTNM,
 		"ISOG" : LabelEmpty,
 		"SHUT" : LabelEmpty,
-		"TYPE" : LabelEmpty,
+		"TYPE" : LabelTYPE,
 		"FACE" : LabelEmpty,
 		"FCNM" : LabelEmpty,
 		"ISOE" : LabelEmpty,
 		"WBAL" : LabelEmpty,
 		"WRGB" : LabelEmpty,
-		"MAGN" : LabelEmpty,
-		"STMP" : LabelEmpty,
+		"MAGN" : LabelMAGN,
+		"STMP" : LabelBase, ## microseconds since the record start
 		"STPS" : LabelEmpty,
 		"SROT" : LabelEmpty,
 		"TIMO" : LabelEmpty,
@@ -370,7 +571,7 @@ labels = {
         "GPSA" : LabelEmpty, ## Unknown GPS data        ## New for Hero8?
         "IORI" : LabelEmpty, ## Image Orientation       ## New for Hero8?        
         "CORI" : LabelEmpty, ## Camera Orientation      ## New for Hero8?        
-        "GRAV" : LabelEmpty, ## Gravity Vector          ## New for Hero8?            
+        "GRAV" : LabelGRAV,  ## Gravity Vector          ## New for Hero8?            
         "WNDM" : LabelEmpty, ## Window Processing       ## New for Hero8?         
         "MWET" : LabelEmpty, ## Microphone Wet          ## New for Hero8?   
         "AALP" : LabelEmpty, ## AGC Audio Level         ## New for Hero8?		
@@ -419,7 +620,7 @@ labels = {
 		# gopro MAX  fix
 		"CORI": LabelEmpty,  # Camera ORIentation
 		"IORI": LabelEmpty,  # Image ORIentation
-		"GRAV": LabelEmpty,  # GRAvity Vector
+		"GRAV": LabelGRAV,   # GRAvity Vector
 		"DISP": LabelEmpty,  # Disparity track (360 modes)
 
 		# gopro 11
@@ -436,11 +637,58 @@ labels = {
 		
 }
 
+# the decoders are stateless, so there's one instance per label, keyed
+# by the integer fourCC (label_key)
+decoders = { label_key(label): decoder() for label, decoder in labels.items() }
+skip_keys = set(label_key(label) for label in skip_labels)
+complex_decoder = LabelComplex()
+
+# labels without decoder found in this run, so the warning is shown once
+unknown_labels = set()
+
+def get_decoder(key):
+	"""
+	the decoder for a key, or None. A miss is resolved once by name (for
+	the ERRU labels) and then cached; unknown labels are reported once.
+	"""
+	decoder = decoders.get(key)
+	if decoder is not None or key in unknown_labels:
+		return decoder
+
+	label = key_label(key)
+	if label in labels:
+		decoder = decoders[label_key(label)]
+		decoders[key] = decoder
+		return decoder
+
+	unknown_labels.add(key)
+	issue_url = "https://github.com/juanmcasillas/gopro2gpx/issues/new"
+	print("Warning. fourCC Label '%s' not found. Please summit a issue to: %s" % (label,issue_url ))
+	return None
+
+def ManageArray(klvdata):
+	"""
+	NumPy decoding of the whole payload, for the labels that support it.
+	Returns None if numpy is not installed or the label has no BuildArray.
+	"""
+	if np is None:
+		return None
+	decoder = decoders.get(klvdata.key)
+	if decoder is None or not hasattr(decoder, 'BuildArray'):
+		return None
+	return decoder.BuildArray(klvdata)
+
+def as_columns(array):
+	"a structured array as a 2D float array, one column per field"
+	if array.dtype.names is None:
+		return array.astype(float)
+	return np.stack([ array[name].astype(float) for name in array.dtype.names ], axis=1)
+
 def Manage(klvdata):
-	if klvdata.fourCC in labels.keys():
-		return labels[klvdata.fourCC]().Build(klvdata)
-	else:
-		issue_url = "https://github.com/juanmcasillas/gopro2gpx/issues/new"
-		print("Warning. fourCC Label '%s' not found. Please summit a issue to: %s" % (klvdata.fourCC,issue_url ))
+	decoder = get_decoder(klvdata.key)
+	if klvdata.type == ord('?') and (decoder is None or type(decoder) is LabelEmpty) and klvdata.complex_type:
+		# no specific decoder, use the TYPE of the stream
+		return complex_decoder.Build(klvdata)
+	if decoder is None:
 		return False
-
+	return decoder.Build(klvdata)
@@ -11,9 +11,13 @@
 
 import argparse
 import array
+import contextlib
+import itertools
+import mmap
 import os
 import platform
 import re
+import shutil
 import struct
 import subprocess
 import sys
@@ -30,18 +34,93 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 # Importar módulos del paquete
-from .config import setup_environment
-from .ffmpegtools import FFMpegTools
+from .config import cache_dir, setup_environment
+from .ffmpegtools import FFMpegTools, VERSION_CACHE
 from . import fourCC
 from . import gpmf
+from . import archive
+from . import cache
+from . import columnar
+from . import flatgeobuf
+from . import gpsbuilder
+from . import imu
+from . import probecache
+from . import simplify
 from . import gpshelper
 from . import VERSION
 
+# labels read by BuildGPSPoints. The rest of the stream is skipped when parsing.
+GPS_LABELS = { 'DVNM', 'SCAL', 'TSMP', 'GPSU', 'GPSF', 'GPSP', 'GPS5', 'GPS9', 'SYST', 'GPRI' }
+# streams holding these labels. The other STRM (ACCL, GYRO, CORI, ...) are jumped over.
+GPS_STREAMS = { 'GPS5', 'GPS9', 'SYST', 'GPRI' }
+
+# --gps-source: (streams read, data labels skipped). gps9 reads the GPS5
+# stream only for its GPSU (start time), the GPS5 samples aren't decoded.
+GPS_SOURCES = {
+    'gps9': ({ 'GPS5', 'GPS9' }, { 'GPS5' }),
+    'gps5': ({ 'GPS5' }, set()),
+    'gpri': ({ 'GPRI', 'SYST' }, set()),
+}
+
+def selectGPSSource(gps_source, found):
+    """
+    the GPS source to read. With 'auto', the best one of the streams
+    found (see gpmf.scanStreams): GPS9, then GPS5, then GPRI (karma)
+    """
+    if gps_source != 'auto':
+        return gps_source
+    for source, label in (('gps9', 'GPS9'), ('gps5', 'GPS5'), ('gpri', 'GPRI')):
+        if label in found:
+            return source
+    return 'gps5'
+
+def GPSSamples(d, SCAL):
+    """
+    returns (raw, scaled) for each sample of a GPS5/GPS9 klv. raw are the
+    integers of the payload, scaled the values divided by SCAL. With NumPy
+    the whole payload is decoded and scaled at once.
+    """
+    array = d.array
+    if array is None:
+        return [ (item, [ float(x) / float(y) for x,y in zip(item, SCAL) ]) for item in d.data ]
+
+    raw = fourCC.as_columns(array)[:, 0:len(SCAL)]
+    scaled = raw / fourCC.np.asarray(SCAL, dtype=float)
+    return zip(array.tolist(), scaled.tolist())
+
 def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
     """
     Procesa los datos extraídos y genera una lista de puntos GPS.
 
-    [Sin cambios en esta función...]
+    With NumPy the payloads are processed as arrays (gpsbuilder), else
+    point by point (BuildGPSPointsLoop). Both give the same points, as a
+    gpshelper.Track.
+    """
+    if fourCC.np is not None:
+        builder = gpsbuilder.BuildGPSPoints(data, skip=skip, skipDop=skipDop, dopLimit=dopLimit, timeShift=timeShift)
+        points, start_time, DVNM, stats = builder.points(), builder.start_time, builder.DVNM, builder.stats
+    else:
+        points, start_time, DVNM, stats = BuildGPSPointsLoop(data, skip=skip, skipDop=skipDop, dopLimit=dopLimit, timeShift=timeShift)
+        points = gpshelper.Track.from_points(points)
+
+    print("-- stats -----------------")
+    total_points = sum(stats.values())
+    print("Device: %s" % DVNM)
+    print("- Ok:              %5d" % stats['ok'])
+    print("- GPSFIX=0 (bad):  %5d (skipped: %d)" % (stats['badfix'], stats['badfixskip']))
+    print("- GPSP>%4d (bad): %5d (skipped: %d)" % (dopLimit, stats['baddop'], stats['baddopskip']))
+    print("- Empty (No data): %5d" % stats['empty'])
+    print("Total points:      %5d" % total_points)
+    print("--------------------------")
+    if timeShift > 0:
+        print(f"Timestamp shifted: {timeShift}s")
+        start_time = start_time - datetime.timedelta(seconds=timeShift)
+    return (points, start_time, DVNM)
+
+def BuildGPSPointsLoop(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
+    """
+    point by point version of BuildGPSPoints, used without NumPy.
+    Returns (points, start_time, device name, stats)
     """
     points = []
     start_time = None
@@ -64,29 +143,29 @@ def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
     DVNM = "Unknown"
 
     for d in data:
-        # print("fourCC: {}".format(d.fourCC))
-        if d.fourCC == 'SCAL':
+        key = d.key
+        if key == fourCC.SCAL:
             SCAL = d.data
-        elif d.fourCC == "DVNM":
+        elif key == fourCC.DVNM:
             DVNM = d.data
-        elif d.fourCC == 'GPSU':
+        elif key == fourCC.GPSU:
             GPSU = d.data
             if start_time is None:
                 start_time = GPSU
-        elif d.fourCC == 'GPSF':
+        elif key == fourCC.GPSF:
             if d.data != GPSFIX:
                 print("GPSFIX change to %s [%s]" % (d.data, fourCC.LabelGPSF.xlate[d.data]))
             GPSFIX = d.data
-        elif d.fourCC == 'TSMP':
+        elif key == fourCC.TSMP:
             if TSMP == 0:
                 TSMP  = d.data
             else:
                 TSMP = d.data - TSMP
-        elif d.fourCC == 'GPS5':
+        elif key == fourCC.GPS5:
             t_delta = 1/18.0
             sample_count = 0
-            for item in d.data:
-                if item.lon == item.lat == item.alt == 0:
+            for item, retdata in GPSSamples(d, SCAL):
+                if item[0] == item[1] == item[2] == 0:
                     print("Warning: Skipping empty point")
                     stats['empty'] += 1
                     continue
@@ -102,18 +181,16 @@ def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
                         print("Warning: skipping point due to GPSP>limit. GPSP: %s, limit: %s" % (GPSP, dopLimit))
                         stats["baddopskip"] += 1
                         continue
-                retdata = [ float(x) / float(y) for x,y in zip(item._asdict().values(), list(SCAL)) ]
                 gpsdata = fourCC.GPSData._make(retdata)
                 gpstime = GPSU + datetime.timedelta(seconds=sample_count*t_delta) + datetime.timedelta(seconds=timeShift)
                 p = gpshelper.GPSPoint(gpsdata.lat, gpsdata.lon, gpsdata.alt, gpstime, gpsdata.speed, 'GPS5')
                 points.append(p)
                 stats['ok'] += 1
                 sample_count += 1
-        elif d.fourCC == 'GPS9':
-            for item in d.data:
-                GPSFIX = item.fix
-                GPSP = item.dop
-                if item.lon == item.lat == item.alt == 0:
+        elif key == fourCC.GPS9:
+            for item, retdata in GPSSamples(d, SCAL):
+                GPSP, GPSFIX = item[7:9]
+                if item[0] == item[1] == item[2] == 0:
                     print("Warning: Skipping empty point")
                     stats['empty'] += 1
                     continue
@@ -129,7 +206,6 @@ def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
                         print("Warning: skipping point due to GPSP>limit. GPSP: %s, limit: %s" % (GPSP, dopLimit))
                         stats["baddopskip"] += 1
                         continue
-                retdata = [ float(x) / float(y) for x,y in zip(item._asdict().values(), list(SCAL)) ]
                 gpsdata = fourCC.GPS9Data._make(retdata)
                 target_date = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(days=gpsdata.days_since_2000)
                 time_of_day = datetime.timedelta(seconds=gpsdata.secs_since_midnight)
@@ -139,11 +215,11 @@ def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
                 p = gpshelper.GPSPoint(gpsdata.lat, gpsdata.lon, gpsdata.alt, gps_time, gpsdata.speed, 'GPS9')
                 points.append(p)
                 stats['ok'] += 1
-        elif d.fourCC == 'SYST':
+        elif key == fourCC.SYST:
             data_vals = [ float(x) / float(y) for x,y in zip(d.data._asdict().values(), list(SCAL)) ]
             if data_vals[0] != 0 and data_vals[1] != 0:
                 SYST = fourCC.SYSTData._make(data_vals)
-        elif d.fourCC == 'GPRI':
+        elif key == fourCC.GPRI:
             if d.data.lon == d.data.lat == d.data.alt == 0:
                 print("Warning: Skipping empty point")
                 stats['empty'] += 1
@@ -161,24 +237,12 @@ def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
                 p = gpshelper.GPSPoint(gpsdata.lat, gpsdata.lon, gpsdata.alt, syst_time, gpsdata.speed)
                 points.append(p)
                 stats['ok'] += 1
-        elif d.fourCC == 'GPSP':
+        elif key == fourCC.GPSP:
             if GPSP != d.data:
                 print("GPSP change to %s [%s]" % (d.data, fourCC.LabelGPSP.xlate(d.data)))
             GPSP = d.data
 
-    print("-- stats -----------------")
-    total_points = sum(stats.values())
-    print("Device: %s" % DVNM)
-    print("- Ok:              %5d" % stats['ok'])
-    print("- GPSFIX=0 (bad):  %5d (skipped: %d)" % (stats['badfix'], stats['badfixskip']))
-    print("- GPSP>%4d (bad): %5d (skipped: %d)" % (dopLimit, stats['baddop'], stats['baddopskip']))
-    print("- Empty (No data): %5d" % stats['empty'])
-    print("Total points:      %5d" % total_points)
-    print("--------------------------")
-    if timeShift > 0:
-        print(f"Timestamp shifted: {timeShift}s")
-        start_time = start_time - datetime.timedelta(seconds=timeShift)
-    return (points, start_time, DVNM)
+    return (points, start_time, DVNM, stats)
 
 
 def parseArgs():
@@ -186,6 +250,7 @@ def parseArgs():
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--verbose", help="increase output verbosity", action="count")
     parser.add_argument("-b", "--binary", help="read data from bin file", action="store_true")
+    parser.add_argument("--ffmpeg", help="extract the gpmd track with ffmpeg instead of the native MP4 reader", action="store_true", default=False)
     parser.add_argument("-s", "--skip", help="Skip bad points (GPSFIX=0)", action="store_true", default=False)
     parser.add_argument("--skip-dop", help="Skip high Dilution of Precision points (GPSP>X)", action="store_true", default=False)
     parser.add_argument("--dop-limit", help="Dilution of Precision limit", default=2000, type=int)
@@ -193,6 +258,24 @@ def parseArgs():
     parser.add_argument("--gpx", help="Generate only GPX output", action="store_true", default=False)
     parser.add_argument("--kml", help="Generate only KML output", action="store_true", default=False)
     parser.add_argument("--csv", help="Generate only CSV output", action="store_true", default=False)
+    parser.add_argument("--fgb", help="Generate FlatGeobuf output, with a spatial index", action="store_true", default=False)
+    parser.add_argument("--geojsonseq", help="Generate newline delimited GeoJSON output (.geojsonl)", action="store_true", default=False)
+    parser.add_argument("--geo-features", help="Features of the --fgb and --geojsonseq outputs: a point per point, or the segments between them", choices=['points', 'segments'], default='points')
+    parser.add_argument("--archive", help="Also save the track in a compact native archive (.%s), that reopens without parsing the GPMF data" % archive.EXTENSION, action="store_true", default=False)
+    parser.add_argument("--gps-source", help="GPS stream to read (default auto: GPS9 if present, else GPS5, else GPRI)", choices=['auto', 'gps5', 'gps9', 'gpri'], default='auto')
+    parser.add_argument("--compress", help="Compress the output (gpx.gz, csv.gz, kmz): never, always, or auto (when bigger than --compress-threshold)", choices=['never', 'always', 'auto'], default='never')
+    parser.add_argument("--compress-level", help="Compression level, 1 (fast) to 9 (small)", default=6, type=int, choices=range(1, 10), metavar="{1..9}")
+    parser.add_argument("--compress-threshold", help="Estimated size in bytes from which --compress auto compresses a format", default=16*1024*1024, type=int)
+    parser.add_argument("--columnar", help="Also save the track (and the --imu streams) as columns: parquet or arrow (need pyarrow), npz (needs numpy), or auto (parquet if pyarrow is installed, else npz)", choices=['auto'] + list(columnar.FORMATS), default=None)
+    parser.add_argument("--simplify", help="Simplify the track before writing it: drop the points that deviate less than TOLERANCE_M meters", default=None, type=float, metavar="TOLERANCE_M")
+    parser.add_argument("--simplify-method", help="Simplification: dp (Douglas-Peucker) or vw (Visvalingam-Whyatt)", choices=list(simplify.METHODS), default='dp')
+    parser.add_argument("--simplify-max-gap", help="Keep at least a point every SECONDS when simplifying", default=None, type=float, metavar="SECONDS")
+    parser.add_argument("--precision", help="Decimals of the coordinates (default: all)", default=None, type=int)
+    parser.add_argument("--imu", help="Save all the ACCL, GYRO, GRAV and MAGN samples in a .imu.npz file (needs numpy)", action="store_true", default=False)
+    parser.add_argument("--no-proxy", help="Don't read the telemetry from the GoPro .LRV proxy of the videos", action="store_true", default=False)
+    parser.add_argument("--no-cache", help="Don't use the cache of extracted telemetry and decoded tracks", action="store_true", default=False)
+    parser.add_argument("--cache-dir", help="Directory of the cache (default: %s)" % cache_dir(), default=None)
+    parser.add_argument("--cache-size", help="Maximum size of the cache, in MB", default=cache.MAX_SIZE // (1024 * 1024), type=int)
     # Opción para modo GUI
     parser.add_argument("--gui", help="Run in GUI mode (do not exit after file generation)", action="store_true", default=False)
     parser.add_argument("--version", help="show the gopro2gpx version and exit", action="version", version=version_text)
@@ -204,27 +287,202 @@ def main_core(args):
     # Aseguramos que args.gui exista
     if not hasattr(args, 'gui'):
         args.gui = False
+    if not hasattr(args, 'ffmpeg'):
+        args.ffmpeg = False
+    if not hasattr(args, 'imu'):
+        args.imu = False
+    if not hasattr(args, 'precision'):
+        args.precision = None
+    if not hasattr(args, 'gps_source'):
+        args.gps_source = 'auto'
+    if not hasattr(args, 'columnar'):
+        args.columnar = None
+    if not hasattr(args, 'simplify'):
+        args.simplify = None
+        args.simplify_method = 'dp'
+        args.simplify_max_gap = None
+    if not hasattr(args, 'archive'):
+        args.archive = False
+    if not hasattr(args, 'fgb'):
+        args.fgb = False
+    if not hasattr(args, 'geojsonseq'):
+        args.geojsonseq = False
+    if not hasattr(args, 'geo_features'):
+        args.geo_features = 'points'
+    if not hasattr(args, 'no_proxy'):
+        args.no_proxy = False
+    if not hasattr(args, 'no_cache'):
+        # only the command line uses the cache by default
+        args.no_cache = True
+        args.cache_dir = None
+        args.cache_size = cache.MAX_SIZE // (1024 * 1024)
+    if not hasattr(args, 'compress'):
+        args.compress = 'never'
+        args.compress_level = 6
+        args.compress_threshold = 16*1024*1024
 
     config = setup_environment(args)
+    # report the unknown labels once per run
+    fourCC.unknown_labels.clear()
     
     files = args.files
     output_file = args.outputfile
-    ffmpegtools = FFMpegTools(ffprobe=config.ffprobe_cmd, ffmpeg=config.ffmpeg_cmd)
-    data = []
-    for num, filename in enumerate(files):
-        reader = gpmf.GpmfFileReader(ffmpegtools, verbose=config.verbose)
-        if not args.binary:
-            raw_data = reader.readRawTelemetryFromMP4(filename)
+    columnar_format = None
+    if args.columnar:
+        # checked before writing anything
+        try:
+            columnar_format = columnar.check(None if args.columnar == 'auto' else args.columnar)
+        except columnar.ColumnarError as e:
+            print("Can't create the columnar output: %s" % e)
+    # --no-cache and --cache-dir apply to the telemetry, ffprobe and ffmpeg version caches
+    probe_cache = None
+    version_cache = None
+    if not args.no_cache:
+        probe_cache = probecache.ProbeCache(os.path.join(args.cache_dir, "probe.sqlite") if args.cache_dir else None)
+        version_cache = os.path.join(args.cache_dir, VERSION_CACHE) if args.cache_dir else True
+    ffmpegtools = FFMpegTools(ffprobe=config.ffprobe_cmd, ffmpeg=config.ffmpeg_cmd, probe_cache=probe_cache, version_cache=version_cache)
+    # with --ffmpeg the track is parsed while ffmpeg extracts it, unless
+    # the whole track is needed (-vv dump, --imu)
+    streaming = args.ffmpeg and not args.binary and not args.imu and config.verbose != 2
+    prioritize_gps9 = False
+    telemetry_cache = None if args.no_cache else cache.TelemetryCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    # the decoded track is cached by the GPMF data and the options
+    options = { 'skip': args.skip, 'skipDop': args.skip_dop, 'dopLimit': args.dop_limit,
+                'timeShift': args.time_shift, 'gps_source': args.gps_source }
+    # the GPS source picked by auto is GPS9, but it may have no points left
+    # after --skip/--skip-dop. Then all the streams are read, as without it
+    gps9_fallback = False
+
+    def parse(filename, reader, raw_data, streams, skipped, tee=None):
+        "the labels of the GPS source of a file (streams, without the skipped data labels)"
+        # -vvv dumps every label, so don't filter them
+        if config.verbose == 3:
+            parse_fourccs, parse_streams = None, None
+        else:
+            parse_fourccs, parse_streams = GPS_LABELS - skipped, streams
+        if raw_data is None:
+            klvs = reader.iterTelemetryFromFFmpeg(filename, fourccs=parse_fourccs, streams=parse_streams, tee=tee)
+        elif not args.binary:
+            klvs = gpmf.parseStream(raw_data, config.verbose, fourccs=parse_fourccs, streams=parse_streams)
         else:
-            raw_data = reader.readRawTelemetryFromBinary(filename)
-        if config.verbose == 2:
+            # read incrementally, BuildGPSPoints consumes the labels as they are parsed
+            klvs = reader.iterTelemetryFromBinary(filename, fourccs=parse_fourccs, streams=parse_streams)
+        if config.verbose == 3:
+            skipped_keys = set(fourCC.label_key(label) for label in skipped)
+            klvs = (klv for klv in klvs if klv.key not in skipped_keys)
+        return klvs
+
+    # sha256 of the GPMF data of each file (or its cache.RawWriter while it's streamed).
+    # Known by the identity of the file once it has been read
+    raw_hashes = [ None ] * len(files)
+    # with the track of the same data and options, nothing is read or parsed
+    cached = None
+    if telemetry_cache is not None:
+        raw_hashes = [ telemetry_cache.rawHash(filename) for filename in files ]
+        if config.verbose != 3 and all(raw_hashes):
+            cached = telemetry_cache.getTrack(raw_hashes, options)
+    data = []
+    # the memory mapped .bin files are closed once the track is built
+    with contextlib.ExitStack() as resources:
+        # (reader, GPMF data) of each file. The data is None if it's streamed,
+        # or not needed (track in the cache)
+        sources = []
+        for num, filename in enumerate(files):
+            reader = gpmf.GpmfFileReader(ffmpegtools, verbose=config.verbose, native=not args.ffmpeg, proxy=not args.no_proxy)
+            raw_data = None
+            if cached is not None and not args.imu and config.verbose != 2:
+                sources.append((reader, raw_data))
+                continue
+            if telemetry_cache is not None and not args.binary:
+                raw_data = telemetry_cache.getRaw(filename)
+                if raw_data is not None and config.verbose:
+                    print("Telemetry of %s read from the cache" % filename)
+            if raw_data is None and not streaming:
+                if not args.binary:
+                    raw_data = reader.readRawTelemetryFromMP4(filename)
+                    if telemetry_cache is not None:
+                        raw_hashes[num] = telemetry_cache.putRaw(filename, raw_data)
+                else:
+                    raw_data = reader.readRawTelemetryFromBinary(filename)
+                if isinstance(raw_data, mmap.mmap):
+                    resources.callback(raw_data.close)
+            if telemetry_cache is not None and raw_hashes[num] is None and raw_data is not None:
+                raw_hashes[num] = telemetry_cache.rawHash(filename, raw_data)
+            sources.append((reader, raw_data))
+
+        for num, (filename, (reader, raw_data)) in enumerate(zip(files, sources)):
+            file_streaming = raw_data is None
             binary_filename = f"{output_file}.{num:02d}.bin"
-            print("Creating output file for binary data: %s" % binary_filename)
-            with open(binary_filename, "wb") as f:
-                f.write(raw_data)
-        data += gpmf.parseStream(raw_data, config.verbose)
+            if cached is None:
+                if file_streaming:
+                    # nothing to scan before parsing: with auto, all the GPS streams
+                    # are read, and the GPS9 points preferred once built
+                    gps_source = args.gps_source
+                    if gps_source == 'auto':
+                        streams, skipped = GPS_STREAMS, set()
+                        prioritize_gps9 = True
+                    else:
+                        streams, skipped = GPS_SOURCES[gps_source]
+                else:
+                    # only the samples of one GPS source are decoded. The streams
+                    # are only scanned to pick it
+                    found = gpmf.scanStreams(raw_data) if args.gps_source == 'auto' else set()
+                    gps_source = selectGPSSource(args.gps_source, found)
+                    streams, skipped = GPS_SOURCES[gps_source]
+                    # GPS5 is read again if no GPS9 point is left (see below)
+                    gps9_fallback = gps9_fallback or (gps_source == 'gps9' and args.gps_source == 'auto')
+                if config.verbose:
+                    print("GPS source: %s" % gps_source)
+
+                tee = None
+                if file_streaming and telemetry_cache is not None:
+                    tee = telemetry_cache.rawWriter(filename)
+                    raw_hashes[num] = tee
+                data = itertools.chain(data, parse(filename, reader, raw_data, streams, skipped, tee))
 
-    points, start_time, device_name = BuildGPSPoints(data, skip=args.skip, skipDop=args.skip_dop, dopLimit=args.dop_limit, timeShift=args.time_shift)
+            if config.verbose == 2:
+                print("Creating output file for binary data: %s" % binary_filename)
+                if not args.binary:
+                    with open(binary_filename, "wb") as f:
+                        f.write(raw_data)
+                else:
+                    shutil.copyfile(filename, binary_filename)
+            if args.imu:
+                imu_filename = f"{output_file}.{num:02d}.imu.npz"
+                if fourCC.np is None:
+                    print("Can't create %s, IMU extraction needs numpy" % imu_filename)
+                else:
+                    imu_streams = imu.extractIMU(raw_data)
+                    if columnar_format:
+                        imu_filenames = columnar.write(f"{output_file}.{num:02d}.imu", streams=imu_streams, fmt=columnar_format)
+                    else:
+                        imu.writeIMU(imu_filename, imu_streams)
+                        imu_filenames = [ imu_filename ]
+                    for stream in imu_streams.values():
+                        print(stream)
+                    for name in imu_filenames:
+                        print("Archivo IMU generado: {}".format(name))
+
+        if cached is not None:
+            points, start_time, device_name = cached
+            print("Track read from the cache: %d points" % len(points))
+        else:
+            try:
+                points, start_time, device_name = BuildGPSPoints(data, skip=args.skip, skipDop=args.skip_dop, dopLimit=args.dop_limit, timeShift=args.time_shift)
+                if gps9_fallback and gpshelper.SOURCE_CODES['GPS9'] not in points.source:
+                    print("No GPS9 points left, reading the GPS5 ones")
+                    data = itertools.chain.from_iterable(parse(filename, reader, raw_data, GPS_STREAMS, set())
+                                                         for filename, (reader, raw_data) in zip(files, sources))
+                    points, start_time, device_name = BuildGPSPoints(data, skip=args.skip, skipDop=args.skip_dop, dopLimit=args.dop_limit, timeShift=args.time_shift)
+                if prioritize_gps9:
+                    points = gpshelper._prioritize_gps9(points)
+                raw_hashes = [ h.commit() if isinstance(h, cache.RawWriter) else h for h in raw_hashes ]
+            finally:
+                for h in raw_hashes:
+                    if isinstance(h, cache.RawWriter):
+                        h.discard()
+            if telemetry_cache is not None:
+                telemetry_cache.putTrack(raw_hashes, options, points, start_time, device_name)
     if len(points) == 0:
         print("Can't create file. No GPS info in %s. Exiting" % args.files)
         if not args.gui:
@@ -232,38 +490,58 @@ def main_core(args):
         else:
             return
 
-    # Determinar cuántos formatos se solicitaron; si ninguno, se generan los tres.
-    num_formats = 0
-    if args.gpx: num_formats += 1
-    if args.kml: num_formats += 1
-    if args.csv: num_formats += 1
-    if num_formats == 0:
-        num_formats = 3
-
-    # Generar KML si se solicitó o si se generan todos
-    if args.kml or num_formats == 3:
-        kml = gpshelper.generate_KML(points)
-        with open(f"{output_file}.kml", "w") as fd:
-            fd.write(kml)
-        print("Archivo KML generado: {}.kml".format(output_file))
-        if (args.kml and not args.gpx and not args.csv) and (not args.gui):
-            sys.exit()
-
-    # Generar GPX si se solicitó o si se generan todos
-    if args.gpx or num_formats == 3:
-        gpx = gpshelper.generate_GPX(points, start_time, trk_name=device_name)
-        with open(f"{output_file}.gpx", "w") as fd:
-            fd.write(gpx)
-        print("Archivo GPX generado: {}.gpx".format(output_file))
-        if (args.gpx and not args.kml and not args.csv) and (not args.gui):
-            sys.exit()
-
-    # Generar CSV si se solicitó o si se generan todos
-    if args.csv or num_formats == 3:
-        csv_data = gpshelper.generate_CSV(points, start_time, trk_name=device_name)
-        with open(f"{output_file}.csv", "w", newline='') as fd:
-            fd.write(csv_data)
-        print("Archivo CSV generado: {}.csv".format(output_file))
+    if args.simplify is not None:
+        count = len(points)
+        points = simplify.simplify(points, args.simplify, max_gap=args.simplify_max_gap, method=args.simplify_method)
+        print("Simplified track: %d -> %d points" % (count, len(points)))
+
+    # Si no se pide ningún formato, se generan los tres (KML, GPX y CSV).
+    all_formats = not (args.gpx or args.kml or args.csv or args.fgb or args.geojsonseq)
+    segments = args.geo_features == 'segments'
+
+    # Los formatos se generan en una sola pasada sobre los puntos
+    outputs = []
+    if args.kml or all_formats:
+        outputs.append(("KML", "kml", lambda fd: gpshelper.KMLWriter(fd)))
+    if args.gpx or all_formats:
+        outputs.append(("GPX", "gpx", lambda fd: gpshelper.GPXWriter(fd, start_time, trk_name=device_name)))
+    if args.csv or all_formats:
+        outputs.append(("CSV", "csv", lambda fd: gpshelper.CSVWriter(fd)))
+    if args.geojsonseq:
+        outputs.append(("GeoJSONSeq", "geojsonl", lambda fd: gpshelper.GeoJSONSeqWriter(fd, segments=segments)))
+
+    filenames = []
+    with contextlib.ExitStack() as stack:
+        writers = []
+        for _, extension, make_writer in outputs:
+            if args.compress == 'auto':
+                compress = gpshelper.output_size(points, extension) > args.compress_threshold
+            else:
+                compress = args.compress == 'always'
+            fd, filename = gpshelper.open_output(stack, output_file, extension, compress=compress, level=args.compress_level)
+            writers.append(make_writer(fd))
+            filenames.append(filename)
+        with gpshelper.MultiWriter(writers, precision=args.precision) as writer:
+            writer.write(points)
+
+    for (name, _, _), filename in zip(outputs, filenames):
+        print("Archivo {} generado: {}".format(name, filename))
+
+    if args.fgb:
+        filename = f"{output_file}.fgb"
+        with open(filename, "wb") as fd:
+            flatgeobuf.write(fd, points, name=device_name, segments=segments)
+        print("Archivo FlatGeobuf generado: {}".format(filename))
+
+    if args.archive:
+        filename = f"{output_file}.{archive.EXTENSION}"
+        with open(filename, "wb") as fd:
+            archive.write(fd, points, start_time=start_time, name=device_name)
+        print("Archivo {} generado: {}".format(archive.EXTENSION, filename))
+
+    if columnar_format:
+        for filename in columnar.write(output_file, track=points, fmt=columnar_format):
+            print("Archivo {} generado: {}".format(columnar_format, filename))
     # En modo GUI, simplemente retornamos sin llamar a sys.exit().
 
 def main():
@@ -12,40 +12,124 @@
 #   https://github.com/stilldavid/gopro-utils/blob/master/telemetry/reader.go
 
 
-import array
+import io
+import mmap
 import os
 import struct
 import sys
 
+from . import fourCC
 from .klvdata import KLVData
+from .mp4 import MP4Reader, MP4Error
+
+
+# the gpmd tracks of a video and its proxy can't differ more (in seconds)
+PROXY_DURATION_TOLERANCE = 0.5
+
+
+def proxyNames(filename):
+    """
+    the names the GoPro low resolution proxy (.LRV) of a video can have:
+    GX010039.MP4 and GH010039.MP4 -> GL010039.LRV, GOPR0039.MP4 -> GOPR0039.LRV
+    """
+    directory, name = os.path.split(filename)
+    base, extension = os.path.splitext(name)
+    if extension.upper() != '.MP4':
+        return []
+    bases = [ base ]
+    if base[:2].upper() in ('GX', 'GH'):
+        bases.insert(0, base[0] + ('L' if base[1].isupper() else 'l') + base[2:])
+    return [ os.path.join(directory, b + e) for b in bases for e in ('.LRV', '.lrv') ]
 
 
 class GpmfFileReader:
-    def __init__(self, ffmpegtools, verbose=0):
+    def __init__(self, ffmpegtools, verbose=0, native=True, proxy=True):
         self.verbose = verbose
         self.ffmtools = ffmpegtools
+        self.native = native
+        # read the telemetry from the .LRV proxy of the videos, if there is one
+        self.proxy = proxy
+        self.mp4reader = MP4Reader()
+
+    def findProxy(self, filename):
+        """the .LRV proxy of filename, if it has the same telemetry: a gpmd track of the same
+        duration and the same GPSU in the first DEVC (or the same first DEVC, without GPSU).
+        """
+        for proxy in proxyNames(filename):
+            if not os.path.exists(proxy):
+                continue
+            try:
+                if self.sameTelemetry(filename, proxy):
+                    return proxy
+            except (MP4Error, OSError):
+                pass
+            if self.verbose:
+                print("Proxy %s doesn't match %s, ignored" % (proxy, filename))
+        return None
+
+    def sameTelemetry(self, filename, proxy):
+        tracks = [ self.mp4reader.getTrack(name) for name in (filename, proxy) ]
+        if None in tracks or not all(track.sizes for track in tracks):
+            return False
+        durations = [ track.duration / (track.timescale or 1) for track in tracks ]
+        if abs(durations[0] - durations[1]) > PROXY_DURATION_TOLERANCE:
+            return False
+
+        first = [ bytes(self.mp4reader.getSample(name, 0)) for name in (filename, proxy) ]
+        gpsu = [ next((klv.data for klv in parseStream(sample, fourccs={ fourCC.GPSU }) if klv.key == fourCC.GPSU), None)
+                 for sample in first ]
+        if gpsu[0] is None:
+            return first[0] == first[1]
+        return gpsu[0] == gpsu[1]
+
+    def telemetryFile(self, filename):
+        "the file to read the telemetry of filename from: its proxy, or itself"
+        if self.proxy:
+            proxy = self.findProxy(filename)
+            if proxy is not None:
+                if self.verbose:
+                    print("Reading the telemetry of %s from its proxy %s" % (filename, proxy))
+                return proxy
+        return filename
 
 
     def readRawTelemetryFromMP4(self, filename):
-        """read data the metadata track from video. Requires FFMPEG wrapper.
+        """read data the metadata track from video. The native MP4 reader
+        seeks straight to the gpmd samples; the FFMPEG wrapper is used when
+        native is False or the container can't be parsed.
         """
 
         if not os.path.exists(filename):
             raise FileNotFoundError("Can't open %s" % filename)
 
-        track_number, info = self.ffmtools.getMetadataTrack(filename)
-        if not track_number:
+        filename = self.telemetryFile(filename)
+        if self.native:
+            try:
+                return self._readRawTelemetry(self.mp4reader, filename)
+            except MP4Error as e:
+                if self.verbose:
+                    print("Native MP4 reader failed on %s (%s). Using ffmpeg" % (filename, e))
+
+        return self._readRawTelemetry(self.ffmtools, filename)
+
+    def _readRawTelemetry(self, tools, filename):
+        track_number, info = tools.getMetadataTrack(filename)
+        if track_number is None:
+            if tools is self.mp4reader:
+                raise MP4Error("no gpmd track found")
             raise Exception("File %s doesn't have any metadata" % filename)
 
         if self.verbose:
             print("Working on file %s track %s (%s)" % (filename, track_number, info))
 
-        metadata_raw = self.ffmtools.getMetadata(track_number, filename)
+        metadata_raw = tools.getMetadata(track_number, filename)
 
         return metadata_raw
 
     def readRawTelemetryFromBinary(self, filename):
-        """read data from binary file, instead extract the metadata track from video. Useful for quick development
+        """read data from binary file, instead extract the metadata track from video. Useful for quick development.
+        The file is memory mapped, so parseStream works over the page cache without copying it. The caller
+        closes the mmap (b'' for an empty file) once the KLVs parsed from it are no longer used.
         """
         if not os.path.exists(filename):
             raise FileNotFoundError("Can't open %s" % filename)
@@ -53,40 +137,364 @@ class GpmfFileReader:
         if self.verbose:
             print("Reading binary file %s" % filename)
 
-        fd = open(filename, 'rb')
-        metadata_raw = fd.read()
-        fd.close()
+        with open(filename, 'rb') as fd:
+            if os.fstat(fd.fileno()).st_size == 0:
+                # empty files can't be mapped
+                return b''
+            metadata_raw = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
 
         return metadata_raw
 
+    def iterTelemetryFromBinary(self, filename, fourccs=None, streams=None):
+        """incremental version of readRawTelemetryFromBinary + parseStream: yields the KLVs
+        reading the file one DEVC at a time.
+        """
+        if not os.path.exists(filename):
+            raise FileNotFoundError("Can't open %s" % filename)
+
+        if self.verbose:
+            print("Reading binary file %s" % filename)
+
+        return self._iterFile(filename, fourccs, streams)
+
+    def iterTelemetryFromFFmpeg(self, filename, fourccs=None, streams=None, tee=None):
+        """incremental readRawTelemetryFromMP4 + parseStream, extracting the track with ffmpeg:
+        the KLVs are parsed from its output while it runs. ffmpeg is stopped if the generator
+        is closed (or fails) before the end. tee (with a write method) gets a copy of the data.
+        """
+        if not os.path.exists(filename):
+            raise FileNotFoundError("Can't open %s" % filename)
+
+        return self._iterFFmpeg(self.telemetryFile(filename), fourccs, streams, tee)
 
-def parseStream(data_raw, verbose=0):
+    def _iterFFmpeg(self, filename, fourccs, streams, tee):
+        track_number, info = self.ffmtools.getMetadataTrack(filename)
+        if track_number is None:
+            raise Exception("File %s doesn't have any metadata" % filename)
+
+        if self.verbose:
+            print("Working on file %s track %s (%s)" % (filename, track_number, info))
+
+        with self.ffmtools.openMetadata(track_number, filename) as fd:
+            if tee is not None:
+                fd = TeeReader(fd, tee)
+            yield from iterStream(fd, self.verbose, fourccs=fourccs, streams=streams)
+
+    def _iterFile(self, filename, fourccs, streams):
+        with open(filename, 'rb') as fd:
+            yield from iterStream(fd, self.verbose, fourccs=fourccs, streams=streams)
+
+
+class TeeReader(io.RawIOBase):
+    "a readable stream that copies the data read from fd to sink"
+    def __init__(self, fd, sink):
+        self.fd = fd
+        self.sink = sink
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.fd.readinto(b)
+        if n:
+            self.sink.write(bytes(memoryview(b)[:n]))
+        return n
+
+
+class DeviceNode:
     """
-    main code that reads the points
+    a DEVC container. The device level labels (DVID, DVNM, ...) and its
+    streams are yielded by walkStream after it.
     """
-    data = array.array('b')
-    data.frombytes(data_raw)
+    def __init__(self, klv, offset):
+        self.klv = klv
+        self.offset = offset
+        self.end = offset + 8 + klv.padded_length
+
+    def __str__(self):
+        return "DEVC offset=%d length=%d" % (self.offset, self.klv.padded_length)
+
+
+def streamHeader(data, offset, end, header=None):
+    """
+    unpacks the raw headers of the STRM content in [offset, end) up to its
+    data label, the first one that isn't sticky metadata. Returns (key,
+    offset) of the data label, key is None if there is only metadata. The
+    (offset, label, type) of the metadata are appended to header.
+    """
+    unpack = KLVData.header.unpack_from
+    metadata_labels = fourCC.stream_metadata_labels
+    while offset < end:
+        label, type_, size, repeat = unpack(data, offset)
+        if type_ != 0 and label not in metadata_labels:
+            return label, offset
+        if header is not None:
+            header.append((offset, label, type_))
+        offset += 8
+        if type_ != 0:
+            offset += (size * repeat + 3) & ~3
+    return None, offset
+
+
+class StreamNode:
+    """
+    a STRM container. header holds the sticky metadata labels (STNM, TYPE,
+    SCAL, ...) found before the first data label (fourCC). Only the raw
+    headers are unpacked until fourCC is known: if the stream is skipped,
+    no KLVData is built and header and klvs are empty.
+    """
+    def __init__(self, data, offset, device):
+        self.data = data
+        self.offset = offset
+        _, _, size, repeat = KLVData.header.unpack_from(data, offset)
+        self.end = offset + 8 + ((size * repeat + 3) & ~3)
+        self.device = device
+        self.key = None
+        self.klvs = []
+        self.skipped = False
+        self._klv = None
+        # the TYPE of the '?' samples
+        self.type_klv = None
+        # (offset, label, type) of the metadata, and the KLVData built of them
+        self._header = []
+        self._built = {}
+
+    @property
+    def klv(self):
+        "the STRM KLVData, only built when needed"
+        if self._klv is None:
+            self._klv = KLVData(self.data, self.offset)
+        return self._klv
+
+    @property
+    def header(self):
+        "the metadata KLVs, built when needed"
+        if self.skipped:
+            return []
+        return [ self.build(*entry) for entry in self._header ]
+
+    def build(self, offset, label, type_):
+        klv = self._built.get(offset)
+        if klv is None:
+            klv = KLVData(self.data, offset)
+            if type_ == ord('?'):
+                klv.type_klv = self.type_klv
+            self._built[offset] = klv
+        return klv
+
+    @property
+    def fourCC(self):
+        "the data label as str (None if the stream only has metadata)"
+        if self.key is None:
+            return None
+        return fourCC.key_label(self.key)
+
+    def read(self, data, streams=None, fourccs=None):
+        """
+        streams and fourccs are sets of integer keys (see walkStream)
+        """
+        end = min(self.end, len(data))
+        self.key, offset = streamHeader(data, self.offset + 8, end, self._header)
+        unpack = KLVData.header.unpack_from
+
+        if streams is not None and (self.key is None or self.key not in streams):
+            # not wanted, or only metadata and no data inside
+            self.skipped = True
+            return self
+
+        for position, label, type_ in self._header:
+            if label == fourCC.TYPE:
+                self.type_klv = self.build(position, label, type_)
+            if fourccs is None or label in fourccs:
+                self.klvs.append(self.build(position, label, type_))
+
+        while offset < end:
+            label, type_, size, repeat = unpack(data, offset)
+            if fourccs is None or label in fourccs:
+                klv = KLVData(data, offset)
+                if label == fourCC.TYPE:
+                    self.type_klv = klv
+                elif type_ == ord('?'):
+                    klv.type_klv = self.type_klv
+                self.klvs.append(klv)
+            offset += 8
+            if type_ != 0:
+                offset += (size * repeat + 3) & ~3
+        return self
+
+    def __str__(self):
+        return "STRM offset=%d fourCC=%s%s" % (self.offset, self.fourCC, ' (skipped)' if self.skipped else '')
+
+
+def walkStream(data_raw, streams=None, fourccs=None):
+    """
+    walks the DEVC/STRM tree. Yields a DeviceNode when a DEVC starts, the
+    device level KLVs, and a StreamNode for each STRM. If streams is given,
+    the STRM whose data label is not in it is stepped over with a single
+    jump. If fourccs is given, only these labels are read (see parseStream).
+    streams and fourccs hold labels (str) or their keys (fourCC.label_key).
+    """
+    data = memoryview(data_raw).cast('B')
+
+    if streams is not None:
+        streams = set(fourCC.label_key(label) for label in streams)
+    if fourccs is not None:
+        fourccs = set(fourCC.label_key(label) for label in fourccs)
 
     offset = 0
-    klvlist = []
+    device = None
 
     while offset < len(data):
+        label, type_, size, repeat = KLVData.header.unpack_from(data, offset)
 
-        klv = KLVData(data,offset)
-        if not klv.skip():
-            klvlist.append(klv)
-            if verbose == 3:
-                print(klv)
-        else:
-            if klv:
-                print("Warning, skipping klv", klv)
-            else:
-                # unknown label
-                pass
+        if type_ == 0 and label == fourCC.STRM:
+            node = StreamNode(data, offset, device).read(data, streams, fourccs)
+            yield node
+            offset = node.end
+            continue
+
+        if type_ == 0 and label == fourCC.DEVC:
+            device = DeviceNode(KLVData(data, offset), offset)
+            yield device
+        elif fourccs is None or label in fourccs:
+            yield KLVData(data, offset)
 
         offset += 8
-        if klv.type != 0:
-            offset += klv.padded_length
-            #print(">offset:%d length:%d padded:%d" % (offset, length, padded_length))
+        if type_ != 0:
+            offset += (size * repeat + 3) & ~3
+
+
+def scanStreams(data_raw):
+    """
+    the data labels of the STRM found (GPS5, GPS9, ACCL, ...). Only the
+    headers are read, every stream is jumped over.
+    """
+    data = memoryview(data_raw).cast('B')
+    unpack = KLVData.header.unpack_from
+    keys = set()
+
+    offset = 0
+    while offset < len(data):
+        label, type_, size, repeat = unpack(data, offset)
+        offset += 8
+        if type_ == 0 and label == fourCC.STRM:
+            stream_end = offset + ((size * repeat + 3) & ~3)
+            keys.add(streamHeader(data, offset, min(stream_end, len(data)))[0])
+            offset = stream_end
+        elif type_ != 0:
+            offset += (size * repeat + 3) & ~3
+
+    keys.discard(None)
+    return set(fourCC.key_label(key) for key in keys)
+
+
+def parseStream(data_raw, verbose=0, fourccs=None, streams=None):
+    """
+    main code that reads the points. data_raw can be any buffer (bytes,
+    bytearray, mmap, memoryview); the KLVs keep slices of it, no copies.
+    If fourccs is given, only these labels are returned; the rest are
+    stepped over reading just their header. If streams is given, only the
+    STRM containers with these data labels are read (see walkStream).
+    """
+    if fourccs is not None:
+        fourccs = set(fourCC.label_key(label) for label in fourccs)
+    keep_strm = fourccs is None or fourCC.STRM in fourccs
+    keep_devc = fourccs is None or fourCC.DEVC in fourccs
+
+    klvlist = []
+
+    for node in walkStream(data_raw, streams=streams, fourccs=fourccs):
+
+        if isinstance(node, StreamNode):
+            if node.skipped:
+                klvs = []
+            elif keep_strm:
+                klvs = [ node.klv ] + node.klvs
+            else:
+                klvs = node.klvs
+        elif isinstance(node, DeviceNode):
+            klvs = [ node.klv ] if keep_devc else []
+        else:
+            klvs = [ node ]
+
+        for klv in klvs:
+            if not klv.skip():
+                klvlist.append(klv)
+                if verbose == 3:
+                    print(klv)
+            else:
+                if klv:
+                    print("Warning, skipping klv", klv)
+                else:
+                    # unknown label
+                    pass
 
     return(klvlist)
+
+
+def readExactly(fd, size, buffer=None):
+    """
+    read size bytes from a file, pipe or socket, looping on short reads.
+    Returns less bytes only at the end of the stream.
+    """
+    if buffer is None:
+        buffer = bytearray(size)
+    view = memoryview(buffer)
+    pos = 0
+    while pos < size:
+        n = fd.readinto(view[pos:size])
+        if not n:
+            break
+        pos += n
+    view.release()
+    return pos
+
+
+def iterDevices(fd):
+    """
+    yields each top level block (a DEVC, about one second of telemetry) of
+    a readable binary stream as soon as it is complete. A block can't be
+    bigger than 8 + 255 * 65535 bytes (size x repeat), so that is the
+    maximum buffer used. A truncated block at the end is dropped, with a
+    warning.
+    """
+    header = bytearray(8)
+    offset = 0
+    while True:
+        n = readExactly(fd, 8, header)
+        if n == 0:
+            return
+        if n < 8:
+            print("Warning, truncated GPMF header at offset %d" % offset)
+            return
+
+        label, type_, size, repeat = KLVData.header.unpack(header)
+        length = (size * repeat + 3) & ~3
+
+        block = bytearray(8 + length)
+        block[:8] = header
+        body = memoryview(block)[8:]
+        n = readExactly(fd, length, body)
+        body.release()
+        if n < length:
+            # the partial block can't be parsed, it's dropped
+            print("Warning, truncated GPMF block %s at offset %d" % (fourCC.key_label(label), offset))
+            return
+        yield block
+        offset += 8 + length
+
+
+def iterStream(fd, verbose=0, fourccs=None, streams=None):
+    """
+    incremental parseStream over a readable binary stream (an open .bin
+    file, the ffmpeg stdout pipe, a socket...). The KLVs are yielded as
+    soon as their DEVC block is read, so memory doesn't grow with the
+    length of the recording.
+    """
+    # the labels are turned into keys once, not per block
+    if fourccs is not None:
+        fourccs = set(fourCC.label_key(label) for label in fourccs)
+    if streams is not None:
+        streams = set(fourCC.label_key(label) for label in streams)
+    for block in iterDevices(fd):
+        yield from parseStream(block, verbose, fourccs=fourccs, streams=streams)
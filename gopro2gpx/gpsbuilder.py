@@ -0,0 +1,522 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# NumPy version of gopro2gpx.BuildGPSPointsLoop. Only the keys of the
+# labels are read one by one: the labels are processed in chunks of
+# CHUNK_SIZE, where the payloads of each kind (GPS5, GPS9, GPSU, GPSF,
+# GPSP, SCAL) are joined and decoded with a single np.frombuffer, and the
+# state each GPS payload sees (the last SCAL, GPSU, GPSFIX and GPSP before
+# it) is looked up by position instead of replayed label by label. TSMP
+# doesn't change the points, so it isn't read. The points, stats, start
+# time and messages are the same of the loop version.
+
+import datetime
+import itertools
+from operator import attrgetter
+
+from . import fourCC
+from . import gpshelper
+
+np = fourCC.np
+
+GPS9_EPOCH = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+US_PER_SECOND = 1000000
+US_PER_DAY = 86400 * US_PER_SECOND
+
+
+def timedelta_us(values, factor=US_PER_SECOND):
+    """
+    microseconds of datetime.timedelta(seconds=v) (or days, with factor
+    US_PER_DAY) for an array of floats, rounded the same way: the integer
+    part is exact and the fraction is rounded half to even.
+    """
+    frac, whole = np.modf(np.asarray(values, dtype=float))
+    frac_us, whole_us = np.modf(frac * float(factor))
+    us = whole.astype(np.int64) * factor + whole_us.astype(np.int64)
+
+    rounding = np.where(frac_us > 0.5, 1, np.where(frac_us < -0.5, -1, 0))
+    tie = (np.abs(frac_us) == 0.5) & (us % 2 == 1)
+    return us + np.where(tie, np.sign(frac_us).astype(np.int64), rounding)
+
+
+
+
+# labels processed together, see GPSBuilder.add
+CHUNK_SIZE = 65536
+
+# the points and messages are sorted by the position of their label and
+# the sample in its payload: position << SAMPLE_BITS | sample
+SAMPLE_BITS = 16
+
+# GPSP before the first one (None)
+NO_GPSP = -1
+
+GPS9_DECODER = fourCC.get_decoder(fourCC.GPS9)
+
+KEY = attrgetter('key')
+HEADER = attrgetter('type', 'size', 'repeat')
+RAWDATA = attrgetter('rawdata')
+REPEAT = attrgetter('repeat')
+SIZE = attrgetter('size')
+TYPE_KLV = attrgetter('type_klv')
+
+
+def pick(klvs, positions):
+    "the labels at positions (an array)"
+    return list(map(klvs.__getitem__, positions.tolist()))
+
+
+def state_at(positions, values, where, initial):
+    """
+    the value of the last event (at positions, sorted) before each
+    position in where, initial before the first one
+    """
+    if not len(positions):
+        return np.full(len(where), initial, dtype=np.int64)
+    j = np.searchsorted(positions, where) - 1
+    return np.where(j >= 0, values[np.maximum(j, 0)], initial)
+
+
+def merge_events(*events):
+    "(positions, values) of several kinds of events, sorted by position"
+    positions = np.concatenate([ p for p, _ in events ])
+    values = np.concatenate([ v for _, v in events ]).astype(np.int64)
+    order = np.argsort(positions, kind='stable')
+    return positions[order], values[order]
+
+
+def numbers(klvs, header=None):
+    """
+    the values of integer labels (SCAL, GPSF, GPSP) as an int64 array, a
+    row per label, decoded with a single np.frombuffer. None if they don't
+    share type, size and repeat (header, if it's known).
+    """
+    if header is None:
+        headers = set(map(HEADER, klvs))
+        if len(headers) != 1:
+            return None
+        header = headers.pop()
+    type_, size, repeat = header
+    if chr(type_) not in 'bBsSlL':
+        return None
+    dtype = np.dtype(fourCC.maptype_numpy[chr(type_)])
+    padded = (size * repeat + 3) // 4 * 4
+    try:
+        data = b''.join(map(RAWDATA, klvs))
+    except TypeError:
+        # empty labels
+        return None
+    if dtype.itemsize != size or len(data) != padded * len(klvs):
+        return None
+    row = np.dtype({ 'names': [ 'v' ], 'formats': [ (dtype, (repeat,)) ], 'itemsize': padded })
+    return np.frombuffer(data, dtype=row)['v'].astype(np.int64).reshape(len(klvs), repeat)
+
+
+def scalars(klvs):
+    "the value of single valued labels (GPSF, GPSP) as an int64 array"
+    rows = numbers(klvs)
+    if rows is not None and rows.shape[1] == 1:
+        return rows[:, 0]
+    return np.array([ d.data for d in klvs ], dtype=np.int64)
+
+
+def gpsu_us(klvs):
+    """
+    GPSU labels ('yymmddhhmmss.fff') as microseconds (see gpshelper.to_us),
+    parsed as arrays. The ones in other formats are decoded with .data
+    """
+    try:
+        data = b''.join(map(RAWDATA, klvs))
+    except TypeError:
+        # empty labels
+        data = b''
+    if len(data) != 16 * len(klvs):
+        invalid = b'?' * 16
+        data = b''.join([ d.rawdata if d.rawdata is not None and len(d.rawdata) == 16 else invalid for d in klvs ])
+    text = np.frombuffer(data, dtype=np.uint8).reshape(len(klvs), 16).astype(np.int64)
+    digits = text - ord('0')
+    valid = ((digits[:, :12] >= 0) & (digits[:, :12] <= 9)).all(axis=1) & (text[:, 12] == ord('.'))
+    valid &= ((digits[:, 13:] >= 0) & (digits[:, 13:] <= 9)).all(axis=1)
+
+    year, month, day, hour, minute, second = (digits[:, i] * 10 + digits[:, i + 1] for i in range(0, 12, 2))
+    # %y: 69-99 are 19xx
+    year = year + np.where(year < 69, 2000, 1900)
+    months = (year - 1970) * 12 + month - 1
+    first_day = months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    month_days = (months + 1).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) - first_day
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days) & (hour < 24) & (minute < 60) & (second < 60)
+
+    fraction = digits[:, 13] * 100 + digits[:, 14] * 10 + digits[:, 15]
+    us = ((first_day + day - 1) * US_PER_DAY + ((hour * 60 + minute) * 60 + second) * US_PER_SECOND
+          + fraction * 1000)
+    for i in np.flatnonzero(~valid).tolist():
+        us[i] = gpshelper.to_us(klvs[i].data)
+    return us
+
+
+class GPSBuilder:
+    def __init__(self, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
+        self.skip = skip
+        self.skipDop = skipDop
+        self.dopLimit = dopLimit
+        self.timeShift = timeShift
+        self.shift_us = gpshelper.to_us(datetime.timedelta(seconds=timeShift))
+
+        self.track = gpshelper.Track()
+        self.start_time = None
+        self.SCAL = fourCC.XYZData(1.0, 1.0, 1.0)
+        self.GPSU = None
+        self.GPSU_us = None
+        self.SYST = fourCC.SYSTData(0, 0)
+        self.GPSP = None
+        self.GPSFIX = 0
+        self.DVNM = "Unknown"
+        # (sort key, text) printed after each chunk
+        self.messages = []
+
+        self.stats = {
+            'ok': 0,
+            'badfix': 0,
+            'badfixskip': 0,
+            'empty' : 0,
+            'baddop': 0,
+            'baddopskip': 0
+        }
+
+    def filter(self, order, empty, badfix, baddop, dop):
+        """
+        applies the filters in order (empty, GPSFIX, DOP), with the messages
+        and stats of each point. order is the sort key of the points, dop
+        the GPSP of each one. Returns the mask of the points to keep.
+        """
+        stats = self.stats
+        messages = self.messages
+        stats['empty'] += int(empty.sum())
+        messages.extend((key, "Warning: Skipping empty point") for key in order[empty].tolist())
+        valid = ~empty
+
+        badfix = valid & badfix
+        stats['badfix'] += int(badfix.sum())
+        if self.skip:
+            stats['badfixskip'] += int(badfix.sum())
+            messages.extend((key, "Warning: Skipping point due GPSFIX==0") for key in order[badfix].tolist())
+            valid &= ~badfix
+
+        baddop = valid & baddop
+        stats['baddop'] += int(baddop.sum())
+        if self.skipDop:
+            stats['baddopskip'] += int(baddop.sum())
+            messages.extend((key, "Warning: skipping point due to GPSP>limit. GPSP: %s, limit: %s" % (value, self.dopLimit))
+                            for key, value in zip(order[baddop].tolist(), dop[baddop].tolist()))
+            valid &= ~baddop
+
+        stats['ok'] += int(valid.sum())
+        return valid
+
+    def scales(self, klvs, positions, where):
+        """
+        the SCAL of the labels at where (the last one before each): a
+        function that returns the SCAL of a row (row 0 is the one of the
+        previous chunk), the SCAL as a float table padded with 1.0, and
+        the row of each label
+        """
+        j = np.searchsorted(positions, where) - 1
+        used = np.unique(np.append(j[j >= 0], len(positions) - 1)) if len(positions) else j[0:0]
+        decoded = pick(klvs, positions[used])
+
+        # the GPS ones (several values) of the same header are decoded
+        # together, the rest one by one (values). The single values (not
+        # GPS) go in the first column of the table
+        groups = {}
+        headers = list(map(HEADER, decoded))
+        if len(set(headers)) == 1:
+            groups[headers[0]] = list(range(1, len(decoded) + 1))
+        elif headers:
+            fields = np.array(headers, dtype=np.int64)
+            codes, inverse = np.unique((fields[:, 0] << 48) | (fields[:, 1] << 16) | fields[:, 2], return_inverse=True)
+            for k, code in enumerate(codes.tolist()):
+                groups[(code >> 48, (code >> 16) & 0xffffffff, code & 0xffff)] = (np.flatnonzero(inverse == k) + 1).tolist()
+        values = { 0: self.SCAL }
+        decoded_rows = []
+        for header, entries in groups.items():
+            rows = numbers([ decoded[i - 1] for i in entries ], header) if header[2] > 1 else None
+            if rows is None:
+                values.update((i, decoded[i - 1].data) for i in entries)
+            else:
+                decoded_rows.append((entries, rows))
+
+        width = max([ rows.shape[1] for _, rows in decoded_rows ] +
+                    [ len(value) if isinstance(value, tuple) else 1 for value in values.values() ])
+        table = np.ones((len(decoded) + 1, width))
+        integers = np.ones((len(decoded) + 1, width), dtype=np.int64)
+        widths = np.zeros(len(decoded) + 1, dtype=np.int64)
+        for entries, rows in decoded_rows:
+            table[entries, 0:rows.shape[1]] = rows
+            integers[entries, 0:rows.shape[1]] = rows
+            widths[entries] = rows.shape[1]
+        for i, value in values.items():
+            if isinstance(value, tuple):
+                table[i, 0:len(value)] = value
+            elif value is not None:
+                table[i, 0] = value
+
+        def value(i):
+            "the SCAL of row i, as decoded by the loop version"
+            if i in values:
+                return values[i]
+            return tuple(integers[i, 0:widths[i]].tolist())
+
+        self.SCAL = value(len(decoded))
+        return value, table, np.where(j >= 0, np.searchsorted(used, j) + 1, 0)
+
+    def layout(self, d):
+        "the type string of a non empty GPS9 payload (see LabelComplex.layout)"
+        layout = GPS9_DECODER.layout(d)
+        if layout is None:
+            raise Exception("Invalid length for GPS9 packet")
+        return layout
+
+    def samples(self, payloads, dtypes, fields):
+        """
+        the samples of the payloads as float columns (fields of them), with
+        the number of samples of each payload. dtypes is the dtype of the
+        samples, or a list with the one of each payload. An empty payload
+        is a zero sample.
+        """
+        if not isinstance(dtypes, list):
+            # usually all the payloads are full, and have the same layout
+            size = dtypes.itemsize
+            counts = np.fromiter(map(REPEAT, payloads), dtype=np.int64, count=len(payloads))
+            try:
+                data = b''.join(map(RAWDATA, payloads))
+            except TypeError:
+                # empty payloads
+                data = None
+            if data is not None and len(data) == counts.sum() * size:
+                return counts, fourCC.as_columns(np.frombuffer(data, dtype=dtypes)).reshape(-1, fields)
+            dtypes = [ dtypes ] * len(payloads)
+
+        counts = np.array([ d.repeat if d.rawdata else 1 for d in payloads ], dtype=np.int64)
+        groups = {}
+        for i, dtype in enumerate(dtypes):
+            groups.setdefault(dtype, []).append(i)
+        columns = []
+        for dtype, entries in groups.items():
+            size = dtype.itemsize
+            data = b''.join([ payloads[i].rawdata[0:payloads[i].repeat * size] if payloads[i].rawdata else bytes(size)
+                              for i in entries ])
+            if len(data) != counts[entries].sum() * size:
+                raise Exception("Invalid length for %s packet" % payloads[entries[0]].fourCC)
+            columns.append(fourCC.as_columns(np.frombuffer(data, dtype=dtype)).reshape(-1, fields))
+        if len(columns) == 1:
+            return counts, columns[0]
+        if not columns:
+            return counts, np.zeros((0, fields))
+        # samples of several layouts, back in the order of their payloads
+        entry = np.concatenate([ np.repeat(entries, counts[entries]) for entries in groups.values() ])
+        return counts, np.concatenate(columns)[np.argsort(entry, kind='stable')]
+
+    def gps9Dtypes(self, payloads):
+        """
+        the dtype of the samples of the GPS9 payloads (see samples), from
+        their TYPE. Empty payloads are a zero sample of the default layout.
+        """
+        if payloads and len(set(map(SIZE, payloads))) == 1:
+            # usually the same TYPE in every stream, compared as arrays
+            types = list(map(TYPE_KLV, payloads))
+            if None not in types:
+                try:
+                    data = b''.join(map(RAWDATA, types))
+                except TypeError:
+                    data = b''
+                width = len(data) // len(types)
+                if width and len(data) == width * len(types):
+                    text = np.frombuffer(data, dtype=np.uint8).reshape(len(types), width)
+                    if (text == text[0]).all():
+                        return fourCC.get_dtype(self.layout(payloads[0]), fourCC.GPS9Data._fields)
+
+        keys = [ (d.size, bytes(d.type_klv.rawdata) if d.type_klv is not None and d.type_klv.rawdata is not None else None)
+                 if d.rawdata else None for d in payloads ]
+        dtypes = {}
+        for key, d in zip(keys, payloads):
+            if key not in dtypes:
+                layout = self.layout(d) if key is not None else GPS9_DECODER.default_type
+                dtypes[key] = fourCC.get_dtype(layout, fourCC.GPS9Data._fields)
+        if len(dtypes) == 1:
+            return dtypes.popitem()[1]
+        return [ dtypes[key] for key in keys ]
+
+    def add(self, klvs):
+        """
+        processes a list of labels, in order. The state (SCAL, GPSU, GPSFIX,
+        GPSP, SYST and DVNM) is kept for the next ones.
+        """
+        keys = np.fromiter(map(KEY, klvs), dtype=np.uint32, count=len(klvs))
+        at = lambda key: np.flatnonzero(keys == key)
+        gps5, gps9, syst, gpri = at(fourCC.GPS5), at(fourCC.GPS9), at(fourCC.SYST), at(fourCC.GPRI)
+        gpsu, gpsf, gpsp = at(fourCC.GPSU), at(fourCC.GPSF), at(fourCC.GPSP)
+        dvnm = at(fourCC.DVNM)
+        if len(dvnm):
+            self.DVNM = klvs[dvnm[-1]].data
+
+        scal_value, table, index = self.scales(klvs, at(fourCC.SCAL), np.concatenate([ gps5, gps9, syst, gpri ]))
+        scal5, scal9, scal_syst, scal_gpri = np.split(index, np.cumsum([ len(gps5), len(gps9), len(syst) ]))
+
+        # GPS9 samples set GPSFIX and GPSP too: the last one of each payload
+        payloads = pick(klvs, gps9)
+        counts9, raw9 = self.samples(payloads, self.gps9Dtypes(payloads), 9)
+        last9 = np.cumsum(counts9) - 1
+        gpsf_values, gpsp_values = scalars(pick(klvs, gpsf)), scalars(pick(klvs, gpsp))
+        fix_positions, fixes = merge_events((gpsf, gpsf_values), (gps9, raw9[last9, 8]))
+        dop_positions, dops = merge_events((gpsp, gpsp_values), (gps9, raw9[last9, 7]))
+        initial_dop = NO_GPSP if self.GPSP is None else self.GPSP
+
+        changed = state_at(fix_positions, fixes, gpsf, self.GPSFIX) != gpsf_values
+        self.messages.extend((q << SAMPLE_BITS, "GPSFIX change to %s [%s]" % (value, fourCC.LabelGPSF.xlate[value]))
+                             for q, value in zip(gpsf[changed].tolist(), gpsf_values[changed].tolist()))
+        changed = state_at(dop_positions, dops, gpsp, initial_dop) != gpsp_values
+        self.messages.extend((q << SAMPLE_BITS, "GPSP change to %s [%s]" % (value, fourCC.LabelGPSP.xlate(value)))
+                             for q, value in zip(gpsp[changed].tolist(), gpsp_values[changed].tolist()))
+
+        # (sort key, lat, lon, ele, speed, time, source code) of the points kept
+        parts = []
+        scaled_at = []
+
+        counts5, raw5 = self.samples(pick(klvs, gps5), np.dtype(('>i4', (5,))), 5)
+        if len(gps5):
+            entry = np.repeat(np.arange(len(gps5)), counts5)
+            order = gps5[entry] << SAMPLE_BITS | (np.arange(len(entry)) - np.repeat(np.cumsum(counts5) - counts5, counts5))
+            scaled = raw5[:, 0:4] / table[scal5[entry], 0:4]
+            empty = (raw5[:, 0] == 0) & (raw5[:, 1] == 0) & (raw5[:, 2] == 0)
+            dop = np.repeat(state_at(dop_positions, dops, gps5, initial_dop), counts5)
+            badfix = np.repeat(state_at(fix_positions, fixes, gps5, self.GPSFIX) == 0, counts5)
+            keep = self.filter(order, empty, badfix, (dop != NO_GPSP) & (dop > self.dopLimit), dop)
+
+            # the GPSU before each payload
+            j = np.searchsorted(gpsu, gps5) - 1
+            used = np.unique(j[j >= 0])
+            gpsu_before = gpsu_us(pick(klvs, gpsu[used])) if len(used) else np.zeros(1, dtype=np.int64)
+            start = np.where(j >= 0, gpsu_before[np.minimum(np.searchsorted(used, j), len(gpsu_before) - 1)],
+                             self.GPSU_us if self.GPSU_us is not None else 0)
+            kept = entry[keep]
+            if self.GPSU_us is None and len(kept) and j[kept[0]] < 0:
+                raise TypeError("GPS5 data found before GPSU")
+
+            # 18Hz, the sample count only advances on the points kept
+            t_delta = 1/18.0
+            count = np.arange(len(kept)) - np.searchsorted(kept, kept)
+            time = start[kept] + timedelta_us(count * t_delta) + self.shift_us
+            parts.append((order[keep],) + tuple(scaled[keep].T) + (time, gpshelper.SOURCE_CODES['GPS5']))
+            scaled_at.append((gps5[-1], scal5[-1]))
+
+        time9 = None
+        if len(gps9):
+            entry = np.repeat(np.arange(len(gps9)), counts9)
+            order = gps9[entry] << SAMPLE_BITS | (np.arange(len(entry)) - np.repeat(np.cumsum(counts9) - counts9, counts9))
+            scaled = raw9[:, 0:7] / table[scal9[entry], 0:7]
+            empty = (raw9[:, 0] == 0) & (raw9[:, 1] == 0) & (raw9[:, 2] == 0)
+            dop = raw9[:, 7].astype(np.int64)
+            keep = self.filter(order, empty, raw9[:, 8] == 0, dop > self.dopLimit, dop)
+            time9 = (gpshelper.to_us(GPS9_EPOCH) + timedelta_us(scaled[keep, 5], US_PER_DAY) + timedelta_us(scaled[keep, 6])
+                     - 3600 * US_PER_SECOND - self.shift_us)
+            parts.append((order[keep],) + tuple(scaled[keep, 0:4].T) + (time9, gpshelper.SOURCE_CODES['GPS9']))
+            scaled_at.append((gps9[-1], scal9[-1]))
+            first9 = order[keep][0] >> SAMPLE_BITS if len(time9) else None
+
+        if len(syst) or len(gpri):
+            parts.append(self.addKarma(klvs, scal_value, syst, scal_syst, gpri, scal_gpri,
+                                       state_at(fix_positions, fixes, gpri, self.GPSFIX)))
+
+        if self.start_time is None:
+            # the first GPSU, or GPS9 point
+            first = []
+            if len(gpsu):
+                first.append((gpsu[0], klvs[gpsu[0]].data))
+            if time9 is not None and len(time9):
+                first.append((first9, gpshelper.from_us(int(time9[0]), utc=True)))
+            if first:
+                self.start_time = min(first, key=lambda candidate: candidate[0])[1]
+
+        # the state for the next labels
+        if len(gpsu):
+            self.GPSU = klvs[gpsu[-1]].data
+            self.GPSU_us = gpshelper.to_us(self.GPSU)
+        if len(fixes):
+            self.GPSFIX = int(fixes[-1])
+        if len(dops):
+            self.GPSP = None if dops[-1] == NO_GPSP else int(dops[-1])
+        if scaled_at:
+            scal = scal_value(max(scaled_at)[1])
+            self.track.scales.update(zip(('lat', 'lon', 'ele', 'speed'), map(float, scal)))
+
+        parts = [ part for part in parts if len(part[0]) ]
+        if parts:
+            order, lat, lon, ele, speed, time = (np.concatenate(column) for column in zip(*(part[0:6] for part in parts)))
+            source = np.concatenate([ np.full(len(part[0]), part[6], dtype=np.uint8) for part in parts ])
+            if len(parts) > 1:
+                sort = np.argsort(order, kind='stable')
+                lat, lon, ele, speed, time, source = lat[sort], lon[sort], ele[sort], speed[sort], time[sort], source[sort]
+            self.track.extend(lat, lon, ele, speed, time, source)
+
+        messages, self.messages = self.messages, []
+        if messages:
+            messages.sort(key=lambda message: message[0])
+            print("\n".join(text for _, text in messages))
+
+    def addKarma(self, klvs, scal_value, syst, scal_syst, gpri, scal_gpri, fixes):
+        "the SYST and GPRI labels (karma), one by one. Returns the points kept"
+        stats = self.stats
+        points = []
+        labels = sorted(list(zip(syst.tolist(), scal_syst.tolist(), [ None ] * len(syst))) +
+                        list(zip(gpri.tolist(), scal_gpri.tolist(), fixes.tolist())))
+        for q, scal, fix in labels:
+            d = klvs[q]
+            SCAL = scal_value(scal)
+            if fix is None:
+                data_vals = [ float(x) / float(y) for x,y in zip(d.data, SCAL) ]
+                if data_vals[0] != 0 and data_vals[1] != 0:
+                    self.SYST = fourCC.SYSTData._make(data_vals)
+                continue
+
+            if d.data.lon == d.data.lat == d.data.alt == 0:
+                self.messages.append((q << SAMPLE_BITS, "Warning: Skipping empty point"))
+                stats['empty'] += 1
+                continue
+            if fix == 0:
+                stats['badfix'] += 1
+                if self.skip:
+                    self.messages.append((q << SAMPLE_BITS, "Warning: Skipping point due GPSFIX==0"))
+                    stats['badfixskip'] += 1
+                    continue
+            gpsdata = fourCC.KARMAGPSData._make([ float(x) / float(y) for x,y in zip(d.data, SCAL) ])
+            if self.SYST.seconds != 0 and self.SYST.miliseconds != 0:
+                syst_time = datetime.datetime.fromtimestamp(self.SYST.miliseconds, tz=datetime.timezone.utc) - datetime.timedelta(seconds=self.timeShift)
+                points.append((q << SAMPLE_BITS, gpsdata.lat, gpsdata.lon, gpsdata.alt, gpsdata.speed, gpshelper.to_us(syst_time)))
+                stats['ok'] += 1
+
+        columns = [ np.array(column) for column in zip(*points) ] or [ np.zeros(0, dtype=np.int64) ] + [ np.zeros(0) ] * 5
+        return tuple(columns) + (gpshelper.SOURCE_CODES[''],)
+
+    def points(self):
+        return self.track
+
+
+def BuildGPSPoints(data, skip=False, skipDop=False, dopLimit=2000, timeShift=0):
+    """
+    same as gopro2gpx.BuildGPSPointsLoop, processing the labels in chunks
+    of CHUNK_SIZE. Returns the builder, with the points (as a
+    gpshelper.Track), stats and state.
+    """
+    builder = GPSBuilder(skip=skip, skipDop=skipDop, dopLimit=dopLimit, timeShift=timeShift)
+    data = iter(data)
+    chunk = list(itertools.islice(data, CHUNK_SIZE))
+    while chunk:
+        builder.add(chunk)
+        chunk = list(itertools.islice(data, CHUNK_SIZE))
+    return builder
@@ -7,14 +7,25 @@
 #
 
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import array
+import gzip
 import time
 import os
 import io
 import csv
+import itertools
+import json
+import zipfile
+
+from . import fourCC
 
 
 class GPSPoint:
+    __slots__ = ('latitude', 'longitude', 'elevation', 'time', 'speed',
+                 'hr', 'cad', 'cadence', 'temperature', 'atemp', 'power', 'distance',
+                 'left_pedal_smoothness', 'left_torque_effectiveness', 'name')
+
     def __init__(self, latitude=0.0, longitude=0.0, elevation=0.0, time=datetime.fromtimestamp(time.time()), speed=0.0,name=''):
         self.latitude = latitude
         self.longitude = longitude
@@ -34,6 +45,171 @@ class GPSPoint:
         self.name = name
 
 
+EPOCH = datetime(1970, 1, 1)
+EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# source stream of the points, stored as an uint8 code in Track.source.
+# GPS5 times are naive, GPS9 and GPRI (karma, no name) are UTC.
+SOURCE_NAMES = [ 'GPS5', 'GPS9', '' ]
+SOURCE_UTC = [ False, True, True ]
+SOURCE_CODES = { name: code for code, name in enumerate(SOURCE_NAMES) }
+
+# GPSPoint extensions that can be stored as a Track column
+EXTENSIONS = ('hr', 'cad', 'cadence', 'temperature', 'atemp', 'power', 'distance',
+              'left_pedal_smoothness', 'left_torque_effectiveness')
+
+
+def to_us(value):
+    "a datetime (naive or UTC) or timedelta as integer microseconds"
+    if isinstance(value, timedelta):
+        return value // MICROSECOND
+    if value.tzinfo is None:
+        return (value - EPOCH) // MICROSECOND
+    return (value - EPOCH_UTC) // MICROSECOND
+
+
+def from_us(us, utc=False):
+    "inverse of to_us, a naive or UTC datetime"
+    return (EPOCH_UTC if utc else EPOCH) + timedelta(microseconds=us)
+
+
+def _extend(column, values):
+    "appends a sequence, or a NumPy array (as a single copy), to an array column"
+    if hasattr(values, 'dtype'):
+        column.frombytes(values.astype(column.typecode).tobytes())
+    else:
+        column.extend(values)
+
+
+class Track:
+    """
+    the GPS points as typed columns (array.array): lat, lon, ele and speed
+    as float64, time as int64 microseconds since the epoch (see to_us) and
+    source as the uint8 code of the stream (SOURCE_NAMES). The extensions
+    (hr, cadence, ...) are float64 columns that only exist once set.
+
+    Iterating (or indexing) gives GPSPoint objects, so the generate_*
+    functions work with a Track as they do with a list of points.
+
+    scales keeps the SCAL the columns were divided by, when known (see
+    archive).
+    """
+    def __init__(self):
+        self.lat = array.array('d')
+        self.lon = array.array('d')
+        self.ele = array.array('d')
+        self.speed = array.array('d')
+        self.time = array.array('q')
+        self.source = array.array('B')
+        self.extensions = {}
+        self.scales = {}
+
+    @classmethod
+    def from_points(cls, points):
+        track = cls()
+        for p in points:
+            track.append(p)
+        return track
+
+    def __len__(self):
+        return len(self.time)
+
+    def append(self, point):
+        "adds a GPSPoint (without extensions)"
+        self.lat.append(point.latitude)
+        self.lon.append(point.longitude)
+        self.ele.append(point.elevation)
+        self.speed.append(point.speed)
+        self.time.append(to_us(point.time))
+        self.source.append(SOURCE_CODES[point.name])
+
+    def extend(self, lat, lon, ele, speed, time, source):
+        """
+        adds columns of points (sequences or NumPy arrays) of the source
+        named source (see SOURCE_NAMES), or a column of source codes
+        """
+        _extend(self.lat, lat)
+        _extend(self.lon, lon)
+        _extend(self.ele, ele)
+        _extend(self.speed, speed)
+        _extend(self.time, time)
+        if isinstance(source, str):
+            self.source.extend([ SOURCE_CODES[source] ] * (len(self.time) - len(self.source)))
+        else:
+            _extend(self.source, source)
+
+    def set_extension(self, name, values):
+        "sets (or replaces) the extension column name, one value per point"
+        if name not in EXTENSIONS:
+            raise Exception("Unknown extension %s" % name)
+        column = array.array('d')
+        _extend(column, values)
+        if len(column) != len(self):
+            raise Exception("Invalid length for extension %s: %d" % (name, len(column)))
+        self.extensions[name] = column
+
+    def point(self, i):
+        code = self.source[i]
+        p = GPSPoint(self.lat[i], self.lon[i], self.ele[i], from_us(self.time[i], SOURCE_UTC[code]), self.speed[i], SOURCE_NAMES[code])
+        for name, column in self.extensions.items():
+            setattr(p, name, column[i])
+        return p
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.slice(i)
+        return self.point(range(len(self))[i])
+
+    def slice(self, key):
+        "a new Track with the points of the slice key, the columns are sliced as arrays"
+        track = Track()
+        for name in ('lat', 'lon', 'ele', 'speed', 'time', 'source'):
+            setattr(track, name, getattr(self, name)[key])
+        track.extensions = { name: column[key] for name, column in self.extensions.items() }
+        track.scales = dict(self.scales)
+        return track
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.point(i)
+
+    def select(self, indexes):
+        "a new Track with the points in indexes (in that order)"
+        track = Track()
+        for name in ('lat', 'lon', 'ele', 'speed', 'time', 'source'):
+            column = getattr(self, name)
+            getattr(track, name).extend(column[i] for i in indexes)
+        for name, column in self.extensions.items():
+            track.extensions[name] = array.array('d', (column[i] for i in indexes))
+        track.scales = dict(self.scales)
+        return track
+
+    def arrays(self):
+        """
+        NumPy views of the columns, without copying. The Track can't grow
+        while the views are alive.
+        """
+        np = fourCC.np
+        if np is None:
+            raise Exception("Track.arrays needs numpy")
+        columns = { name: np.frombuffer(getattr(self, name), dtype=getattr(self, name).typecode)
+                    for name in ('lat', 'lon', 'ele', 'speed', 'time', 'source') }
+        for name, column in self.extensions.items():
+            columns[name] = np.frombuffer(column, dtype='d')
+        return columns
+
+    def to_arrow(self):
+        "a pyarrow.Table over the columns, without copying (see columnar)"
+        from . import columnar
+        return columnar.track_to_arrow(self)
+
+    def to_dataframe(self):
+        "a pandas.DataFrame, without copying the columns when possible"
+        from . import columnar
+        return columnar.to_dataframe(self)
+
+
 def UTCTime(timedata):
     #
     # time comes: 2014-05-30 20:11:27.200
@@ -52,12 +228,78 @@ def CSVTime(timedata):
     csvtime = csvtime[:-3]
     return csvtime
 
+class TimeFormatter:
+    """
+    formats integer microseconds (see to_us) as UTCTime (or CSVTime, with
+    csv=True) does with a datetime. The 'YYYY-MM-DDTHH:MM:SS' part is only
+    rebuilt when the second changes, the fraction is appended.
+    """
+    def __init__(self, csv=False):
+        if csv:
+            self.format, self.fraction, self.divisor = "%Y/%m/%d %H:%M:%S", ".%03d", 1000
+        else:
+            self.format, self.fraction, self.divisor = "%Y-%m-%dT%H:%M:%S", ".%06dZ", 1
+        self.second = None
+        self.prefix = None
+
+    def __call__(self, us):
+        second, fraction = divmod(us, 1000000)
+        if second != self.second:
+            self.second = second
+            self.prefix = (EPOCH + timedelta(seconds=second)).strftime(self.format)
+        return self.prefix + self.fraction % (fraction // self.divisor)
+
+def number_formatter(precision=None):
+    "str, or a fixed number of decimals if precision is given"
+    if precision is None:
+        return str
+    return ("%%.%df" % precision).__mod__
+
+def _columns(points, precision=None, csv_time=False):
+    """
+    the fields of the points, already formatted, as a dict of lists (one
+    per GPSPoint attribute). The times of a Track are formatted from the
+    integer column, without building a datetime per point.
+    """
+    number = number_formatter(precision)
+    columns = {}
+    if isinstance(points, Track):
+        formatter = TimeFormatter(csv=csv_time)
+        columns['latitude'] = list(map(number, points.lat.tolist()))
+        columns['longitude'] = list(map(number, points.lon.tolist()))
+        columns['elevation'] = list(map(number, points.ele.tolist()))
+        columns['speed'] = points.speed.tolist()
+        columns['time'] = list(map(formatter, points.time.tolist()))
+        columns['name'] = [ SOURCE_NAMES[code] for code in points.source ]
+        for name in EXTENSIONS:
+            column = points.extensions.get(name)
+            columns[name] = column.tolist() if column is not None else [ 0 ] * len(points)
+        return columns
+
+    time_format = CSVTime if csv_time else UTCTime
+    columns['latitude'] = [ number(p.latitude) for p in points ]
+    columns['longitude'] = [ number(p.longitude) for p in points ]
+    columns['elevation'] = [ number(p.elevation) for p in points ]
+    columns['speed'] = [ p.speed for p in points ]
+    columns['time'] = [ time_format(p.time) for p in points ]
+    columns['name'] = [ p.name for p in points ]
+    for name in EXTENSIONS:
+        columns[name] = [ getattr(p, name) for p in points ]
+    return columns
+
 def _prioritize_gps9(points):
     """
     Función auxiliar para priorizar puntos GPS9 sobre GPS5
     Si hay puntos GPS9, filtra solo esos puntos
     Si no hay puntos GPS9, devuelve todos los puntos (GPS5)
     """
+    if isinstance(points, Track):
+        gps9 = SOURCE_CODES['GPS9']
+        indexes = [ i for i, code in enumerate(points.source) if code == gps9 ]
+        if indexes and len(indexes) < len(points):
+            return points.select(indexes)
+        return points
+
     # Verificar si hay puntos GPS9
     has_gps9 = any(p.name == "GPS9" for p in points)
     
@@ -70,60 +312,40 @@ def _prioritize_gps9(points):
     # Si no hay puntos GPS9 o el filtrado no dejó puntos, devolver todos los puntos originales
     return points
 
-def generate_CSV(points, start_time=None, trk_name="exercise"):
-    # Priorizar puntos GPS9 sobre GPS5
-    filtered_points = _prioritize_gps9(points)
-    
-    output = io.StringIO()
-    writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-
-    header = [
-        "latitude",
-        "longitude",
-        "elevation",
-        "time",
-        "hr",
-        "name",
-        "cadence",
-        "speed",
-        "distance",
-        "power",
-        "temperature"
-    ]
-
-    writer.writerow(header)
-
-    for p in filtered_points:
-        data =  [
-            p.latitude,
-            p.longitude,
-            p.elevation,
-            UTCTime(p.time),
-            p.hr,
-            p.name,
-            p.cadence,
-            p.speed,
-            p.distance,
-            p.power,
-            p.temperature
-        ]
-        writer.writerow(data)
-    return output.getvalue()
-
-def generate_GPX(points, start_time=None, trk_name="exercise"):
-    """
-    Creates a GPX in 1.1 Format
-    """
-    # Priorizar puntos GPS9 sobre GPS5
-    filtered_points = _prioritize_gps9(points)
-    
-    if not filtered_points:
-        return ""
-
-    if start_time is None:
-        start_time = filtered_points[0].time
-
-    xml  = '<?xml version="1.0" encoding="UTF-8"?>\n'
+CSV_HEADER = [
+    "latitude",
+    "longitude",
+    "elevation",
+    "time",
+    "hr",
+    "name",
+    "cadence",
+    "speed",
+    "distance",
+    "power",
+    "temperature"
+]
+
+GPX_POINT = (
+    '	<trkpt lat="%s" lon="%s">\n'
+    '		<fourcc_type>%s</fourcc_type>\n'
+    '		<ele>%s</ele>\n'
+    '		<time>%s</time>\n'
+    '		<extensions>\n'
+    '		<gpxtpx:TrackPointExtension>\n'
+    '		    <gpxtpx:hr>%s</gpxtpx:hr>\n'
+    '		    <gpxtpx:cad>%s</gpxtpx:cad>\n'
+    '		    <gpxtpx:speed>%s</gpxtpx:speed>\n'
+    '		    <gpxtpx:distance>%s</gpxtpx:distance>\n'
+    '		   </gpxtpx:TrackPointExtension>\n'
+    '		<gpxx:TrackPointExtension/>\n'
+    #'        <power>%s</power>\n'
+    #'        <<gpxtpx:temp>%s</temp>\n'
+    '		</extensions>\n'
+    '	</trkpt>\n'
+)
+
+def _gpx_header(start_time, trk_name):
     gpx_attr = [
                 'xmlns="http://www.topografix.com/GPX/1/1"' ,
                 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"' ,
@@ -152,6 +374,7 @@ def generate_GPX(points, start_time=None, trk_name="exercise"):
   	# <gpxtpx:speed>1.0</gpxtpx:speed>
     # <gpxtpx:distance>0</gpxtpx:distance>
 
+    xml  = '<?xml version="1.0" encoding="UTF-8"?>\n'
     xml += "<gpx " + " ".join(gpx_attr) + ">\n"
 
     xml += "<metadata>\n"
@@ -160,60 +383,11 @@ def generate_GPX(points, start_time=None, trk_name="exercise"):
     xml += "<trk>\n"
     xml += "  <name>%s</name>\n" % trk_name
     xml += "<trkseg>\n"
-
-    #
-    # add the points
-    #
-
-    #  <trkpt lat="40.327363333" lon="-3.760243333">
-    #    <time>2014-06-26T18:40:45Z</time>
-    #    <fix>2d</fix>
-    #    <sat>7</sat>
-    #  </trkpt>
-
-    for p in filtered_points:
-        hr = p.hr
-        cadence = p.cad
-        speed = p.speed
-        distance = p.distance
-        fourcc_type = p.name
-
-        pts  = '	<trkpt lat="%s" lon="%s">\n' % (p.latitude, p.longitude)
-        pts += '		<fourcc_type>%s</fourcc_type>\n' % fourcc_type
-        pts += '		<ele>%s</ele>\n' % p.elevation
-        pts += '		<time>%s</time>\n' % UTCTime(p.time)
-        pts += '		<extensions>\n'
-        pts += '		<gpxtpx:TrackPointExtension>\n'
-        pts += '		    <gpxtpx:hr>%s</gpxtpx:hr>\n' % hr
-        pts += '		    <gpxtpx:cad>%s</gpxtpx:cad>\n' % cadence
-        pts += '		    <gpxtpx:speed>%s</gpxtpx:speed>\n' % speed
-        pts += '		    <gpxtpx:distance>%s</gpxtpx:distance>\n' % distance
-        pts += '		   </gpxtpx:TrackPointExtension>\n'
-        pts += '		<gpxx:TrackPointExtension/>\n' ## new
-    	#pts += '        <power>%s</power>\n' % power
-    	#pts += '        <<gpxtpx:temp>%s</temp>\n'   % temperature
-        pts += '		</extensions>\n'
-        pts += '	</trkpt>\n'
-
-        xml += pts
-
-    xml += "</trkseg>\n"
-    xml += "</trk>\n"
-    xml += "</gpx>\n"
-
     return xml
 
+GPX_FOOTER = "</trkseg>\n</trk>\n</gpx>\n"
 
-
-def generate_KML(gps_points):
-    """
-    use this for color
-    http://www.zonums.com/gmaps/kml_color/
-    """
-    # Priorizar puntos GPS9 sobre GPS5
-    filtered_points = _prioritize_gps9(gps_points)
-
-    kml_template = """<?xml version="1.0" encoding="UTF-8"?>
+KML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
     <kml xmlns="http://www.opengis.net/kml/2.2"> <Document>
     <name>Demo</name>
     <description>Description Demo</description>
@@ -244,17 +418,238 @@ def generate_KML(gps_points):
     """
 
 
-    lines = []
-    for p in filtered_points:
-        s = "%s,%s,%s" % (p.longitude, p.latitude, p.elevation)
-        lines.append(s)
+KML_HEADER, KML_FOOTER = KML_TEMPLATE.split('%s')
+
+
+def _chunks(points, size):
+    """
+    slices of a Track (its columns sliced, see Track.slice) or a list,
+    lists of the points of other iterables
+    """
+    if isinstance(points, (Track, list, tuple)):
+        if 0 < len(points) <= size:
+            yield points
+            return
+        if isinstance(points, Track):
+            for i in range(0, len(points), size):
+                yield points.slice(slice(i, i + size))
+            return
+        for i in range(0, len(points), size):
+            yield points[i:i + size]
+        return
+    points = iter(points)
+    chunk = list(itertools.islice(points, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(points, size))
+
+
+class PointWriter:
+    """
+    writes points (a Track, a list or any iterable of GPSPoint) to fd, an
+    open text file or any object with a write method, in chunks of
+    chunk_size points, so the memory used doesn't depend on the track
+    length. The header is written on open, the footer on close. Use it as
+    a context manager. The subclasses write each chunk in writeChunk, the
+    base class writes nothing.
+    """
+    chunk_size = 4096
+
+    def __init__(self, fd, precision=None, chunk_size=None):
+        self.fd = fd
+        self.precision = precision
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self.count = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    coords = '\n'.join(lines)
-    kml = kml_template % coords
-    return kml
+    def write(self, points):
+        for chunk in _chunks(points, self.chunk_size):
+            self.writeChunk(chunk, _columns(chunk, self.precision))
+            self.count += len(chunk)
 
+    def writeChunk(self, points, columns):
+        pass
 
-def generate_CSV_DashWare(gps_points):
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writeFooter()
+
+    def writeFooter(self):
+        pass
+
+
+class GPXWriter(PointWriter):
+    """
+    GPX 1.1. If start_time is None, the time of the first point is used,
+    so the header waits for it. Without points nothing is written.
+    """
+    def __init__(self, fd, start_time=None, trk_name="exercise", precision=None, chunk_size=None):
+        PointWriter.__init__(self, fd, precision, chunk_size)
+        self.start_time = start_time
+        self.trk_name = trk_name
+
+    def writeChunk(self, points, c):
+        if self.count == 0:
+            start_time = self.start_time if self.start_time is not None else points[0].time
+            self.fd.write(_gpx_header(start_time, self.trk_name))
+        self.fd.write("".join(GPX_POINT % row for row in zip(c['latitude'], c['longitude'], c['name'], c['elevation'], c['time'],
+                                                             c['hr'], c['cad'], c['speed'], c['distance'])))
+
+    def writeFooter(self):
+        if self.count:
+            self.fd.write(GPX_FOOTER)
+
+
+class KMLWriter(PointWriter):
+    def __init__(self, fd, precision=None, chunk_size=None):
+        PointWriter.__init__(self, fd, precision, chunk_size)
+        self.fd.write(KML_HEADER)
+
+    def writeChunk(self, points, c):
+        separator = '\n' if self.count else ''
+        self.fd.write(separator + '\n'.join("%s,%s,%s" % row for row in zip(c['longitude'], c['latitude'], c['elevation'])))
+
+    def writeFooter(self):
+        self.fd.write(KML_FOOTER)
+
+
+class CSVWriter(PointWriter):
+    "open the file with newline=''"
+    def __init__(self, fd, precision=None, chunk_size=None):
+        PointWriter.__init__(self, fd, precision, chunk_size)
+        self.writer = csv.writer(fd, quoting=csv.QUOTE_ALL)
+        self.writer.writerow(CSV_HEADER)
+
+    def writeChunk(self, points, c):
+        self.writer.writerows(zip(c['latitude'], c['longitude'], c['elevation'], c['time'], c['hr'], c['name'],
+                                  c['cadence'], c['speed'], c['distance'], c['power'], c['temperature']))
+
+
+GEOJSON_FEATURE = '{"type":"Feature","geometry":{"type":"%s","coordinates":%s},"properties":{"time":"%s","speed":%s,"source":%s}}\n'
+
+
+class GeoJSONSeqWriter(PointWriter):
+    """
+    newline delimited GeoJSON, one Feature per line: a Point per point or,
+    with segments=True, a LineString between each two consecutive points
+    (with the properties of the first one).
+    """
+    def __init__(self, fd, segments=False, precision=None, chunk_size=None):
+        PointWriter.__init__(self, fd, precision, chunk_size)
+        self.segments = segments
+        self.last = None
+
+    def writeChunk(self, points, c):
+        coordinates = [ "[%s,%s,%s]" % row for row in zip(c['longitude'], c['latitude'], c['elevation']) ]
+        properties = list(zip(c['time'], map(repr, c['speed']), map(json.dumps, c['name'])))
+        if not self.segments:
+            self.fd.write("".join(GEOJSON_FEATURE % (("Point", point) + row) for point, row in zip(coordinates, properties)))
+            return
+
+        # the last point of a chunk starts the first segment of the next
+        if self.last is not None:
+            coordinates.insert(0, self.last[0])
+            properties.insert(0, self.last[1])
+        self.fd.write("".join(GEOJSON_FEATURE % (("LineString", "[%s,%s]" % segment) + row)
+                              for segment, row in zip(zip(coordinates, coordinates[1:]), properties)))
+        if coordinates:
+            self.last = (coordinates[-1], properties[-1])
+
+
+class MultiWriter(PointWriter):
+    """
+    writes the same points to several writers in a single pass: each chunk
+    is formatted once (with the precision of the MultiWriter) and passed to
+    all of them. Closing it closes the writers.
+    """
+    def __init__(self, writers, precision=None, chunk_size=None):
+        PointWriter.__init__(self, None, precision, chunk_size)
+        self.writers = writers
+
+    def writeChunk(self, points, columns):
+        for writer in self.writers:
+            writer.writeChunk(points, columns)
+            writer.count += len(points)
+
+    def writeFooter(self):
+        for writer in self.writers:
+            writer.close()
+
+
+# approximate bytes per point of each format, used to decide the
+# compression with a size threshold (see output_size)
+POINT_SIZE = { 'gpx': 450, 'kml': 36, 'csv': 105, 'geojsonl': 160 }
+
+def output_size(points, extension):
+    "estimated size of the uncompressed output"
+    return len(points) * POINT_SIZE[extension]
+
+def open_output(stack, filename, extension, compress=False, level=6):
+    """
+    opens filename.extension to write text, registering the files in stack
+    (a contextlib.ExitStack). If compress, the data goes through the
+    compressor as it is written: gzip for gpx/csv (filename.gpx.gz) and a
+    KMZ (zip with a doc.kml) for kml. Returns (fd, the name of the file)
+    """
+    newline = '' if extension == 'csv' else None
+    if not compress:
+        filename = "%s.%s" % (filename, extension)
+        return stack.enter_context(open(filename, "w", newline=newline)), filename
+
+    if extension == 'kml':
+        filename = "%s.kmz" % filename
+        kmz = stack.enter_context(zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED, compresslevel=level))
+        doc = stack.enter_context(kmz.open("doc.kml", "w"))
+        return stack.enter_context(io.TextIOWrapper(doc, encoding='utf-8')), filename
+
+    filename = "%s.%s.gz" % (filename, extension)
+    return stack.enter_context(gzip.open(filename, "wt", compresslevel=level, newline=newline)), filename
+
+
+def generate_CSV(points, start_time=None, trk_name="exercise", precision=None):
+    # Priorizar puntos GPS9 sobre GPS5
+    filtered_points = _prioritize_gps9(points)
+
+    output = io.StringIO()
+    with CSVWriter(output, precision) as writer:
+        writer.write(filtered_points)
+    return output.getvalue()
+
+def generate_GPX(points, start_time=None, trk_name="exercise", precision=None):
+    """
+    Creates a GPX in 1.1 Format
+    """
+    # Priorizar puntos GPS9 sobre GPS5
+    filtered_points = _prioritize_gps9(points)
+
+    output = io.StringIO()
+    with GPXWriter(output, start_time, trk_name, precision) as writer:
+        writer.write(filtered_points)
+    return output.getvalue()
+
+def generate_KML(gps_points, precision=None):
+    """
+    use this for color
+    http://www.zonums.com/gmaps/kml_color/
+    """
+    # Priorizar puntos GPS9 sobre GPS5
+    filtered_points = _prioritize_gps9(gps_points)
+
+    output = io.StringIO()
+    with KMLWriter(output, precision) as writer:
+        writer.write(filtered_points)
+    return output.getvalue()
+
+
+def generate_CSV_DashWare(gps_points, precision=None):
     # Priorizar puntos GPS9 sobre GPS5
     filtered_points = _prioritize_gps9(gps_points)
     
@@ -263,11 +658,7 @@ Time,Latitude,Longitude,Elevation,AirTemp,HeartRate,Cadence,Power,Roll,Pitch
 %s"""
 
 
-    lines = []
-    for p in filtered_points:
-        s = "%s,%s,%s,%s,%s" % (CSVTime(p.time), p.latitude, p.longitude, p.elevation, ',,,,,')
-        lines.append(s)
-
-    coords = os.linesep.join(lines)
+    c = _columns(filtered_points, precision, csv_time=True)
+    coords = os.linesep.join("%s,%s,%s,%s,%s" % (row + (',,,,,',)) for row in zip(c['time'], c['latitude'], c['longitude'], c['elevation']))
     csv = csv_template % coords
     return(csv)
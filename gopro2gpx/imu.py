@@ -0,0 +1,158 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# full rate extraction of the IMU streams (ACCL, GYRO, GRAV, MAGN). Every
+# sample of each payload is decoded with NumPy and scaled with the SCAL of
+# the stream, in a (n, 3) float array. The time of each sample (in
+# microseconds) is interpolated between the start of its payload (STMP, or
+# TICK in older cameras) and the start of the next one.
+#
+# The streams are saved in a .npz file (see writeIMU):
+#
+#   ACCL        (n, 3) float32 samples, in the order of the camera (ORIN)
+#   ACCL_time   (n) int64, microseconds
+#   ACCL_info   [ name (STNM), units (SIUN), axes (ORIN) ]
+
+from . import fourCC
+from . import gpmf
+
+np = fourCC.np
+
+IMU_STREAMS = ('ACCL', 'GYRO', 'GRAV', 'MAGN')
+
+# payloads without timing info are one second long
+PAYLOAD_US = 1000000
+
+
+def header_string(klv):
+    return str(bytes(klv.rawdata), 'utf-8', errors='replace').strip('\0')
+
+
+class IMUStream:
+    def __init__(self, fourCC):
+        self.fourCC = fourCC
+        self.name = ''
+        self.units = ''
+        self.axes = ''
+        self.starts = []
+        self.payloads = []
+        self.samples = None
+        self.time = None
+
+    def add(self, start, samples):
+        "a payload, scaled, and the time of its first sample (or None)"
+        if len(samples):
+            self.starts.append(start)
+            self.payloads.append(samples)
+
+    def build(self):
+        """
+        joins the payloads in self.samples, and computes self.time
+        """
+        counts = np.array([ len(p) for p in self.payloads ], dtype=np.int64)
+        if None in self.starts:
+            starts = np.arange(len(counts), dtype=np.int64) * PAYLOAD_US
+        else:
+            starts = np.array(self.starts, dtype=np.int64)
+
+        # each payload ends where the next starts. The last one keeps the
+        # sample rate of the previous payload.
+        ends = np.empty_like(starts)
+        ends[:-1] = starts[1:]
+        if len(counts) > 1:
+            ends[-1] = starts[-1] + (starts[-1] - starts[-2]) * counts[-1] // counts[-2]
+        elif len(counts):
+            ends[-1] = starts[-1] + PAYLOAD_US
+
+        payload = np.repeat(np.arange(len(counts)), counts)
+        index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.time = starts[payload] + (ends - starts)[payload] * index // counts[payload]
+        self.samples = np.concatenate(self.payloads) if self.payloads else np.zeros((0, 3))
+        return self
+
+    def __len__(self):
+        return 0 if self.time is None else len(self.time)
+
+    def axisNames(self):
+        "the column of each axis: the ORIN letters (y, x, z by default)"
+        if len(self.axes) == 3 and len(set(self.axes)) == 3:
+            return list(self.axes)
+        return list(fourCC.XYZData._fields)
+
+    def __str__(self):
+        return "%s [%s] %d samples (%s)" % (self.fourCC, self.name, len(self), self.units)
+
+
+def extractIMU(data_raw, streams=IMU_STREAMS):
+    """
+    decodes all the samples of the IMU streams found in the GPMF data.
+    Returns a dict { fourCC: IMUStream }
+    """
+    if np is None:
+        raise Exception("IMU extraction needs numpy")
+
+    result = {}
+    for node in gpmf.walkStream(data_raw, streams=set(streams)):
+        if not isinstance(node, gpmf.StreamNode) or node.skipped:
+            continue
+
+        stream = result.setdefault(node.fourCC, IMUStream(node.fourCC))
+        scal = 1.0
+        start = None
+        for klv in node.header:
+            if klv.key == fourCC.SCAL:
+                scal = np.asarray(klv.data, dtype=float)
+            elif klv.key == fourCC.STMP:
+                start = klv.data
+            elif klv.key == fourCC.TICK and start is None:
+                start = klv.data * 1000
+            elif klv.key == fourCC.STNM:
+                stream.name = header_string(klv)
+            elif klv.key in (fourCC.SIUN, fourCC.UNIT):
+                stream.units = header_string(klv)
+            elif klv.key == fourCC.ORIN:
+                stream.axes = header_string(klv)
+
+        for klv in node.klvs:
+            if klv.key == node.key:
+                stream.add(start, klv.array / scal)
+
+    for stream in result.values():
+        stream.build()
+    return result
+
+
+def streamArrays(streams):
+    "the arrays saved by writeIMU, by name"
+    arrays = {}
+    for label, stream in streams.items():
+        arrays[label] = stream.samples.astype(np.float32)
+        arrays[label + '_time'] = stream.time
+        arrays[label + '_info'] = np.array([ stream.name, stream.units, stream.axes ])
+    return arrays
+
+
+def writeIMU(filename, streams):
+    "saves the streams of extractIMU in a .npz file"
+    with open(filename, 'wb') as fd:
+        np.savez(fd, **streamArrays(streams))
+
+
+def readIMU(filename):
+    "loads a file saved with writeIMU"
+    result = {}
+    with np.load(filename) as data:
+        for label in data.files:
+            if label.endswith('_time') or label.endswith('_info') or label + '_time' not in data.files:
+                continue
+            stream = IMUStream(label)
+            stream.samples = data[label]
+            stream.time = data[label + '_time']
+            stream.name, stream.units, stream.axes = data[label + '_info'].tolist()
+            result[label] = stream
+    return result
@@ -15,29 +15,58 @@ class KLVData:
     """
     format: Header: 32-bit, 8-bit, 8-bit, 16-bit
             Data: 32-bit aligned, padded with 0
+
+    data is a memoryview over the whole stream (bytes, mmap, ...). The
+    payload is kept as a slice of it, so nothing is copied. The payload is
+    decoded (fourCC.Manage) the first time .data is read, and cached.
     """
-    binary_format = '>4sBBH'
+    binary_format = '>IBBH'
+    header = struct.Struct(binary_format) # unsigned bytes! the fourCC is read as an integer key
 
     def __init__(self, data, offset):
 
-        s  = struct.Struct(KLVData.binary_format) # unsigned bytes!
-        self.fourCC, self.type, self.size, self.repeat = s.unpack_from(data, offset=offset)
-        
-        
-        try:
-            self.fourCC = self.fourCC.decode()
-        except UnicodeDecodeError as e:
-            self.fourCC = "ERRU"
+        self.key, self.type, self.size, self.repeat = KLVData.header.unpack_from(data, offset)
+        self._fourCC = None
 
-        self.type = int(self.type)
         self.length = self.size * self.repeat
         self.padded_length = self.pad(self.length)
 
         # read now the data, in raw format
         self.rawdata = self.readRawData(data, offset)
-        # process the label, if found
-        self.data = fourCC.Manage(self)
-
+        # TYPE label of the stream, for the '?' (complex) types
+        self.type_klv = None
+        # the label is processed on demand
+        self._data = KLVData.NOT_DECODED
+        self._array = KLVData.NOT_DECODED
+
+    NOT_DECODED = object()
+
+    @property
+    def fourCC(self):
+        "the label as str, only built when needed"
+        if self._fourCC is None:
+            self._fourCC = fourCC.key_label(self.key)
+        return self._fourCC
+
+    @property
+    def data(self):
+        if self._data is KLVData.NOT_DECODED:
+            self._data = fourCC.Manage(self)
+        return self._data
+
+    @property
+    def complex_type(self):
+        "the TYPE string that describes a '?' payload, if any"
+        if self.type_klv is None:
+            return None
+        return self.type_klv.data
+
+    @property
+    def array(self):
+        "the payload as a NumPy array (see fourCC.ManageArray), or None"
+        if self._array is KLVData.NOT_DECODED:
+            self._array = fourCC.ManageArray(self)
+        return self._array
 
     def __str__(self):
 
@@ -48,7 +77,7 @@ class KLVData:
         if self.rawdata:
             rawdata = self.rawdata
             rawdata = ' '.join(format(x, '02x') for x in rawdata)
-            rawdatas = self.rawdata[0:10]
+            rawdatas = bytes(self.rawdata[0:10])
         else:
             rawdata = 'null'
             rawdatas = 'null'
@@ -58,27 +87,21 @@ class KLVData:
 
     def pad(self,n, base=4):
         "padd the number so is % base == 0"
-        i = n
-        while i%base != 0:
-            i+=1
-        return i
+        return (n + base - 1) // base * base
 
     def skip(self):
-        return self.fourCC in fourCC.skip_labels
+        return self.key in fourCC.skip_keys
 
 
     def readRawData(self, data, offset):
-        "read the raw data, don't process anything, just get the bytes"
+        "read the raw data, don't process anything, just get a view of the bytes"
         if self.type == 0:
             return
 
-        num_bytes = self.pad(self.size * self.repeat)
-        if num_bytes == 0:
+        if self.padded_length == 0:
             # empty package.
             rawdata = None
         else:
-            fmt = '>' + str(num_bytes) + 's'
-            s  = struct.Struct(fmt)
-            rawdata, = s.unpack_from(data, offset=offset+8)
+            rawdata = data[offset+8:offset+8+self.padded_length]
 
         return(rawdata)
@@ -0,0 +1,247 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# native ISO-BMFF (MP4/MOV) reader for the gpmd track, based on the info from:
+#   ISO/IEC 14496-12 (ISO base media file format)
+#   https://github.com/gopro/gpmf-parser/blob/main/demo/GPMF_mp4reader.c
+#
+# Only the boxes needed to locate the telemetry samples are parsed:
+#
+#   moov/trak/mdia/mdhd            timescale, duration
+#   moov/trak/mdia/minf/stbl/stsd  sample entry format (gpmd)
+#   moov/trak/mdia/minf/stbl/stsz  sample sizes
+#   moov/trak/mdia/minf/stbl/stsc  sample to chunk map
+#   moov/trak/mdia/minf/stbl/stco  chunk offsets (32 bits)
+#   moov/trak/mdia/minf/stbl/co64  chunk offsets (64 bits)
+#
+# so the cost is proportional to the telemetry size, not to the video size.
+
+import os
+import struct
+from collections import namedtuple
+
+GPMDTrack = namedtuple('GPMDTrack', ['index', 'timescale', 'duration', 'offsets', 'sizes'])
+
+box_header = struct.Struct('>I4s')
+box_largesize = struct.Struct('>Q')
+
+CONTAINER_BOXES = (b'moov', b'trak', b'mdia', b'minf', b'stbl')
+
+
+class MP4Error(Exception):
+    pass
+
+
+def iterBoxes(fd, start, end):
+    """
+    yields (type, payload_offset, payload_size) for each box in [start, end)
+    """
+    offset = start
+    while offset + box_header.size <= end:
+        fd.seek(offset)
+        header = fd.read(box_header.size)
+        if len(header) < box_header.size:
+            return
+        size, btype = box_header.unpack(header)
+        header_size = box_header.size
+        if size == 1:
+            size, = box_largesize.unpack(fd.read(box_largesize.size))
+            header_size += box_largesize.size
+        elif size == 0:
+            # box extends to the end of the file
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise MP4Error("Invalid box %s at offset %d" % (btype, offset))
+
+        yield btype, offset + header_size, size - header_size
+        offset += size
+
+
+def readBox(fd, offset, size):
+    fd.seek(offset)
+    data = fd.read(size)
+    if len(data) != size:
+        raise MP4Error("Truncated box at offset %d" % offset)
+    return data
+
+
+def parseMDHD(data):
+    "returns (timescale, duration)"
+    version = data[0]
+    if version == 1:
+        return struct.unpack_from('>IQ', data, 4 + 8 + 8)
+    return struct.unpack_from('>II', data, 4 + 4 + 4)
+
+
+def parseSTSD(data):
+    "returns the format of the first sample entry"
+    entry_count, = struct.unpack_from('>I', data, 4)
+    if entry_count == 0:
+        return None
+    _, fmt = struct.unpack_from('>I4s', data, 8)
+    return fmt
+
+
+def parseSTSZ(data):
+    sample_size, sample_count = struct.unpack_from('>II', data, 4)
+    if sample_size != 0:
+        return [ sample_size ] * sample_count
+    return list(struct.unpack_from('>%dI' % sample_count, data, 12))
+
+
+def parseSTSC(data):
+    "returns a list of (first_chunk, samples_per_chunk)"
+    entry_count, = struct.unpack_from('>I', data, 4)
+    entries = struct.unpack_from('>%dI' % (entry_count * 3), data, 8)
+    return [ (entries[i], entries[i+1]) for i in range(0, len(entries), 3) ]
+
+
+def parseCO(data, fmt):
+    entry_count, = struct.unpack_from('>I', data, 4)
+    return list(struct.unpack_from('>%d%s' % (entry_count, fmt), data, 8))
+
+
+def sampleOffsets(chunk_offsets, stsc, sizes):
+    """
+    expand the chunk table into one absolute file offset per sample.
+    Raises MP4Error if stsc refers to chunks that stco doesn't have.
+    """
+    offsets = []
+    sample = 0
+    for i, (first_chunk, samples_per_chunk) in enumerate(stsc):
+        last_chunk = stsc[i+1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+        if first_chunk < 1 or last_chunk > len(chunk_offsets):
+            raise MP4Error("Invalid sample table (chunks %d-%d of %d)" % (first_chunk, last_chunk, len(chunk_offsets)))
+        for chunk in range(first_chunk - 1, last_chunk):
+            offset = chunk_offsets[chunk]
+            for _ in range(samples_per_chunk):
+                if sample >= len(sizes):
+                    return offsets
+                offsets.append(offset)
+                offset += sizes[sample]
+                sample += 1
+    return offsets
+
+
+def findGPMDTrack(fd):
+    """
+    walk moov/trak/mdia/minf/stbl looking for the gpmd sample entry.
+    Returns a GPMDTrack, or None if the file has no telemetry.
+    """
+    fd.seek(0, os.SEEK_END)
+    file_size = fd.tell()
+
+    moov = next(((o, s) for t, o, s in iterBoxes(fd, 0, file_size) if t == b'moov'), None)
+    if moov is None:
+        return None
+
+    traks = [ (o, s) for t, o, s in iterBoxes(fd, moov[0], moov[0] + moov[1]) if t == b'trak' ]
+    for index, (trak_offset, trak_size) in enumerate(traks):
+        boxes = {}
+        pending = [ (trak_offset, trak_size) ]
+        while pending:
+            offset, size = pending.pop()
+            for btype, o, s in iterBoxes(fd, offset, offset + size):
+                if btype in CONTAINER_BOXES:
+                    pending.append((o, s))
+                elif btype in (b'mdhd', b'stsd', b'stsz', b'stsc', b'stco', b'co64'):
+                    boxes[btype] = (o, s)
+
+        if b'stsd' not in boxes:
+            continue
+        if parseSTSD(readBox(fd, *boxes[b'stsd'])) != b'gpmd':
+            continue
+
+        if b'stsz' not in boxes or b'stsc' not in boxes:
+            raise MP4Error("gpmd track %d has no sample table" % index)
+        if b'co64' in boxes:
+            chunk_offsets = parseCO(readBox(fd, *boxes[b'co64']), 'Q')
+        elif b'stco' in boxes:
+            chunk_offsets = parseCO(readBox(fd, *boxes[b'stco']), 'I')
+        else:
+            raise MP4Error("gpmd track %d has no chunk offsets" % index)
+
+        timescale, duration = 0, 0
+        if b'mdhd' in boxes:
+            timescale, duration = parseMDHD(readBox(fd, *boxes[b'mdhd']))
+
+        sizes = parseSTSZ(readBox(fd, *boxes[b'stsz']))
+        stsc = parseSTSC(readBox(fd, *boxes[b'stsc']))
+        offsets = sampleOffsets(chunk_offsets, stsc, sizes)
+        return GPMDTrack(index, timescale, duration, offsets, sizes[:len(offsets)])
+
+    return None
+
+
+def readGPMDSamples(fd, track):
+    """
+    read the gpmd samples in decoding order, merging the contiguous ones
+    in a single read. Returns the same bytes that ffmpeg dumps with
+    -codec copy -map 0:N -f rawvideo
+    """
+    data = bytearray(sum(track.sizes))
+    view = memoryview(data)
+    pos = 0
+    start, length = None, 0
+    for offset, size in zip(track.offsets + [ None ], track.sizes + [ 0 ]):
+        if start is not None and start + length == offset:
+            length += size
+            continue
+        if start is not None:
+            fd.seek(start)
+            if fd.readinto(view[pos:pos+length]) != length:
+                raise MP4Error("Truncated gpmd sample at offset %d" % start)
+            pos += length
+        start, length = offset, size
+    view.release()
+    return data
+
+
+class MP4Reader:
+    """
+    drop in replacement of the FFMpegTools metadata methods that reads the
+    gpmd track without spawning any process.
+    """
+    def __init__(self):
+        self.tracks = {}
+
+    def getTrack(self, fname):
+        if fname not in self.tracks:
+            with open(fname, 'rb') as fd:
+                try:
+                    self.tracks[fname] = findGPMDTrack(fd)
+                except struct.error as e:
+                    raise MP4Error("Invalid sample table (%s)" % e)
+        return self.tracks[fname]
+
+    def getMetadataTrack(self, fname):
+        track = self.getTrack(fname)
+        if track is None:
+            return None, None
+
+        info_string = 'Stream {}[{}], {} samples ({})'.format(track.index, track.index, len(track.sizes), 'gpmd')
+        return track.index, info_string
+
+    def getSample(self, fname, i):
+        "the gpmd sample i (a DEVC block) of fname"
+        gpmd = self.getTrack(fname)
+        if gpmd is None:
+            raise MP4Error("File %s has no gpmd track" % fname)
+        with open(fname, 'rb') as fd:
+            fd.seek(gpmd.offsets[i])
+            data = fd.read(gpmd.sizes[i])
+        if len(data) != gpmd.sizes[i]:
+            raise MP4Error("Truncated gpmd sample at offset %d" % gpmd.offsets[i])
+        return data
+
+    def getMetadata(self, track, fname):
+        gpmd = self.getTrack(fname)
+        if gpmd is None or gpmd.index != track:
+            raise MP4Error("File %s has no gpmd track %s" % (fname, track))
+        with open(fname, 'rb') as fd:
+            return readGPMDSamples(fd, gpmd)
@@ -0,0 +1,100 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# ffprobe results saved between runs, in a SQLite database in the cache dir
+# (probe.sqlite). The entries are keyed by the absolute path of the video
+# and checked against its size, mtime and inode, so a modified (or
+# replaced) file is probed again. Only the max_entries used last are kept.
+
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from .config import cache_dir
+
+# track, info: the gpmd stream (None if there isn't one) as returned by
+# getMetadataTrack. duration in seconds (or None), streams a list of dicts
+Probe = namedtuple('Probe', 'track info duration streams')
+
+MAX_ENTRIES = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    inode INTEGER,
+    track INTEGER,
+    info TEXT,
+    duration REAL,
+    streams TEXT,
+    used REAL
+)
+"""
+
+
+def file_key(filename):
+    "(absolute path, size, mtime, inode) of filename"
+    st = os.stat(filename)
+    return os.path.abspath(filename), st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class ProbeCache:
+    """
+    the database is opened on the first get/put. If it can't be used, the
+    cache just misses.
+    """
+    def __init__(self, filename=None, max_entries=MAX_ENTRIES):
+        self.filename = filename if filename else os.path.join(cache_dir(), "probe.sqlite")
+        self.max_entries = max_entries
+        self.db = None
+
+    def connect(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+            self.db = sqlite3.connect(self.filename, timeout=10)
+            self.db.execute(SCHEMA)
+        return self.db
+
+    def get(self, filename):
+        "the Probe saved for filename, if it hasn't changed since"
+        try:
+            path, size, mtime, inode = file_key(filename)
+            db = self.connect()
+            row = db.execute("SELECT size, mtime, inode, track, info, duration, streams FROM probes WHERE path = ?",
+                             (path,)).fetchone()
+            if row is None or tuple(row[0:3]) != (size, mtime, inode):
+                return None
+            with db:
+                db.execute("UPDATE probes SET used = ? WHERE path = ?", (time.time(), path))
+        except (OSError, sqlite3.Error):
+            return None
+        return Probe(row[3], row[4], row[5], json.loads(row[6]))
+
+    def put(self, filename, probe):
+        "saves the Probe of filename, evicting the entries used least recently"
+        try:
+            path, size, mtime, inode = file_key(filename)
+            db = self.connect()
+            with db:
+                db.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (path, size, mtime, inode, probe.track, probe.info, probe.duration,
+                            json.dumps(probe.streams), time.time()))
+                count, = db.execute("SELECT COUNT(*) FROM probes").fetchone()
+                if count > self.max_entries:
+                    db.execute("DELETE FROM probes WHERE path NOT IN (SELECT path FROM probes ORDER BY used DESC LIMIT ?)",
+                               (self.max_entries,))
+        except (OSError, sqlite3.Error):
+            pass
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
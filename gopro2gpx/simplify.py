@@ -0,0 +1,169 @@
+#
+# 17/02/2019
+# Juan M. Casillas <juanm.casillas@gmail.com>
+# https://github.com/juanmcasillas/gopro2gpx.git
+#
+# Released under GNU GENERAL PUBLIC LICENSE v3. (Use at your own risk)
+#
+
+# track simplification, before the points are written. The coordinates are
+# projected to meters (equirectangular, around the mean latitude, good
+# enough for the length of a track) and simplified with:
+#
+#   dp   Douglas-Peucker: removes the points closer than tolerance to the
+#        segment between the points kept. Iterative, with a stack.
+#   vw   Visvalingam-Whyatt: removes the point with the smallest triangle
+#        (with its neighbours) while it's smaller than tolerance^2. A heap
+#        keeps the triangles, so it's O(n log n).
+#
+# With max_gap (seconds), points are added back so the time between two
+# consecutive points is never longer (unless it already was), to keep the
+# timing of the GPX.
+
+import heapq
+import math
+
+from . import fourCC
+
+np = fourCC.np
+
+EARTH_RADIUS = 6371008.8
+METHODS = ('dp', 'vw')
+
+# segments shorter than this are measured in Python, even with NumPy
+NUMPY_MIN_SEGMENT = 64
+
+
+def project(lat, lon):
+    "(x, y) lists in meters of the coordinates (in degrees)"
+    lat, lon = list(lat), list(lon)
+    if not lat:
+        return [], []
+    scale = math.cos(math.radians(sum(lat) / len(lat)))
+    k = math.radians(1) * EARTH_RADIUS
+    return [ k * scale * v for v in lon ], [ k * v for v in lat ]
+
+
+def _farthest(x, y, first, last, arrays=None):
+    "(distance, index) of the point between first and last farthest from their segment"
+    ax, ay = x[first], y[first]
+    dx, dy = x[last] - ax, y[last] - ay
+    length2 = dx * dx + dy * dy
+    if arrays is not None and last - first > NUMPY_MIN_SEGMENT:
+        px, py = arrays[0][first + 1:last] - ax, arrays[1][first + 1:last] - ay
+        if length2:
+            t = np.clip((px * dx + py * dy) / length2, 0.0, 1.0)
+            px, py = px - t * dx, py - t * dy
+        distances = np.hypot(px, py)
+        i = int(distances.argmax())
+        return float(distances[i]), first + 1 + i
+
+    # compared squared, without a call per point
+    best, index = -1.0, None
+    for i in range(first + 1, last):
+        px, py = x[i] - ax, y[i] - ay
+        if length2:
+            t = (px * dx + py * dy) / length2
+            if t > 1.0:
+                px, py = px - dx, py - dy
+            elif t > 0.0:
+                px, py = px - t * dx, py - t * dy
+        distance = px * px + py * py
+        if distance > best:
+            best, index = distance, i
+    return math.sqrt(best), index
+
+
+def douglasPeucker(x, y, tolerance):
+    "sorted indexes of the points kept"
+    n = len(x)
+    if n < 3:
+        return list(range(n))
+    arrays = (np.asarray(x, dtype=float), np.asarray(y, dtype=float)) if np is not None else None
+
+    keep = [ False ] * n
+    keep[0] = keep[-1] = True
+    stack = [ (0, n - 1) ]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distance, index = _farthest(x, y, first, last, arrays)
+        if distance > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [ i for i in range(n) if keep[i] ]
+
+
+def _area(x, y, a, b, c):
+    return abs((x[b] - x[a]) * (y[c] - y[a]) - (x[c] - x[a]) * (y[b] - y[a])) / 2.0
+
+
+def visvalingam(x, y, tolerance):
+    "sorted indexes of the points kept"
+    n = len(x)
+    if n < 3:
+        return list(range(n))
+    threshold = tolerance * tolerance
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    areas = [ math.inf ] * n
+    for i in range(1, n - 1):
+        areas[i] = _area(x, y, i - 1, i, i + 1)
+    heap = [ (areas[i], i) for i in range(1, n - 1) ]
+    heapq.heapify(heap)
+
+    removed = [ False ] * n
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            # already removed, or its area changed since it was pushed
+            continue
+        if area >= threshold:
+            break
+        removed[i] = True
+        a, c = previous[i], following[i]
+        following[a], previous[c] = c, a
+        # the neighbours can't go below the area just removed, so the
+        # points are removed in order of area
+        for j in (a, c):
+            if 0 < j < n - 1:
+                areas[j] = max(_area(x, y, previous[j], j, following[j]), area)
+                heapq.heappush(heap, (areas[j], j))
+    return [ i for i in range(n) if not removed[i] ]
+
+
+def limitGap(indexes, time, max_gap):
+    """
+    adds to indexes (sorted) the points needed so there are at most
+    max_gap microseconds between two consecutive points
+    """
+    if not indexes:
+        return indexes
+    result = [ indexes[0] ]
+    for index in indexes[1:]:
+        last = result[-1]
+        for i in range(last + 1, index):
+            # i is the last point before the gap gets too long
+            if time[i + 1] - time[result[-1]] > max_gap:
+                result.append(i)
+        result.append(index)
+    return result
+
+
+def simplify(track, tolerance, max_gap=None, method='dp'):
+    """
+    a new Track with the points of track kept by method (dp or vw), with
+    tolerance in meters and max_gap in seconds (see limitGap)
+    """
+    if method not in METHODS:
+        raise Exception("Unknown simplification method %s" % method)
+    x, y = project(track.lat, track.lon)
+    if method == 'dp':
+        indexes = douglasPeucker(x, y, tolerance)
+    else:
+        indexes = visvalingam(x, y, tolerance)
+    if max_gap is not None:
+        indexes = limitGap(indexes, track.time, max_gap * 1000000)
+    return track.select(indexes)
@@ -13,6 +13,12 @@ setup(
     url = 'https://github.com/juanmcasillas/gopro2gpx',
     version=about["VERSION"],
     packages = ['gopro2gpx'],
+    # optional: numpy decodes the payloads as arrays (--imu, npz output),
+    # pyarrow writes Parquet and Arrow IPC
+    extras_require = {
+        'fast': ['numpy'],
+        'arrow': ['pyarrow'],
+    },
     entry_points = {
         'console_scripts': ['gopro2gpx = gopro2gpx.gopro2gpx:main']
     }
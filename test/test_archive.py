@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from gopro2gpx import archive, gpmf, gpshelper
+import io
+import os
+import pytest
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+samples_dir = dir_path + '../samples/'
+
+COLUMNS = ('lat', 'lon', 'ele', 'speed', 'time', 'source')
+
+
+def test_varints():
+    values = [ 0, 1, -1, 63, -64, 64, 2**40, -2**63, 2**63 - 1, 5, 5 ]
+    data = archive.encodeVarints(values)
+    assert archive.decodeVarints(data) == values
+    # small deltas take one byte each
+    assert len(archive.encodeVarints(range(100, 200))) == 2 + 99
+
+
+def test_columns():
+    block = archive.encodeColumn([ 40.1234567, 40.1234568 ], [ 10000000.0 ])
+    assert block[0] == archive.SCALED
+    # not exact with the scale: stored as floats
+    values = [ 0.1 + 0.2, -0.0, float('inf') ]
+    block = archive.encodeColumn(values, [ 10.0 ])
+    assert block[0] == archive.FLOAT
+    decoded, offset = archive.decodeColumn(block, 0)
+    assert decoded.tobytes() == archive.array.array('d', values).tobytes() and offset == len(block)
+
+
+@pytest.mark.parametrize("sample_bin", ['hero07.bin', 'hero11.bin', 'karma.bin'])
+def test_round_trip(sample_bin: str):
+    from gopro2gpx import gopro2gpx
+    with open(samples_dir + sample_bin, 'rb') as fd:
+        raw = fd.read()
+    points, start_time, device_name = gopro2gpx.BuildGPSPoints(gpmf.parseStream(raw, fourccs=gopro2gpx.GPS_LABELS))
+    points.set_extension('hr', range(len(points)))
+
+    fd = io.BytesIO()
+    archive.write(fd, points, start_time=start_time, name=device_name, chunk_size=100)
+    fd.seek(0)
+    track, archived_start_time, archived_name = archive.read(fd)
+    assert (archived_start_time, archived_name) == (start_time, device_name)
+    for column in COLUMNS:
+        assert getattr(track, column).tobytes() == getattr(points, column).tobytes()
+    assert track.extensions['hr'] == points.extensions['hr']
+    assert gpshelper.generate_GPX(track) == gpshelper.generate_GPX(points)
+    assert len(fd.getvalue()) * 10 < len(gpshelper.generate_GPX(points))
+
+
+def test_time_range():
+    start = datetime(2023, 5, 1, 10, 0, 0, tzinfo=timezone.utc)
+    track = gpshelper.Track()
+    track.extend([ 40.0 + i / 1e5 for i in range(1000) ], [ -3.5 ] * 1000, [ 650.0 ] * 1000, [ 1.0 ] * 1000,
+                 [ gpshelper.to_us(start + timedelta(seconds=i)) for i in range(1000) ], 'GPS9')
+    fd = io.BytesIO()
+    assert archive.write(fd, track, chunk_size=100) == 10
+    fd.seek(0)
+
+    reader = archive.ArchiveReader(fd)
+    assert len(reader) == 1000 and reader.start_time is None
+    begin, end = start + timedelta(seconds=250), start + timedelta(seconds=349)
+    assert len(list(reader.chunks(begin, end))) == 2
+    points = reader.read(begin, end)
+    assert list(points.time) == list(track.time[250:350])
+    assert len(reader.read(bbox=(40.001495, -4, 40.002505, -3))) == 101
+    assert len(reader.read(start=start + timedelta(days=1))) == 0
+
+    with pytest.raises(Exception):
+        archive.ArchiveReader(io.BytesIO(b'not an archive'))
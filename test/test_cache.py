@@ -0,0 +1,92 @@
+from pathlib import Path
+from types import SimpleNamespace
+from gopro2gpx import cache, gpshelper
+import os
+import time
+import pytest
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+samples_dir = dir_path + '../samples/'
+
+
+def test_raw(tmp_path: Path):
+    telemetry_cache = cache.TelemetryCache(str(tmp_path / 'cache'))
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'video')
+    assert telemetry_cache.getRaw(str(video)) is None
+
+    digest = telemetry_cache.putRaw(str(video), b'gpmf data')
+    assert telemetry_cache.getRaw(str(video)) == b'gpmf data'
+    assert telemetry_cache.rawHash(str(video)) == digest
+
+    # a modified file isn't found
+    video.write_bytes(b'new video')
+    assert telemetry_cache.getRaw(str(video)) is None
+
+    writer = telemetry_cache.rawWriter(str(video))
+    writer.write(b'gpmf ')
+    writer.write(b'data')
+    assert writer.commit() == digest
+    writer.discard()
+    assert telemetry_cache.getRaw(str(video)) == b'gpmf data'
+    assert not [ name for name in os.listdir(str(tmp_path / 'cache' / 'raw')) if name.endswith('.tmp') ]
+
+
+def test_track(tmp_path: Path):
+    telemetry_cache = cache.TelemetryCache(str(tmp_path / 'cache'))
+    track = gpshelper.Track()
+    track.extend([ 40.1, 40.2 ], [ -3.5, -3.6 ], [ 650.0, 651.0 ], [ 1.5, 2.0 ], [ 10, 20 ], 'GPS9')
+    options = { 'skip': False, 'dopLimit': 2000 }
+    telemetry_cache.putTrack([ 'abc' ], options, track, None, 'HERO11')
+
+    cached, start_time, name = telemetry_cache.getTrack([ 'abc' ], options)
+    assert list(cached.lat) == list(track.lat) and list(cached.time) == list(track.time)
+    assert (start_time, name) == (None, 'HERO11')
+    assert telemetry_cache.getTrack([ 'abc' ], { 'skip': True, 'dopLimit': 2000 }) is None
+    assert telemetry_cache.getTrack([ 'abd' ], options) is None
+
+
+def test_evict(tmp_path: Path):
+    telemetry_cache = cache.TelemetryCache(str(tmp_path / 'cache'), max_size=2500)
+
+    def put(i, age):
+        video = tmp_path / ('video%d.mp4' % i)
+        video.write_bytes(b'video')
+        digest = telemetry_cache.putRaw(str(video), bytes([ i ]) * 1000)
+        past = time.time() - age
+        os.utime(telemetry_cache.path('raw', digest + '.bin'), (past, past))
+        os.utime(telemetry_cache.path('ids', cache.file_identity(str(video))), (past, past))
+        return str(video)
+
+    videos = [ put(0, 200), put(1, 100) ]
+    # used now, so the entries of video 1 are the oldest
+    assert telemetry_cache.getRaw(videos[0]) is not None
+    videos.append(put(2, 0))
+    assert telemetry_cache.getRaw(videos[0]) is not None
+    assert telemetry_cache.getRaw(videos[1]) is None
+    assert telemetry_cache.getRaw(videos[2]) is not None
+
+
+def test_main_cache(tmp_path: Path, capsys, monkeypatch):
+    from gopro2gpx import gopro2gpx, gpmf
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'default'))
+
+    def args(output):
+        return SimpleNamespace(files=[ samples_dir + 'hero07.bin' ], outputfile=str(tmp_path / output), binary=True, verbose=0,
+                               skip=False, skip_dop=False, dop_limit=2000, time_shift=0, gpx=True, kml=False, csv=False,
+                               no_cache=False, cache_dir=str(tmp_path / 'cache'), cache_size=100)
+
+    gopro2gpx.main_core(args('first'))
+    assert "read from the cache" not in capsys.readouterr().out
+
+    # a hit doesn't parse the data again
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed")
+    monkeypatch.setattr(gpmf, 'scanStreams', fail)
+    monkeypatch.setattr(gpmf, 'parseStream', fail)
+    monkeypatch.setattr(gpmf.GpmfFileReader, 'iterTelemetryFromBinary', fail)
+    gopro2gpx.main_core(args('second'))
+    assert "Track read from the cache" in capsys.readouterr().out
+    assert (tmp_path / 'first.gpx').read_text() == (tmp_path / 'second.gpx').read_text()
+    # everything is kept in --cache-dir
+    assert not (tmp_path / 'default').exists()
@@ -0,0 +1,70 @@
+from pathlib import Path
+from gopro2gpx import gopro2gpx, gpmf, gpshelper
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+from gopro2gpx import columnar, imu
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+samples_dir = dir_path + '../samples/'
+
+
+def sample_track(sample_bin):
+    raw = open(samples_dir + sample_bin, 'rb').read()
+    points, _, _ = gopro2gpx.BuildGPSPoints(gpmf.parseStream(raw, fourccs=gopro2gpx.GPS_LABELS))
+    return raw, points
+
+
+def test_npz(tmp_path: Path):
+    raw, track = sample_track('hero11.bin')
+    filenames = columnar.write(str(tmp_path / 'hero11'), track=track, streams=imu.extractIMU(raw), fmt='npz')
+    assert filenames == [ str(tmp_path / 'hero11.npz') ]
+    with np.load(filenames[0]) as data:
+        assert data['lat'].tolist() == track.lat.tolist()
+        assert data['time'].tolist() == track.time.tolist()
+        assert data['source_names'][data['source'][0]] == track[0].name
+    assert 'ACCL' in imu.readIMU(filenames[0])
+
+
+@pytest.mark.parametrize("fmt", [ 'parquet', 'arrow' ])
+def test_arrow(tmp_path: Path, fmt: str):
+    pyarrow = pytest.importorskip('pyarrow')
+    raw, track = sample_track('hero11.bin')
+    table = track.to_arrow()
+    # the columns are the buffers of the track
+    assert table.column('lat').chunk(0).buffers()[1].address == track.arrays()['lat'].ctypes.data
+    assert table.column('lat').to_pylist() == track.lat.tolist()
+    assert table.column('source').to_pylist()[0] == track[0].name
+
+    filenames = columnar.write(str(tmp_path / 'hero11'), track=track, streams=imu.extractIMU(raw), fmt=fmt)
+    assert filenames[0] == str(tmp_path / ('hero11.' + fmt))
+    assert str(tmp_path / ('hero11.ACCL.' + fmt)) in filenames
+    if fmt == 'parquet':
+        loaded = pyarrow.parquet.read_table(filenames[0])
+    else:
+        loaded = pyarrow.ipc.open_file(filenames[0]).read_all()
+    assert loaded.equals(table)
+
+
+def test_dataframe():
+    pytest.importorskip('pandas')
+    _, track = sample_track('hero07.bin')
+    df = track.to_dataframe()
+    assert len(df) == len(track)
+    assert df['ele'].tolist() == track.ele.tolist()
+    assert df['source'].iloc[0] == 'GPS5'
+
+
+def test_check(tmp_path: Path, monkeypatch):
+    _, track = sample_track('hero07.bin')
+    assert columnar.check('npz') == 'npz'
+    with pytest.raises(columnar.ColumnarError):
+        columnar.check('xls')
+    monkeypatch.setattr(columnar.fourCC, 'np', None)
+    with pytest.raises(columnar.ColumnarError):
+        columnar.write('unused', fmt='npz')
+    # the track is written without numpy
+    if columnar.pyarrow is not None:
+        assert columnar.check('arrow') == 'arrow'
+        assert columnar.write(str(tmp_path / 'hero07'), track=track, fmt='parquet') == [ str(tmp_path / 'hero07.parquet') ]
@@ -0,0 +1,192 @@
+from pathlib import Path
+from gopro2gpx import ffmpegtools
+import os
+import platform
+import subprocess
+import pytest
+
+pytestmark = pytest.mark.skipif(platform.system() == 'Windows', reason='fake ffmpeg is a shell script')
+
+
+def fake_ffmpeg(path: Path, version: str):
+    path.write_text('#!/bin/sh\necho "ffmpeg version %s Copyright (c) 2000-2020 the FFmpeg developers"\n' % version)
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_lazy(monkeypatch):
+    def no_process(*args, **kwargs):
+        raise AssertionError("process started")
+    monkeypatch.setattr(subprocess, 'run', no_process)
+    tools = ffmpegtools.FFMpegTools(ffmpeg='/nonexistent/ffmpeg', ffprobe='/nonexistent/ffprobe')
+    assert tools.ffmpeg == '/nonexistent/ffmpeg'
+
+
+def test_cached_version(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    ffmpeg = fake_ffmpeg(tmp_path / 'ffmpeg', '4.3.1')
+    tools = ffmpegtools.FFMpegTools(ffmpeg=ffmpeg)
+    assert tools.version == ffmpegtools.Version(4, 3, 1)
+    assert tools.use_json_format
+    assert (tmp_path / 'cache' / 'gopro2gpx' / ffmpegtools.VERSION_CACHE).exists()
+
+    # same path and mtime: the version comes from the cache
+    stat = os.stat(ffmpeg)
+    fake_ffmpeg(tmp_path / 'ffmpeg', '2.1.3')
+    os.utime(ffmpeg, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert ffmpegtools.FFMpegTools(ffmpeg=ffmpeg).version == ffmpegtools.Version(4, 3, 1)
+
+    # a new executable is probed again
+    os.utime(ffmpeg, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    tools = ffmpegtools.FFMpegTools(ffmpeg=ffmpeg)
+    assert tools.version == ffmpegtools.Version(2, 1, 3)
+    assert not tools.use_json_format
+
+
+def test_version_cache_disabled(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    ffmpeg = fake_ffmpeg(tmp_path / 'ffmpeg', '4.3.1')
+    assert ffmpegtools.FFMpegTools(ffmpeg=ffmpeg, version_cache=None).version == ffmpegtools.Version(4, 3, 1)
+    assert not (tmp_path / 'cache').exists()
+
+    filename = tmp_path / 'versions.json'
+    assert ffmpegtools.FFMpegTools(ffmpeg=ffmpeg, version_cache=str(filename)).version == ffmpegtools.Version(4, 3, 1)
+    assert filename.exists() and not (tmp_path / 'cache').exists()
+
+
+FFPROBE_JSON = '{"streams": [{"index": 0, "codec_type": "video", "codec_name": "h264", "codec_tag_string": "avc1"}, ' \
+               '{"index": 3, "codec_type": "data", "codec_name": "bin_data", "codec_tag_string": "gpmd", "duration": "29.663000"}]}'
+
+
+def test_probe_cache(tmp_path: Path, monkeypatch):
+    from gopro2gpx import probecache
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    calls = tmp_path / 'calls'
+    ffprobe = tmp_path / 'ffprobe'
+    ffprobe.write_text("#!/bin/sh\necho x >> '%s'\necho '%s'\n" % (calls, FFPROBE_JSON))
+    ffprobe.chmod(0o755)
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'\0' * 16)
+
+    cache = probecache.ProbeCache(str(tmp_path / 'probe.sqlite'), max_entries=2)
+    tools = ffmpegtools.FFMpegTools(ffprobe=str(ffprobe), ffmpeg=fake_ffmpeg(tmp_path / 'ffmpeg', '4.3.1'), probe_cache=cache)
+    assert tools.getMetadataTrack(str(video)) == (3, 'Stream 3[3], bin_data (gpmd)')
+    assert tools.getMetadataTrack(str(video)) == (3, 'Stream 3[3], bin_data (gpmd)')
+    assert calls.read_text().count('x') == 1
+    probe = probecache.ProbeCache(str(tmp_path / 'probe.sqlite')).get(str(video))
+    assert probe.duration == 29.663 and [ s['codec_tag_string'] for s in probe.streams ] == [ 'avc1', 'gpmd' ]
+
+    # a modified file is probed again
+    video.write_bytes(b'\0' * 32)
+    tools.getMetadataTrack(str(video))
+    assert calls.read_text().count('x') == 2
+
+    # only the 2 entries used last are kept
+    for name in ('a.mp4', 'b.mp4'):
+        (tmp_path / name).write_bytes(b'')
+        tools.getMetadataTrack(str(tmp_path / name))
+    assert cache.get(str(video)) is None
+    assert cache.get(str(tmp_path / 'b.mp4')) is not None
+    cache.close()
+
+
+FFPROBE_TEXT = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'GH010039.MP4':
+  Duration: 00:01:29.66, start: 0.000000, bitrate: 60261 kb/s
+    Stream #0:0(eng): Video: h264 (High) (avc1 / 0x31637661), yuvj420p(pc), 1920x1080
+    Stream #0:3(eng): Data: none (gpmd / 0x646D7067), 29 kb/s (default)
+"""
+
+
+def test_probe_text(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    ffprobe = tmp_path / 'ffprobe'
+    ffprobe.write_text("#!/bin/sh\ncat >&2 <<'EOF'\n%sEOF\n" % FFPROBE_TEXT)
+    ffprobe.chmod(0o755)
+    tools = ffmpegtools.FFMpegTools(ffprobe=str(ffprobe), ffmpeg=fake_ffmpeg(tmp_path / 'ffmpeg', '2.1.3'))
+    probe = tools.probe('GH010039.MP4')
+    assert probe.track == 3 and probe.duration == 89.66
+    assert [ s['index'] for s in probe.streams ] == [ 0, 3 ]
+
+
+def streaming_tools(tmp_path: Path, body: str):
+    "ffmpeg printing the sample data (and then running body), ffprobe finding a gpmd track"
+    sample = os.path.realpath(os.path.dirname(os.path.realpath(__file__)) + '/../samples/hero07.bin')
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text('#!/bin/sh\n'
+                      'if [ "$1" = "-version" ]; then echo "ffmpeg version 4.3.1"; exit 0; fi\n'
+                      "echo $$ > '%s'\ncat '%s'\n%s\n" % (tmp_path / 'pid', sample, body))
+    ffmpeg.chmod(0o755)
+    ffprobe = tmp_path / 'ffprobe'
+    ffprobe.write_text("#!/bin/sh\necho '%s'\n" % FFPROBE_JSON)
+    ffprobe.chmod(0o755)
+    video = tmp_path / 'video.mp4'
+    video.write_bytes(b'')
+    return ffmpegtools.FFMpegTools(ffprobe=str(ffprobe), ffmpeg=str(ffmpeg)), str(video), open(sample, 'rb').read()
+
+
+def test_stream_metadata(tmp_path: Path, monkeypatch):
+    from gopro2gpx import gpmf
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    tools, video, raw = streaming_tools(tmp_path, 'exit 0')
+    reader = gpmf.GpmfFileReader(tools, native=False)
+    klvs = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in reader.iterTelemetryFromFFmpeg(video) ]
+    assert klvs == [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.parseStream(raw) ]
+
+    tools, video, raw = streaming_tools(tmp_path, 'exit 1')
+    with pytest.raises(Exception, match='ffmpeg failed'):
+        list(gpmf.GpmfFileReader(tools, native=False).iterTelemetryFromFFmpeg(video))
+
+
+def test_stream_metadata_stop(tmp_path: Path, monkeypatch):
+    import time
+    from gopro2gpx import gpmf
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    tools, video, raw = streaming_tools(tmp_path, 'exec sleep 60')
+    start = time.time()
+    klvs = gpmf.GpmfFileReader(tools, native=False).iterTelemetryFromFFmpeg(video)
+    assert next(klvs).fourCC == 'DEVC'
+    klvs.close()
+    assert time.time() - start < 30
+    pid = int((tmp_path / 'pid').read_text())
+    with pytest.raises(OSError):
+        os.kill(pid, 0)
+
+
+def test_stream_main(tmp_path: Path, monkeypatch):
+    from gopro2gpx import gopro2gpx
+    from types import SimpleNamespace
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    tools, video, raw = streaming_tools(tmp_path, 'exit 0')
+    (tmp_path / 'gopro2gpx.conf').write_text("[ffmpeg]\nffmpeg = %s\nffprobe = %s\n" % (tools.ffmpeg, tools.ffprobe))
+    (tmp_path / 'hero07.bin').write_bytes(raw)
+
+    options = dict(skip=False, skip_dop=False, dop_limit=2000, time_shift=0, verbose=0, gpx=True, kml=False, csv=False)
+    gopro2gpx.main_core(SimpleNamespace(files=[ video ], outputfile=str(tmp_path / 'ffmpeg'), binary=False, ffmpeg=True, **options))
+    gopro2gpx.main_core(SimpleNamespace(files=[ str(tmp_path / 'hero07.bin') ], outputfile=str(tmp_path / 'binary'), binary=True, **options))
+    assert (tmp_path / 'ffmpeg.gpx').read_text() == (tmp_path / 'binary.gpx').read_text()
+
+
+def test_stream_track_cache(tmp_path: Path, monkeypatch, capsys):
+    from gopro2gpx import gopro2gpx, gpmf
+    from types import SimpleNamespace
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    tools, video, raw = streaming_tools(tmp_path, 'exit 0')
+    (tmp_path / 'gopro2gpx.conf').write_text("[ffmpeg]\nffmpeg = %s\nffprobe = %s\n" % (tools.ffmpeg, tools.ffprobe))
+
+    def args(output):
+        return SimpleNamespace(files=[ video ], outputfile=str(tmp_path / output), binary=False, ffmpeg=True,
+                               skip=False, skip_dop=False, dop_limit=2000, time_shift=0, verbose=0, gpx=True, kml=False, csv=False,
+                               no_cache=False, cache_dir=str(tmp_path / 'cache'), cache_size=100)
+    gopro2gpx.main_core(args('first'))
+    assert "read from the cache" not in capsys.readouterr().out
+
+    # the track is found by the identity of the video, without its GPMF data
+    for name in os.listdir(tmp_path / 'cache' / 'raw'):
+        os.remove(tmp_path / 'cache' / 'raw' / name)
+    def fail(*args, **kwargs):
+        raise AssertionError("streamed")
+    monkeypatch.setattr(gpmf.GpmfFileReader, 'iterTelemetryFromFFmpeg', fail)
+    gopro2gpx.main_core(args('second'))
+    assert "Track read from the cache" in capsys.readouterr().out
+    assert (tmp_path / 'first.gpx').read_text() == (tmp_path / 'second.gpx').read_text()
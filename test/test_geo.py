@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+from gopro2gpx import flatgeobuf, gpshelper
+import io
+import json
+import struct
+import pytest
+
+
+def sample_track(n=100):
+    start = datetime(2023, 5, 1, 10, 0, 0, tzinfo=timezone.utc)
+    points = [ gpshelper.GPSPoint(40.0 + 0.001 * (i % 10), -3.5 + 0.001 * (i // 10), 650.0 + i,
+                                  start + timedelta(seconds=i), 1.5, 'GPS9') for i in range(n) ]
+    return gpshelper.Track.from_points(points)
+
+
+def test_level_bounds():
+    assert flatgeobuf.levelBounds(1, 16) == [ (1, 2), (0, 1) ]
+    assert flatgeobuf.levelBounds(100, 16) == [ (8, 108), (1, 8), (0, 1) ]
+    assert flatgeobuf.levelBounds(256, 16) == [ (17, 273), (1, 17), (0, 1) ]
+
+
+@pytest.mark.parametrize("segments", [False, True])
+def test_flatgeobuf_layout(segments: bool):
+    track = sample_track()
+    fd = io.BytesIO()
+    count = flatgeobuf.write(fd, track, name="test", segments=segments)
+    assert count == (99 if segments else 100)
+
+    data = fd.getvalue()
+    assert data[:8] == flatgeobuf.MAGIC
+    header_size, = struct.unpack_from('<I', data, 8)
+    index = 12 + header_size
+    nodes = flatgeobuf.levelBounds(count, flatgeobuf.INDEX_NODE_SIZE)[0][1]
+    features = index + nodes * flatgeobuf.node_item.size
+
+    # the root covers the whole track, and the leaves point to every feature
+    root = flatgeobuf.node_item.unpack_from(data, index)
+    assert root[:4] == (min(track.lon), min(track.lat), max(track.lon), max(track.lat))
+    leaves = [ flatgeobuf.node_item.unpack_from(data, index + flatgeobuf.node_item.size * i)[4]
+               for i in range(nodes - count, nodes) ]
+    offset = 0
+    for leaf in leaves:
+        assert leaf == offset
+        size, = struct.unpack_from('<I', data, features + offset)
+        offset += 4 + size
+    assert features + offset == len(data)
+
+
+def test_flatgeobuf_gdal(tmp_path):
+    pyogrio = pytest.importorskip('pyogrio')
+    track = sample_track()
+    filename = str(tmp_path / 'track.fgb')
+    with open(filename, 'wb') as fd:
+        flatgeobuf.write(fd, track)
+
+    info = pyogrio.read_info(filename)
+    assert info['features'] == 100 and info['geometry_type'] == 'Point Z'
+    assert list(info['fields']) == [ 'time', 'speed', 'source' ]
+    bbox = (-3.5005, 40.0015, -3.4985, 40.0045)
+    _, _, geometry, _ = pyogrio.raw.read(filename, bbox=bbox)
+    assert len(geometry) == 2 * 3
+
+
+@pytest.mark.parametrize("segments", [False, True])
+def test_geojsonseq(segments: bool):
+    track = sample_track(10)
+    output = io.StringIO()
+    with gpshelper.GeoJSONSeqWriter(output, segments=segments, chunk_size=3) as writer:
+        writer.write(track)
+    features = [ json.loads(line) for line in output.getvalue().splitlines() ]
+
+    assert len(features) == (9 if segments else 10)
+    assert features[0]['properties'] == { 'time': '2023-05-01T10:00:00.000000Z', 'speed': 1.5, 'source': 'GPS9' }
+    coordinates = [ [ lon, lat, ele ] for lon, lat, ele in zip(track.lon, track.lat, track.ele) ]
+    if segments:
+        assert [ f['geometry']['coordinates'] for f in features ] == [ list(c) for c in zip(coordinates, coordinates[1:]) ]
+    else:
+        assert [ f['geometry']['coordinates'] for f in features ] == coordinates
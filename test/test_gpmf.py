@@ -0,0 +1,196 @@
+from gopro2gpx import fourCC, gpmf
+from gopro2gpx.klvdata import KLVData
+import io
+import os
+import pytest
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+samples_dir = dir_path + '../samples/'
+
+
+def read_sample(sample_bin):
+    with open(samples_dir + sample_bin, 'rb') as fd:
+        return fd.read()
+
+
+def test_lazy_decoding():
+    klvs = gpmf.parseStream(read_sample('hero07.bin'))
+    assert all(klv._data is KLVData.NOT_DECODED for klv in klvs)
+    gps5 = next(klv for klv in klvs if klv.fourCC == 'GPS5')
+    assert gps5.data is gps5.data
+    assert gps5._data is not KLVData.NOT_DECODED
+
+
+def test_labels_not_built(capsys):
+    from gopro2gpx import gopro2gpx
+    # the parsers and builders compare keys, the str labels are only for display
+    klvs = gpmf.parseStream(read_sample('hero07.bin'), fourccs=gopro2gpx.GPS_LABELS | { 'STRM', 'DEVC' }, streams=gopro2gpx.GPS_STREAMS)
+    gopro2gpx.BuildGPSPoints(klvs)
+    gopro2gpx.BuildGPSPointsLoop(klvs)
+    assert all(klv._fourCC is None for klv in klvs)
+
+
+@pytest.mark.parametrize("sample_bin", ['hero07.bin', 'hero13.bin', 'karma.bin'])
+def test_fourccs_filter(sample_bin: str):
+    raw = read_sample(sample_bin)
+    labels = { 'SCAL', 'GPSU', 'GPS5', 'GPS9', 'GPRI' }
+    expected = [ klv for klv in gpmf.parseStream(raw) if klv.fourCC in labels ]
+    klvs = gpmf.parseStream(raw, fourccs=labels)
+    assert [ (k.fourCC, bytes(k.rawdata or b'')) for k in klvs ] == [ (k.fourCC, bytes(k.rawdata or b'')) for k in expected ]
+
+
+@pytest.mark.parametrize("sample_bin", ['hero07.bin', 'hero13.bin', 'karma.bin'])
+def test_walk_stream(sample_bin: str):
+    raw = read_sample(sample_bin)
+    nodes = list(gpmf.walkStream(raw, streams={ 'GPS5', 'GPS9', 'GPRI', 'SYST' }))
+    streams = [ node for node in nodes if isinstance(node, gpmf.StreamNode) ]
+    assert all(node.skipped == (node.fourCC not in { 'GPS5', 'GPS9', 'GPRI', 'SYST' }) for node in streams)
+    assert any(node.fourCC in ('ACCL', 'GYRO') and node.klvs == [] for node in streams)
+
+    # the labels found in the kept streams are the same of the full parse
+    labels = { 'SCAL', 'GPSU', 'GPSF', 'GPS5', 'GPS9', 'GPRI', 'SYST' }
+    expected = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.parseStream(raw, fourccs=labels) if k.fourCC != 'SCAL' ]
+    klvs = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.parseStream(raw, fourccs=labels, streams={ 'GPS5', 'GPS9', 'GPRI', 'SYST' }) if k.fourCC != 'SCAL' ]
+    assert klvs == expected
+
+
+class ShortReads(io.RawIOBase):
+    "a pipe like stream, returning at most 7 bytes per read"
+    def __init__(self, data):
+        self.fd = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self.fd.read(min(7, len(b)))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.mark.parametrize("sample_bin", ['hero07.bin', 'karma.bin'])
+def test_iter_stream(sample_bin: str):
+    raw = read_sample(sample_bin)
+    expected = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.parseStream(raw) ]
+    klvs = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.iterStream(ShortReads(raw)) ]
+    assert klvs == expected
+    assert b''.join(gpmf.iterDevices(io.BytesIO(raw))) == raw
+
+
+def test_iter_stream_truncated(capsys):
+    raw = read_sample('hero07.bin')
+    blocks = list(gpmf.iterDevices(io.BytesIO(raw[:255777])))
+    assert "Warning, truncated GPMF block DEVC" in capsys.readouterr().out
+    complete = b''.join(blocks)
+    assert raw.startswith(complete) and 0 < len(complete) < 255777
+
+    expected = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.parseStream(complete) ]
+    klvs = [ (k.fourCC, k.rawdata and bytes(k.rawdata)) for k in gpmf.iterStream(ShortReads(raw[:255777])) ]
+    assert klvs == expected
+
+
+@pytest.mark.parametrize("sample_bin", ['hero07.bin', 'hero11.bin'])
+def test_gps_arrays(sample_bin: str):
+    pytest.importorskip('numpy')
+    klvs = gpmf.parseStream(read_sample(sample_bin), fourccs={ 'GPS5', 'GPS9' })
+    assert klvs
+    for klv in klvs:
+        assert [ tuple(item) for item in klv.array.tolist() ] == [ tuple(item) for item in klv.data ]
+
+
+def test_complex_types():
+    assert fourCC.parse_type('f[3]L\0') == [ 'f', 'f', 'f', 'L' ]
+    assert fourCC.get_struct('JlllSSSSBB') is fourCC.get_struct('JlllSSSSBB')
+    assert fourCC.get_struct('JlllSSSSBB').size == 30
+
+    # karma labels without a specific decoder are read using the TYPE of the stream
+    klvs = gpmf.parseStream(read_sample('karma.bin'))
+    kbat = next(klv for klv in klvs if klv.fourCC == 'KBAT')
+    assert kbat.complex_type == 'lLlsSSSSSSSBBBb'
+    assert len(kbat.data) == kbat.repeat and len(kbat.data[0]) == 15
+    gpri = next(klv for klv in klvs if klv.fourCC == 'GPRI')
+    assert isinstance(gpri.data, fourCC.KARMAGPSData)
+
+
+def test_complex_layout_fallback():
+    import struct
+    # a TYPE with the right fields but the wrong size: the default layout is used
+    sample = struct.pack('>lllllllHH', 401234567, -31234567, 650000, 1500, 1600, 8766, 43200000, 150, 3)
+    content = b'TYPEc\x01\x00\x09lllllllLL\x00\x00\x00' + b'GPS9?\x20\x00\x01' + sample
+    raw = b'STRM\x00\x04' + struct.pack('>H', len(content) // 4) + content
+    gps9 = next(klv for klv in gpmf.parseStream(raw) if klv.fourCC == 'GPS9')
+    assert gps9.complex_type == 'lllllllLL'
+    assert gps9.data == [ fourCC.GPS9Data(401234567, -31234567, 650000, 1500, 1600, 8766, 43200000, 150, 3) ]
+    if fourCC.np is not None:
+        assert [ tuple(item) for item in gps9.array.tolist() ] == [ tuple(gps9.data[0]) ]
+
+    # the struct and numpy types agree, UTC dates included
+    assert fourCC.get_struct('U').size == 16
+    if fourCC.np is not None:
+        for type_string in ('lllllllSS', 'JlllSSSSBB', 'UlfB'):
+            assert fourCC.get_dtype(type_string).itemsize == fourCC.get_struct(type_string).size
+
+
+def test_unknown_labels(capsys):
+    fourCC.unknown_labels.clear()
+    raw = (b'ZZZZL\x04\x00\x01\x00\x00\x00\x01' * 3) + b'DVNMc\x01\x00\x04Hero'
+    klvs = gpmf.parseStream(raw)
+    assert [ klv.data for klv in klvs ] == [ False, False, False, 'Hero' ]
+    assert capsys.readouterr().out.count("'ZZZZ' not found") == 1
+    assert fourCC.label_key('ZZZZ') in fourCC.unknown_labels
+    assert fourCC.get_decoder(fourCC.label_key('DVNM')) is fourCC.get_decoder(fourCC.label_key('DVNM'))
+
+
+@pytest.mark.parametrize("sample_bin", ['fusion.bin', 'hero05.bin', 'hero07.bin', 'hero11.bin', 'hero13.bin', 'karma.bin'])
+@pytest.mark.parametrize("options", [ {}, { 'skip': True, 'skipDop': True, 'dopLimit': 400, 'timeShift': 7 } ])
+def test_gps_arrays_builder(capsys, sample_bin: str, options: dict):
+    pytest.importorskip('numpy')
+    from gopro2gpx import gopro2gpx, gpsbuilder
+    klvs = gpmf.parseStream(read_sample(sample_bin), fourccs=gopro2gpx.GPS_LABELS, streams=gopro2gpx.GPS_STREAMS)
+    capsys.readouterr()
+    points, start_time, _, stats = gopro2gpx.BuildGPSPointsLoop(klvs, **options)
+    loop_output = capsys.readouterr().out
+    builder = gpsbuilder.BuildGPSPoints(klvs, **options)
+    # the same messages, in the same order
+    assert capsys.readouterr().out == loop_output
+    as_tuple = lambda p: (p.latitude, p.longitude, p.elevation, p.time, p.speed, p.name)
+    assert [ as_tuple(p) for p in builder.points() ] == [ as_tuple(p) for p in points ]
+    assert builder.start_time == start_time
+    assert builder.stats == stats
+
+
+@pytest.mark.parametrize("sample_bin", [ 'hero11.bin', 'karma.bin' ])
+@pytest.mark.parametrize("chunk_size", [ 1, 7 ])
+def test_gps_arrays_chunks(capsys, monkeypatch, sample_bin: str, chunk_size: int):
+    pytest.importorskip('numpy')
+    from gopro2gpx import gopro2gpx, gpsbuilder, gpshelper
+    # the state (SCAL, GPSU, GPSFIX, GPSP, SYST) is kept between chunks of any size
+    monkeypatch.setattr(gpsbuilder, 'CHUNK_SIZE', chunk_size)
+    klvs = gpmf.parseStream(read_sample(sample_bin), fourccs=gopro2gpx.GPS_LABELS)
+    options = { 'skip': True, 'skipDop': True, 'dopLimit': 400 }
+    capsys.readouterr()
+    points, start_time, _, stats = gopro2gpx.BuildGPSPointsLoop(klvs, **options)
+    loop_output = capsys.readouterr().out
+    builder = gpsbuilder.BuildGPSPoints(iter(klvs), **options)
+    assert capsys.readouterr().out == loop_output
+    assert list(builder.points().time) == [ gpshelper.to_us(p.time) for p in points ]
+    assert list(builder.points().source) == [ gpshelper.SOURCE_CODES[p.name] for p in points ]
+    assert (builder.start_time, builder.stats) == (start_time, stats)
+
+
+@pytest.mark.parametrize("sample_bin, source", [ ('hero07.bin', 'gps5'), ('hero11.bin', 'gps9'), ('hero13.bin', 'gps9'), ('karma.bin', 'gpri') ])
+def test_gps_source(sample_bin: str, source: str):
+    from gopro2gpx import gopro2gpx, gpshelper
+    raw = read_sample(sample_bin)
+    assert gopro2gpx.selectGPSSource('auto', gpmf.scanStreams(raw)) == source
+    assert gopro2gpx.selectGPSSource('gps5', gpmf.scanStreams(raw)) == 'gps5'
+
+    streams, skipped = gopro2gpx.GPS_SOURCES[source]
+    klvs = gpmf.parseStream(raw, fourccs=gopro2gpx.GPS_LABELS - skipped, streams=streams)
+    assert not any(klv.fourCC in skipped for klv in klvs)
+
+    # the same points, and start time, of decoding everything and keeping the best source
+    points, start_time, _ = gopro2gpx.BuildGPSPoints(klvs)
+    all_points, all_start_time, _ = gopro2gpx.BuildGPSPoints(gpmf.parseStream(raw, fourccs=gopro2gpx.GPS_LABELS))
+    assert start_time == all_start_time
+    assert gpshelper.generate_GPX(points) == gpshelper.generate_GPX(all_points)
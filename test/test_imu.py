@@ -0,0 +1,43 @@
+from pathlib import Path
+from gopro2gpx import gpmf
+import os
+import pytest
+
+np = pytest.importorskip('numpy')
+from gopro2gpx import imu
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+samples_dir = dir_path + '../samples/'
+
+
+@pytest.mark.parametrize("sample_bin", ['fusion.bin', 'hero07.bin', 'hero13.bin'])
+def test_extract_imu(tmp_path: Path, sample_bin: str):
+    raw = open(samples_dir + sample_bin, 'rb').read()
+    streams = imu.extractIMU(raw)
+    assert 'ACCL' in streams and 'GYRO' in streams
+
+    for label, stream in streams.items():
+        klvs = [ klv for klv in gpmf.parseStream(raw, fourccs={ label }) ]
+        assert len(stream) == sum(klv.repeat for klv in klvs)
+        assert stream.samples.shape == (len(stream), 3)
+        assert np.all(np.diff(stream.time) > 0)
+        # the first sample is the one decoded by the label
+        scal = next(klv.data for klv in gpmf.parseStream(raw, fourccs={ 'SCAL' }, streams={ label }))
+        assert stream.samples[0] == pytest.approx([ v / scal for v in klvs[0].data ])
+
+    filename = str(tmp_path / 'imu.npz')
+    imu.writeIMU(filename, streams)
+    loaded = imu.readIMU(filename)
+    assert list(loaded) == list(streams)
+    for label, stream in streams.items():
+        assert np.array_equal(loaded[label].time, stream.time)
+        assert np.allclose(loaded[label].samples, stream.samples, rtol=1e-6)
+        assert (loaded[label].name, loaded[label].units) == (stream.name, stream.units)
+
+
+def test_imu_time():
+    stream = imu.IMUStream('ACCL')
+    stream.add(1000, np.zeros((4, 3)))
+    stream.add(2000, np.zeros((2, 3)))
+    stream.build()
+    assert stream.time.tolist() == [ 1000, 1250, 1500, 1750, 2000, 2250 ]
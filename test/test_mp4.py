@@ -0,0 +1,132 @@
+from pathlib import Path
+from gopro2gpx import mp4
+import os
+import struct
+import pytest
+
+dir_path = os.path.dirname(os.path.realpath(__file__)) + '/'
+
+
+def box(btype, payload):
+    return struct.pack('>I4s', 8 + len(payload), btype) + payload
+
+
+def full_box(btype, payload):
+    return box(btype, b'\0\0\0\0' + payload)
+
+
+def devc_blocks(data):
+    "split a gpmd dump in its top level DEVC samples"
+    offset = 0
+    while offset < len(data):
+        _, size, repeat = struct.unpack_from('>4sxBH', data, offset)
+        length = 8 + (size * repeat + 3) // 4 * 4
+        yield data[offset:offset + length]
+        offset += length
+
+
+def build_mp4(samples, co64=False):
+    """
+    build a minimal mp4 with a dummy video track and a gpmd track. The gpmd
+    samples are stored in chunks of 2, separated by junk data.
+    """
+    chunks = [ samples[i:i+2] for i in range(0, len(samples), 2) ]
+    mdat = b''
+    chunk_offsets = []
+    header = box(b'ftyp', b'mp41\0\0\0\0mp41')
+    for chunk in chunks:
+        mdat += b'\xff' * 13
+        chunk_offsets.append(len(header) + 8 + len(mdat))
+        mdat += b''.join(chunk)
+    mdat = box(b'mdat', mdat)
+
+    stsd = full_box(b'stsd', struct.pack('>I', 1) + box(b'gpmd', b'\0' * 8))
+    stsz = full_box(b'stsz', struct.pack('>II', 0, len(samples)) + b''.join(struct.pack('>I', len(s)) for s in samples))
+    stsc = full_box(b'stsc', struct.pack('>I', 2) + struct.pack('>III', 1, 2, 1) + struct.pack('>III', len(chunks), len(chunks[-1]), 1))
+    if co64:
+        co = full_box(b'co64', struct.pack('>I', len(chunks)) + b''.join(struct.pack('>Q', o) for o in chunk_offsets))
+    else:
+        co = full_box(b'stco', struct.pack('>I', len(chunks)) + b''.join(struct.pack('>I', o) for o in chunk_offsets))
+    mdhd = full_box(b'mdhd', struct.pack('>IIII', 0, 0, 1000, 1001 * len(samples)) + b'\0' * 4)
+    gpmd_trak = box(b'trak', box(b'mdia', mdhd + box(b'minf', box(b'stbl', stsd + stsz + stsc + co))))
+
+    video_stsd = full_box(b'stsd', struct.pack('>I', 1) + box(b'avc1', b'\0' * 8))
+    video_trak = box(b'trak', box(b'mdia', box(b'minf', box(b'stbl', video_stsd))))
+
+    return header + mdat + box(b'moov', video_trak + gpmd_trak)
+
+
+@pytest.mark.parametrize("co64", [False, True])
+def test_native_reader(tmp_path: Path, co64: bool):
+    raw = open(dir_path + '../samples/hero07.bin', 'rb').read()
+    samples = list(devc_blocks(raw))
+    mp4_filename = tmp_path / 'hero07.mp4'
+    mp4_filename.write_bytes(build_mp4(samples, co64=co64))
+
+    reader = mp4.MP4Reader()
+    track, info = reader.getMetadataTrack(str(mp4_filename))
+    assert track == 1
+    gpmd = reader.getTrack(str(mp4_filename))
+    assert gpmd.timescale == 1000
+    assert gpmd.duration == 1001 * len(samples)
+    assert reader.getMetadata(track, str(mp4_filename)) == raw
+
+
+def test_sample_offsets():
+    assert mp4.sampleOffsets([ 100, 200 ], [ (1, 2), (2, 1) ], [ 10, 20, 30 ]) == [ 100, 110, 200 ]
+    # chunks that stco doesn't have
+    with pytest.raises(mp4.MP4Error):
+        mp4.sampleOffsets([ 100, 200 ], [ (1, 2), (4, 1) ], [ 10 ] * 5)
+    with pytest.raises(mp4.MP4Error):
+        mp4.sampleOffsets([ 100 ], [ (0, 1) ], [ 10 ])
+
+
+def test_no_gpmd_track(tmp_path: Path):
+    mp4_filename = tmp_path / 'empty.mp4'
+    mp4_filename.write_bytes(box(b'ftyp', b'mp41\0\0\0\0mp41') + box(b'moov', b''))
+    assert mp4.MP4Reader().getMetadataTrack(str(mp4_filename)) == (None, None)
+
+
+def test_not_mp4(tmp_path: Path):
+    filename = tmp_path / 'hero07.bin'
+    filename.write_bytes(open(dir_path + '../samples/hero07.bin', 'rb').read())
+    with pytest.raises(mp4.MP4Error):
+        mp4.MP4Reader().getMetadataTrack(str(filename))
+
+
+def test_proxy_names():
+    from gopro2gpx import gpmf
+    assert gpmf.proxyNames(os.path.join('x', 'GX010039.MP4')) == [ os.path.join('x', name) for name in
+                                                                  ('GL010039.LRV', 'GL010039.lrv', 'GX010039.LRV', 'GX010039.lrv') ]
+    assert gpmf.proxyNames('GOPR0039.mp4') == [ 'GOPR0039.LRV', 'GOPR0039.lrv' ]
+    assert gpmf.proxyNames('hero07.bin') == []
+
+
+def test_proxy(tmp_path: Path):
+    from gopro2gpx import gpmf
+    raw = open(dir_path + '../samples/hero07.bin', 'rb').read()
+    samples = list(devc_blocks(raw))
+    video = tmp_path / 'GX010001.MP4'
+    video.write_bytes(build_mp4(samples))
+    proxy = tmp_path / 'GL010001.LRV'
+
+    def read_from(**kwargs):
+        reader = gpmf.GpmfFileReader(None, **kwargs)
+        files = []
+        getMetadata = reader.mp4reader.getMetadata
+        reader.mp4reader.getMetadata = lambda track, fname: files.append(fname) or getMetadata(track, fname)
+        assert reader.readRawTelemetryFromMP4(str(video)) == raw
+        return files
+
+    assert read_from() == [ str(video) ]
+    proxy.write_bytes(build_mp4(samples, co64=True))
+    assert read_from() == [ str(proxy) ]
+    assert read_from(proxy=False) == [ str(video) ]
+
+    # another first DEVC (GPSU), or another duration
+    proxy.write_bytes(build_mp4(samples[1:] + samples[-1:]))
+    assert read_from() == [ str(video) ]
+    proxy.write_bytes(build_mp4(samples[:-2]))
+    assert read_from() == [ str(video) ]
+    proxy.write_bytes(b'not a video')
+    assert read_from() == [ str(video) ]
@@ -68,3 +68,72 @@ def test_sample_set(tmp_path: Path, sample_bin: str):
     s0 = open(expected_csv_filename, 'r').read()
     s1 = open(result_csv_filename, 'r').read()
     assert s0 == s1,f'{sample_bin} csv'
+
+
+def test_binary_closed(tmp_path: Path, monkeypatch):
+    from gopro2gpx import gpmf
+    mapped = []
+    read = gpmf.GpmfFileReader.readRawTelemetryFromBinary
+    monkeypatch.setattr(gpmf.GpmfFileReader, 'readRawTelemetryFromBinary',
+                        lambda self, filename: mapped.append(read(self, filename)) or mapped[-1])
+
+    args = Args()
+    args.files = [ os.path.normpath(dir_path + '../samples/hero07.bin') ]
+    args.outputfile = os.path.normpath(tmp_path / 'hero07')
+    args.binary = True
+    args.gpx = True
+    gopro2gpx.main_core(args)
+    assert len(mapped) == 1 and mapped[0].closed
+
+
+def test_npz_output_without_numpy(tmp_path: Path, monkeypatch, capsys):
+    from gopro2gpx import fourCC
+    monkeypatch.setattr(fourCC, 'np', None)
+    args = Args()
+    args.files = [ os.path.normpath(dir_path + '../samples/hero07.bin') ]
+    args.outputfile = os.path.normpath(tmp_path / 'hero07')
+    args.binary = True
+    args.gpx = True
+    args.columnar = 'npz'
+    gopro2gpx.main_core(args)
+    assert "Can't create the columnar output: Columnar output needs numpy" in capsys.readouterr().out
+    assert os.listdir(tmp_path) == [ 'hero07.gpx' ]
+
+
+def test_no_probe_cache(tmp_path: Path, monkeypatch):
+    from gopro2gpx import probecache
+    def fail(*args, **kwargs):
+        raise AssertionError("ProbeCache created")
+    monkeypatch.setattr(probecache, 'ProbeCache', fail)
+    args = Args()
+    args.files = [ os.path.normpath(dir_path + '../samples/hero07.bin') ]
+    args.outputfile = os.path.normpath(tmp_path / 'hero07')
+    args.binary = True
+    args.gpx = True
+    # without no_cache (GUI and tests) nothing is cached
+    gopro2gpx.main_core(args)
+    assert os.path.exists(tmp_path / 'hero07.gpx')
+
+
+def test_gps9_fallback(tmp_path: Path, capsys):
+    from gopro2gpx import gpmf
+    # hero11 with GPSFIX 0 in every GPS9 sample: --skip drops them all
+    raw = bytearray(open(dir_path + '../samples/hero11.bin', 'rb').read())
+    for klv in gpmf.parseStream(raw, fourccs={ 'GPS9' }):
+        for i in range(klv.repeat):
+            klv.rawdata[i * klv.size + klv.size - 2:(i + 1) * klv.size] = b'\0\0'
+    (tmp_path / 'hero11.bin').write_bytes(raw)
+
+    gpx = {}
+    for source in ('auto', 'gps5'):
+        args = Args()
+        args.files = [ str(tmp_path / 'hero11.bin') ]
+        args.outputfile = str(tmp_path / source)
+        args.binary = True
+        args.gpx = True
+        args.skip = True
+        args.gps_source = source
+        gopro2gpx.main_core(args)
+        gpx[source] = (tmp_path / (source + '.gpx')).read_text()
+    assert "No GPS9 points left, reading the GPS5 ones" in capsys.readouterr().out
+    assert gpx['auto'] == gpx['gps5'] and '<trkpt' in gpx['auto']
@@ -0,0 +1,44 @@
+from gopro2gpx import gpshelper, simplify
+import math
+import pytest
+
+
+def zigzag_track():
+    "a straight line with noise under 1m, and a 50m corner in the middle"
+    track = gpshelper.Track()
+    lat = [ 40.0 + i * 1e-5 for i in range(200) ]
+    lon = [ -3.5 + (0.000004 if i % 2 else 0.0) + (0.0005 if i == 100 else 0.0) for i in range(200) ]
+    track.extend(lat, lon, [ 650.0 ] * 200, [ 1.0 ] * 200, [ i * 100000 for i in range(200) ], 'GPS5')
+    return track
+
+
+def test_project():
+    x, y = simplify.project([ 40.0, 40.001 ], [ -3.5, -3.499 ])
+    assert y[1] - y[0] == pytest.approx(111.2, abs=0.1)
+    assert x[1] - x[0] == pytest.approx(111.2 * math.cos(math.radians(40.0005)), abs=0.1)
+
+
+# vw compares areas (tolerance^2), so it needs a larger tolerance for the noise
+@pytest.mark.parametrize("method, tolerance", [ ('dp', 2.0), ('vw', 5.0) ])
+def test_simplify(method: str, tolerance: float):
+    track = zigzag_track()
+    points = simplify.simplify(track, tolerance, method=method)
+    assert list(points.time) == [ 0, 9900000, 10000000, 10100000, 19900000 ]
+
+    # at least a point every 5 seconds
+    points = simplify.simplify(track, tolerance, max_gap=5, method=method)
+    assert all(b - a <= 5000000 for a, b in zip(points.time, points.time[1:]))
+    assert len(points) < 12
+    assert len(simplify.simplify(track, 0.1, method=method)) == len(track)
+
+
+def test_douglas_peucker_numpy():
+    np = pytest.importorskip('numpy')
+    track = zigzag_track()
+    x, y = simplify.project(track.lat, track.lon)
+    expected = simplify.douglasPeucker(x, y, 0.3)
+    simplify.np = None
+    try:
+        assert simplify.douglasPeucker(x, y, 0.3) == expected
+    finally:
+        simplify.np = np
@@ -0,0 +1,145 @@
+from datetime import datetime, timezone
+from gopro2gpx import gpshelper
+import pytest
+
+
+def sample_points():
+    return [ gpshelper.GPSPoint(40.1, -3.5, 650.25, datetime(2023, 5, 1, 10, 0, 0, 55), 1.5, 'GPS5'),
+             gpshelper.GPSPoint(40.2, -3.6, 651.0, datetime(2023, 5, 1, 10, 0, 1, tzinfo=timezone.utc), 2.0, 'GPS9'),
+             gpshelper.GPSPoint(40.3, -3.7, 652.0, datetime(2023, 5, 1, 10, 0, 2, tzinfo=timezone.utc), 0.0, '') ]
+
+
+def as_tuple(p):
+    return (p.latitude, p.longitude, p.elevation, p.time, p.speed, p.name, p.hr, p.cadence)
+
+
+def test_track_points():
+    points = sample_points()
+    track = gpshelper.Track.from_points(points)
+    assert len(track) == 3
+    assert [ as_tuple(p) for p in track ] == [ as_tuple(p) for p in points ]
+    assert as_tuple(track[-1]) == as_tuple(points[-1])
+    assert track.time.typecode == 'q' and track.source.typecode == 'B'
+    assert not hasattr(points[0], '__dict__')
+
+    # the generate functions accept the track as a list of points
+    assert gpshelper.generate_GPX(track, trk_name='test') == gpshelper.generate_GPX(points, trk_name='test')
+    assert gpshelper.generate_KML(track) == gpshelper.generate_KML(points)
+
+    track.set_extension('hr', [ 120, 121, 122 ])
+    assert [ p.hr for p in track ] == [ 120, 121, 122 ]
+    assert [ p.cadence for p in track ] == [ 0, 0, 0 ]
+    # slices are Tracks, with the extensions
+    for key in (slice(1, None), slice(None, -1), slice(None, None, 2), slice(5, 9)):
+        part = track[key]
+        assert isinstance(part, gpshelper.Track) and part.lat.typecode == 'd'
+        assert [ (as_tuple(p), p.hr) for p in part ] == [ (as_tuple(p), p.hr) for p in list(track)[key] ]
+    with pytest.raises(Exception):
+        track.set_extension('hr', [ 1 ])
+
+
+def test_track_arrays():
+    np = pytest.importorskip('numpy')
+    track = gpshelper.Track()
+    track.extend(np.array([ 1.0, 2.0 ]), np.array([ 3.0, 4.0 ]), [ 5.0, 6.0 ], [ 0.5, 0.5 ], np.array([ 10, 20 ]), 'GPS5')
+    arrays = track.arrays()
+    assert arrays['lat'].tolist() == [ 1.0, 2.0 ]
+    assert arrays['time'].dtype == np.int64
+    assert arrays['source'].tolist() == [ gpshelper.SOURCE_CODES['GPS5'] ] * 2
+    # views, not copies
+    track.lat[0] = 7.0
+    assert arrays['lat'][0] == 7.0
+
+
+def test_time_formatter():
+    formatter = gpshelper.TimeFormatter()
+    csv_formatter = gpshelper.TimeFormatter(csv=True)
+    for us in [ 0, 999999, 1000000, 1682935200000055, 1682935200999999, 1682935201000000, 946684800123456 ]:
+        t = gpshelper.from_us(us)
+        assert formatter(us) == gpshelper.UTCTime(t)
+        assert csv_formatter(us) == gpshelper.CSVTime(t)
+
+
+def test_precision():
+    points = sample_points()
+    track = gpshelper.Track.from_points(points)
+    assert gpshelper.generate_CSV_DashWare(track) == gpshelper.generate_CSV_DashWare(points)
+    kml = gpshelper.generate_KML(track, precision=3)
+    assert '-3.600,40.200,651.000' in kml
+    assert kml == gpshelper.generate_KML(points, precision=3)
+
+
+@pytest.mark.parametrize("chunk_size", [ 1, 2, 4096 ])
+def test_writers(chunk_size: int, monkeypatch):
+    import io
+    points = [ p for p in sample_points() if p.name == 'GPS5' ] * 5
+    track = gpshelper.Track.from_points(points)
+    # the chunks of a Track are slices of its columns, not selections
+    def select(self, indexes):
+        raise AssertionError("Track.select used")
+    monkeypatch.setattr(gpshelper.Track, 'select', select)
+    for writer_class, generate in [ (gpshelper.GPXWriter, gpshelper.generate_GPX),
+                                    (gpshelper.KMLWriter, gpshelper.generate_KML),
+                                    (gpshelper.CSVWriter, gpshelper.generate_CSV) ]:
+        output = io.StringIO()
+        with writer_class(output, chunk_size=chunk_size) as writer:
+            writer.write(track[:3])
+            writer.write(track[3:])
+        assert writer.count == len(points)
+        assert output.getvalue() == generate(points)
+
+        # any iterable, e.g. a generator
+        output = io.StringIO()
+        with writer_class(output, chunk_size=chunk_size) as writer:
+            writer.write(p for p in points)
+        assert writer.count == len(points)
+        assert output.getvalue() == generate(points)
+
+    # the base class only counts the points
+    with gpshelper.PointWriter(None, chunk_size=chunk_size) as writer:
+        writer.write(iter(points))
+    assert writer.count == len(points)
+
+    # the header of the GPX needs a point, or the start time
+    output = io.StringIO()
+    gpshelper.GPXWriter(output).close()
+    assert output.getvalue() == ''
+
+
+def test_multi_writer():
+    import io
+    points = sample_points()
+    outputs = [ io.StringIO() for _ in range(3) ]
+    writers = [ gpshelper.KMLWriter(outputs[0]), gpshelper.GPXWriter(outputs[1], trk_name='test'), gpshelper.CSVWriter(outputs[2]) ]
+    with gpshelper.MultiWriter(writers, chunk_size=2) as writer:
+        writer.write(gpshelper._prioritize_gps9(gpshelper.Track.from_points(points)))
+    assert all(w.closed for w in writers)
+    assert outputs[0].getvalue() == gpshelper.generate_KML(points)
+    assert outputs[1].getvalue() == gpshelper.generate_GPX(points, trk_name='test')
+    assert outputs[2].getvalue() == gpshelper.generate_CSV(points)
+
+
+@pytest.mark.parametrize("compress", [ False, True ])
+def test_compressed_output(tmp_path, compress: bool):
+    import contextlib, gzip, zipfile
+    points = gpshelper._prioritize_gps9(sample_points())
+    names = {}
+    with contextlib.ExitStack() as stack:
+        writers = []
+        for extension, make_writer in [ ('kml', gpshelper.KMLWriter), ('gpx', gpshelper.GPXWriter), ('csv', gpshelper.CSVWriter) ]:
+            fd, names[extension] = gpshelper.open_output(stack, str(tmp_path / 'track'), extension, compress=compress, level=1)
+            writers.append(make_writer(fd))
+        with gpshelper.MultiWriter(writers) as writer:
+            writer.write(points)
+
+    if compress:
+        assert names == { 'kml': str(tmp_path / 'track.kmz'), 'gpx': str(tmp_path / 'track.gpx.gz'), 'csv': str(tmp_path / 'track.csv.gz') }
+        kml = zipfile.ZipFile(names['kml']).read('doc.kml').decode('utf-8')
+        gpx = gzip.open(names['gpx'], 'rt').read()
+        csv = gzip.open(names['csv'], 'rt', newline='').read()
+    else:
+        kml, gpx, csv = [ open(names[e], newline='').read() for e in ('kml', 'gpx', 'csv') ]
+    assert kml == gpshelper.generate_KML(points)
+    assert gpx == gpshelper.generate_GPX(points)
+    assert csv == gpshelper.generate_CSV(points)
+    assert gpshelper.output_size(points, 'gpx') > gpshelper.output_size(points, 'kml')